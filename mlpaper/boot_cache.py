@@ -0,0 +1,183 @@
+# Ryan Turner (turnerry@iro.umontreal.ca)
+from __future__ import absolute_import, division, print_function
+
+import os
+import pickle
+import struct
+import warnings
+from functools import wraps
+from importlib import import_module
+from inspect import signature
+from tempfile import mkstemp
+
+import joblib
+import numpy as np
+
+from mlpaper import __version__
+
+# Directory for the on-disk cache of bootstrap results, None disables it.
+# Results are only cached when the random stream is reproducible, that is,
+# `random_state` is an int seed or a `RandomState` (whose state goes in the
+# key). The least recently used results are evicted once the cache is bigger
+# than CACHE_MAX_BYTES.
+CACHE_DIR = None
+CACHE_MAX_BYTES = 2 ** 30
+
+CACHE_EXT = ".pkl"
+
+# Modules with settings that change the results of the cached functions. Each
+# lists the names of those settings in `CACHE_KEY_SETTINGS`, next to where they
+# are defined, and their current values go in every key too.
+KEY_MODULES = ("mlpaper.util", "mlpaper.boot_util", "mlpaper.perf_curves", "mlpaper.mlpaper", "mlpaper.classification")
+
+# What a corrupt or truncated cache file can raise while unpickling
+LOAD_ERRORS = (
+    IOError,
+    OSError,
+    EOFError,
+    ValueError,
+    KeyError,
+    IndexError,
+    ImportError,
+    AttributeError,
+    struct.error,
+    pickle.UnpicklingError,
+)
+
+# What hashing arguments that can not be pickled raises, e.g., a lambda curve
+HASH_ERRORS = (pickle.PicklingError, TypeError, AttributeError)
+
+
+def key_settings():
+    """Get the current values of the `CACHE_KEY_SETTINGS` of each module in
+    `KEY_MODULES`. The modules are imported here, rather than at the top, since
+    they use this module.
+
+    Returns
+    -------
+    settings : tuple of (str, str, object)
+        The module name, setting name, and value of each setting.
+    """
+    settings = tuple(
+        (mod, name, getattr(import_module(mod), name))
+        for mod in KEY_MODULES
+        for name in import_module(mod).CACHE_KEY_SETTINGS
+    )
+    return settings
+
+
+def cache_key(func, arguments):
+    """Get the key in the cache for calling `func` with `arguments`.
+
+    Parameters
+    ----------
+    func : callable
+        Function being cached.
+    arguments : dict of str to object
+        All the arguments to `func` by name, including the defaults. They are
+        hashed by their pickled content with `joblib.hash`, so functions are
+        hashed by reference (module and name) and must be importable. Hashing
+        an argument that can not be pickled, such as a lambda, raises one of
+        `HASH_ERRORS`. The module settings from `key_settings` are also part
+        of the key.
+
+    Returns
+    -------
+    key : str
+        Hex digest to use as a file name in the cache.
+    """
+    key = joblib.hash((__version__, func.__module__, func.__name__, sorted(arguments.items()), key_settings()))
+    return key
+
+
+def evict(cache_dir, max_bytes):
+    """Delete the least recently used files in the cache until the total size
+    is at most `max_bytes`.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory of the cache.
+    max_bytes : int
+        Size bound on the total size of the cache, must be >= 0.
+    """
+    assert max_bytes >= 0
+
+    entries = []
+    for fname in os.listdir(cache_dir):
+        if fname.endswith(CACHE_EXT):
+            stat = os.stat(os.path.join(cache_dir, fname))
+            entries.append((stat.st_mtime, stat.st_size, fname))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, fname in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, fname))
+        except OSError:  # Another process already evicted it
+            pass
+        total -= size
+
+
+def boot_cache(func):
+    """Decorator to cache the results of a bootstrap function `func` on disk
+    in `CACHE_DIR`. The function must take a `random_state` argument. If the
+    cache is disabled or `random_state` is not reproducible (e.g., None for
+    the global stream), `func` is simply called.
+
+    Parameters
+    ----------
+    func : callable
+        Function whose results only depend on its arguments.
+
+    Returns
+    -------
+    cached_func : callable
+        Same as `func`, but loads the results from the cache if available. If
+        `random_state` is a `RandomState`, it is left in the same state as
+        after calling `func`. If the arguments can not be hashed, `func` is
+        called without the cache and a warning is issued.
+    """
+    sig = signature(func)
+    assert "random_state" in sig.parameters
+
+    @wraps(func)
+    def cached_func(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        random_state = bound.arguments["random_state"]
+
+        reproducible = isinstance(random_state, (int, np.integer, np.random.RandomState))
+        if CACHE_DIR is None or not reproducible:
+            return func(*args, **kwargs)
+
+        try:
+            key = cache_key(func, bound.arguments)
+        except HASH_ERRORS as err:
+            warnings.warn("not caching %s, arguments can not be hashed: %s" % (func.__name__, str(err)))
+            return func(*args, **kwargs)
+
+        path = os.path.join(CACHE_DIR, key + CACHE_EXT)
+        try:
+            result, state = joblib.load(path)
+            os.utime(path)  # Mark as recently used for LRU
+        except LOAD_ERRORS:  # Not cached (or corrupt)
+            result = func(*args, **kwargs)
+            state = random_state.get_state() if isinstance(random_state, np.random.RandomState) else None
+
+            # Write to temp file and then move so readers never see half a file
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            fd, tmp_path = mkstemp(dir=CACHE_DIR, suffix=".tmp")
+            os.close(fd)
+            joblib.dump((result, state), tmp_path)
+            os.replace(tmp_path, path)
+            evict(CACHE_DIR, CACHE_MAX_BYTES)
+            return result
+
+        if state is not None:
+            random_state.set_state(state)  # As if we drew the bootstrap
+        return result
+
+    return cached_func
@@ -1,8 +1,46 @@
 # Ryan Turner (turnerry@iro.umontreal.ca)
+import logging
+from collections import namedtuple
+
 import numpy as np
+import scipy.stats as ss
+
+from mlpaper.util import check_random_state, randint
+
+# Max number of weight matrix elements to materialize at once when drawing
+# bootstrap weights in chunks, 2 ** 22 int64 elements is 32 MB.
+BOOT_CHUNK_ELEMENTS = 2 ** 22
+
+# Bound in bytes on the temporaries of a chunk of bootstrap replicates, which
+# takes precedence over BOOT_CHUNK_ELEMENTS if not None. It is per process, so
+# each worker of `n_jobs` gets its own budget.
+MEMORY_BUDGET = None
+
+# Approximate peak bytes of the temporaries per element, i.e., (replicate,
+# data point) pair, of the bootstrap kernels, used to plan the chunk sizes:
+# the int32 index of the drawn points alone, the index and the gathered (or
+# weighted) float64 values, and the index plus the counts, cumsums, and
+# curves from `perf_curves`.
+INDEX_BYTES = 4
+GATHER_BYTES = 12
+CURVE_BYTES = 72
+
+# Settings above that change the results cached by `boot_cache`, through the
+# chunk sizes
+CACHE_KEY_SETTINGS = ("BOOT_CHUNK_ELEMENTS", "MEMORY_BUDGET", "INDEX_BYTES", "GATHER_BYTES", "CURVE_BYTES")
+
+# The chunks a bootstrap is done in, see `memory_plan`.
+MemoryPlan = namedtuple("MemoryPlan", ["chunk_size", "n_chunks", "peak_bytes"])
+
+logger = logging.getLogger(__name__)
 
+# Sparse representation of bootstrap weights as the indices of the data points
+# drawn in each replicate. The implied weights are the number of times each
+# data point is drawn plus `epsilon`.
+BootIndex = namedtuple("BootIndex", ["index", "N", "epsilon"])
 
-def boot_weights(N, n_boot, epsilon=0):
+
+def boot_weights(N, n_boot, epsilon=0, random_state=None):
     """Sample weights for data points that makes it equivalent to bootstrap
     resampling of data points.
 
@@ -15,6 +53,8 @@ def boot_weights(N, n_boot, epsilon=0):
     epsilon : int or float
         Minimum weight, typically 0 unless this creates numerical problems for
         a down stream algorithm in which case a value such as 1e-10 is used.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
 
     Returns
     -------
@@ -23,13 +63,364 @@ def boot_weights(N, n_boot, epsilon=0):
     """
     assert N >= 1
     assert n_boot >= 1
+    random_state = check_random_state(random_state)
 
     p_BS = np.ones(N) / N
-    weight = np.maximum(epsilon, np.random.multinomial(N, p_BS, size=n_boot))
+    weight = np.maximum(epsilon, random_state.multinomial(N, p_BS, size=n_boot))
+    assert weight.shape == (n_boot, N)
+    return weight
+
+
+def memory_plan(N, n_boot, bytes_per_element=INDEX_BYTES, max_elements=None):
+    """Plan the number of bootstrap replicates to do at once so that the
+    temporaries of a chunk fit in `MEMORY_BUDGET`. The plan is logged at
+    ``INFO`` level with the `logging` module.
+
+    Parameters
+    ----------
+    N : int
+        Number of data points (times any other dimension of the temporaries,
+        such as the number of columns) must be >= 1.
+    n_boot : int
+        Number of bootstrap replicates, must be >= 1.
+    bytes_per_element : int
+        Peak bytes of the temporaries for each replicate of each data point,
+        e.g., `CURVE_BYTES` for the curves in `perf_curves`.
+    max_elements : None or int
+        Max number of elements in a chunk. If None, it is derived from
+        `MEMORY_BUDGET` and `bytes_per_element`, or if that is None too, the
+        module level setting `BOOT_CHUNK_ELEMENTS`.
+
+    Returns
+    -------
+    plan : MemoryPlan
+        Number of replicates per chunk, in ``[1, n_boot]``, the number of
+        chunks, and the estimated peak bytes of the temporaries of a chunk. At
+        least one replicate is always used even if that goes over the budget.
+    """
+    assert N >= 1
+    assert n_boot >= 1
+    assert bytes_per_element >= 1
+    if max_elements is None:
+        max_elements = BOOT_CHUNK_ELEMENTS if MEMORY_BUDGET is None else max(1, MEMORY_BUDGET // bytes_per_element)
+    assert max_elements >= 1
+
+    chunk_size = int(np.clip(max_elements // N, 1, n_boot))
+    n_chunks = -(-n_boot // chunk_size)
+    plan = MemoryPlan(chunk_size=chunk_size, n_chunks=n_chunks, peak_bytes=chunk_size * N * bytes_per_element)
+    logger.info(
+        "Bootstrap of %d replicates of %d elements in %d chunks of %d (~%d bytes each)",
+        n_boot,
+        N,
+        plan.n_chunks,
+        plan.chunk_size,
+        plan.peak_bytes,
+    )
+    return plan
+
+
+def boot_chunk_size(N, n_boot, max_elements=None, bytes_per_element=INDEX_BYTES):
+    """Get the number of bootstrap replicates to draw at once so that a chunk
+    of the weight matrix has at most `max_elements` elements, see
+    `memory_plan`.
+
+    Parameters
+    ----------
+    N : int
+        Number of data points must be >= 1.
+    n_boot : int
+        Number of bootstrap replicates, must be >= 1.
+    max_elements : None or int
+        Max number of elements in a chunk of weights. If None, use the module
+        level setting `MEMORY_BUDGET`, or `BOOT_CHUNK_ELEMENTS` if that is None.
+    bytes_per_element : int
+        Peak bytes of the temporaries per element, for `MEMORY_BUDGET`.
+
+    Returns
+    -------
+    chunk_size : int
+        Number of replicates per chunk, in ``[1, n_boot]``. At least one
+        replicate is always used even if that goes over `max_elements`.
+    """
+    plan = memory_plan(N, n_boot, bytes_per_element=bytes_per_element, max_elements=max_elements)
+    return plan.chunk_size
+
+
+def boot_weights_chunked(N, n_boot, epsilon=0, chunk_size=None, random_state=None):
+    """Generator version of `boot_weights` that yields the weights in blocks
+    of bootstrap replicates, which bounds the peak memory to the chunk size
+    rather than ``n_boot * N``.
+
+    The chunks are drawn one after the other from the same random stream, so
+    stacking all the chunks gives the exact same weights as a single call to
+    `boot_weights` with the same random seed.
+
+    Parameters
+    ----------
+    N : int
+        Number of data points must be >= 1.
+    n_boot : int
+        Number of bootstrap replicates, must be >= 1.
+    epsilon : int or float
+        Minimum weight, typically 0 unless this creates numerical problems for
+        a down stream algorithm in which case a value such as 1e-10 is used.
+    chunk_size : None or int
+        Max number of replicates in each chunk. If None, use `boot_chunk_size`
+        to pick the chunk size.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
+
+    Yields
+    ------
+    weight : ndarray, shape (n_chunk, N)
+        Weights equivalent to resampling for bootstrap algorithm for the next
+        ``n_chunk <= chunk_size`` replicates.
+    """
+    chunk_size = boot_chunk_size(N, n_boot, bytes_per_element=GATHER_BYTES) if chunk_size is None else chunk_size
+    assert chunk_size >= 1
+    random_state = check_random_state(random_state)
+
+    for start in range(0, n_boot, chunk_size):
+        yield boot_weights(N, min(chunk_size, n_boot - start), epsilon=epsilon, random_state=random_state)
+
+
+def poisson_weights(N, n_boot, epsilon=0, random_state=None):
+    """Sample Poisson(1) weights for data points, which approximates the
+    bootstrap for large `N`. Unlike `boot_weights`, the weights of each data
+    point are independent of all the other data points. So, the weights can
+    be drawn one chunk of data at a time for an online (single pass)
+    bootstrap over a stream of data points.
+
+    Parameters
+    ----------
+    N : int
+        Number of data points must be >= 1.
+    n_boot : int
+        Number of bootstrap replicates, must be >= 1.
+    epsilon : int or float
+        Minimum weight, typically 0 unless this creates numerical problems for
+        a down stream algorithm in which case a value such as 1e-10 is used.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
+
+    Returns
+    -------
+    weight : ndarray, shape (n_boot, N)
+        Weights approximately equivalent to resampling for bootstrap algorithm.
+        Unlike `boot_weights`, the rows do not sum to `N` exactly.
+
+    References
+    ----------
+    Hanley, James A., and Brenda MacGibbon. "Creating non-parametric bootstrap
+    samples using Poisson frequencies." Computer Methods and Programs in
+    Biomedicine 83.1 (2006): 57-62.
+    """
+    assert N >= 1
+    assert n_boot >= 1
+
+    random_state = check_random_state(random_state)
+
+    weight = np.maximum(epsilon, random_state.poisson(1.0, size=(n_boot, N)))
     assert weight.shape == (n_boot, N)
     return weight
 
 
+def boot_counts(counts, n_boot, random_state=None):
+    """Sample the number of times each distinct data point is drawn in
+    bootstrap resampling. If the data only take a few distinct values, this
+    has the same distribution as the bootstrap with `boot_weights` summed over
+    the points with each value, but costs O(n_boot * n_distinct) rather than
+    O(n_boot * N).
+
+    Parameters
+    ----------
+    counts : ndarray of type int, shape (n_distinct,)
+        Number of data points with each distinct value, must be >= 0. There
+        are ``N = sum(counts)`` data points, which must be >= 1.
+    n_boot : int
+        Number of bootstrap replicates, must be >= 1.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
+
+    Returns
+    -------
+    counts_boot : ndarray of type int, shape (n_boot, n_distinct)
+        Number of times each distinct value is drawn in each replicate. Each
+        row sums to `N`.
+    """
+    assert counts.ndim == 1 and np.all(counts >= 0)
+    N = np.sum(counts)
+    assert N >= 1
+    assert n_boot >= 1
+
+    random_state = check_random_state(random_state)
+
+    counts_boot = random_state.multinomial(N, counts / float(N), size=n_boot)
+    assert counts_boot.shape == (n_boot, counts.size)
+    return counts_boot
+
+
+def boot_index(N, n_boot, epsilon=0, random_state=None):
+    """Sample the indices of the data points drawn in bootstrap resampling.
+    This is a sparse alternative to `boot_weights` with the same distribution
+    of (implied) weights. Statistics on the replicates can then be computed by
+    gathering the data points rather than multiplying by a dense weight
+    matrix, which is mostly zeros and ones.
+
+    Parameters
+    ----------
+    N : int
+        Number of data points must be >= 1.
+    n_boot : int
+        Number of bootstrap replicates, must be >= 1.
+    epsilon : int or float
+        Extra weight added to every data point, typically 0 unless zero weight
+        creates numerical problems for a down stream algorithm in which case a
+        value such as 1e-10 is used.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
+
+    Returns
+    -------
+    boot_idx : BootIndex
+        Named tuple where ``boot_idx.index`` is an int ndarray of shape
+        ``(n_boot, N)`` with the indices of data points drawn in each
+        replicate.
+    """
+    assert N >= 1
+    assert n_boot >= 1
+
+    dtype = np.int32 if N <= np.iinfo(np.int32).max else np.int64
+    index = randint(random_state, N, size=(n_boot, N), dtype=dtype)
+    boot_idx = BootIndex(index=index, N=N, epsilon=epsilon)
+    return boot_idx
+
+
+def boot_index_chunked(N, n_boot, epsilon=0, chunk_size=None, random_state=None):
+    """Generator version of `boot_index` that yields the indices in blocks of
+    bootstrap replicates. Same as `boot_weights_chunked` but for `boot_index`.
+
+    Parameters
+    ----------
+    N : int
+        Number of data points must be >= 1.
+    n_boot : int
+        Number of bootstrap replicates, must be >= 1.
+    epsilon : int or float
+        Extra weight added to every data point, see `boot_index`.
+    chunk_size : None or int
+        Max number of replicates in each chunk. If None, use `boot_chunk_size`
+        to pick the chunk size.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
+
+    Yields
+    ------
+    boot_idx : BootIndex
+        Indices of data points drawn in the next ``n_chunk <= chunk_size``
+        replicates, see `boot_index`.
+    """
+    chunk_size = boot_chunk_size(N, n_boot) if chunk_size is None else chunk_size
+    assert chunk_size >= 1
+    random_state = check_random_state(random_state)
+
+    for start in range(0, n_boot, chunk_size):
+        yield boot_index(N, min(chunk_size, n_boot - start), epsilon=epsilon, random_state=random_state)
+
+
+def index_group_sums(boot_idx, group, n_groups, x=None, dtype=float):
+    """Compute the total weight (or weighted sum of `x`) in each group of data
+    points for every replicate in a `BootIndex` using a single `bincount`.
+
+    Parameters
+    ----------
+    boot_idx : BootIndex
+        Indices of data points drawn in each replicate, see `boot_index`.
+    group : ndarray of type int, shape (N,)
+        Group of each data point, must be in ``[0, n_groups)``.
+    n_groups : int
+        Number of groups, must be >= 1.
+    x : None or ndarray of shape (N,)
+        Values to sum in each group, if None, all values are one so the total
+        weight in each group is computed.
+    dtype : dtype
+        Data type of the output. Use ``np.float32`` to halve the memory. An
+        integer type gives the exact counts when `x` is None and `epsilon` is
+        zero.
+
+    Returns
+    -------
+    sums : ndarray, shape (n_boot, n_groups)
+        The weighted sum of `x` in each group for each replicate. This includes
+        the `epsilon` weight of each data point.
+    """
+    index = boot_idx.index
+    n_boot, N = index.shape
+    assert N == boot_idx.N
+    assert group.shape == (N,)
+    assert n_groups >= 1
+    assert x is None or x.shape == (N,)
+    assert boot_idx.epsilon == 0 or np.dtype(dtype).kind == "f"
+
+    # Offset the group of each replicate so one bincount does all replicates
+    flat_group = (group[index] + n_groups * np.arange(n_boot)[:, None]).ravel()
+    x_drawn = None if x is None else x[index].ravel()
+    sums = np.bincount(flat_group, weights=x_drawn, minlength=n_boot * n_groups)
+    sums = sums.reshape((n_boot, n_groups)).astype(dtype)
+
+    if boot_idx.epsilon != 0:
+        x_ = np.ones(N) if x is None else x
+        eps_sums = boot_idx.epsilon * np.bincount(group, weights=x_, minlength=n_groups)
+        sums = sums + eps_sums[None, :].astype(dtype)
+    return sums
+
+
+def index_to_weights(boot_idx):
+    """Convert a `BootIndex` to the equivalent dense weight matrix, e.g., as
+    returned by `boot_weights`.
+
+    Parameters
+    ----------
+    boot_idx : BootIndex
+        Indices of data points drawn in each replicate, see `boot_index`.
+
+    Returns
+    -------
+    weight : ndarray, shape (n_boot, N)
+        Number of times each data point is drawn in each replicate plus
+        `epsilon`.
+    """
+    weight = index_group_sums(boot_idx, np.arange(boot_idx.N), boot_idx.N)
+    return weight
+
+
+def boot_means(weight, x):
+    """Compute the weighted mean of every column of `x` on every bootstrap
+    replicate as a single (BLAS) matrix product. This is much faster than
+    gathering the drawn rows of `x` when `x` has more than a few columns.
+
+    Parameters
+    ----------
+    weight : ndarray, shape (n_boot, N)
+        Weight of each data point in each replicate, e.g., from `boot_weights`
+        or `index_to_weights`. Each row must have a positive sum.
+    x : ndarray, shape (N, n_cols)
+        Data points to average.
+
+    Returns
+    -------
+    mu_boot : ndarray, shape (n_boot, n_cols)
+        Weighted mean of each column of `x` on each replicate.
+    """
+    assert weight.ndim == 2 and x.ndim == 2
+    assert weight.shape[1] == x.shape[0]
+
+    total = np.sum(weight, axis=1)
+    assert np.all(total > 0)
+    mu_boot = np.dot(weight, x) / total[:, None]
+    return mu_boot
+
+
 def confidence_to_percentiles(confidence):
     """Convert confidence level to percentiles in sampling distribution to
     build confidence interval.
@@ -118,26 +509,122 @@ def basic(boot_estimates, original_estimate, confidence=0.95):
     return LB, UB
 
 
+def jackknife_mean_accel(x):
+    """Get the jackknife estimate of the acceleration constant for the mean of
+    `x`, as used in the BCa bootstrap. For the mean, the leave-one-out
+    estimates have a closed form, so this is O(N) rather than N recomputations
+    of the estimator.
+
+    Parameters
+    ----------
+    x : ndarray, shape (n_samples, ...)
+        Data points whose mean is the estimated quantity. Must be finite.
+
+    Returns
+    -------
+    accel : ndarray, shape (...)
+        Acceleration constant. It is 0 when all the `x` are the same.
+    """
+    assert np.ndim(x) >= 1
+    assert np.all(np.isfinite(x))
+
+    # The leave-one-out means are (sum(x) - x_i) / (N - 1), so their deviations
+    # from their mean are (x_i - mean(x)) / (N - 1). The (N - 1) cancels out.
+    dev = x - np.mean(x, axis=0)
+    num = np.sum(dev ** 3, axis=0)
+    denom = 6.0 * np.sum(dev ** 2, axis=0) ** 1.5
+    with np.errstate(invalid="ignore", divide="ignore"):
+        accel = np.where(denom > 0.0, num / denom, 0.0)
+    return accel
+
+
+def bca(boot_estimates, original_estimate, accel, confidence=0.95):
+    """Build confidence interval using the bias-corrected and accelerated (BCa)
+    boostrap method.
+
+    Parameters
+    ----------
+    boot_estimates : ndarray, shape (n_boot, ...)
+        Estimated quantity across different bootstrap replications.
+    original_estimate : ndarray, shape (...)
+        Quantity estimated using original (non-bootstrap) data set.
+    accel : ndarray, shape (...)
+        Acceleration constant, e.g., from `jackknife_mean_accel`. Using
+        ``accel=0`` gives the bias-corrected (BC) bootstrap.
+    confidence : float
+        Confidence level, use 0.95 for 95% interval. Must be in (0,1).
+
+    Returns
+    -------
+    LB : ndarray, shape (...)
+        Lower end of confidence interval.
+    UB : ndarray, shape (...)
+        Upper end of confidence interval.
+
+    References
+    ----------
+    Efron, Bradley. "Better bootstrap confidence intervals." Journal of the
+    American Statistical Association 82.397 (1987): 171-185.
+    """
+    assert boot_estimates.ndim >= 1
+    assert boot_estimates.shape[1:] == np.shape(original_estimate)
+    assert np.shape(accel) == np.shape(original_estimate)
+    assert not np.any(np.isnan(boot_estimates))  # NaN ordering is arbitrary
+    assert not np.any(np.isnan(original_estimate))
+    n_boot = boot_estimates.shape[0]
+
+    # Bias correction from fraction of replicates below original (ties split)
+    frac = np.mean(boot_estimates < original_estimate, axis=0) + 0.5 * np.mean(
+        boot_estimates == original_estimate, axis=0
+    )
+    # Keep it finite when all the replicates fall on one side
+    frac = np.clip(frac, 0.5 / n_boot, 1.0 - 0.5 / n_boot)
+    z0 = ss.norm.ppf(frac)
+
+    LB_perc, UB_perc = confidence_to_percentiles(confidence)
+    q = []
+    for perc in (LB_perc, UB_perc):
+        w = z0 + ss.norm.ppf(0.01 * perc)
+        denom = 1.0 - accel * w
+        # The adjusted quantile goes to 0 or 1 as the denominator goes to 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = np.where(denom > 0.0, z0 + w / denom, np.sign(w) * np.inf)
+        q.append(ss.norm.cdf(z))
+    q_LB, q_UB = q
+
+    # Same order statistics as interpolation lower and higher in percentile
+    boot_sorted = np.sort(boot_estimates, axis=0)
+    idx_LB = np.floor(q_LB * (n_boot - 1)).astype(int)
+    idx_UB = np.ceil(q_UB * (n_boot - 1)).astype(int)
+    LB = np.take_along_axis(boot_sorted, idx_LB[None, ...], axis=0)[0, ...]
+    UB = np.take_along_axis(boot_sorted, idx_UB[None, ...], axis=0)[0, ...]
+    assert LB.shape == boot_estimates.shape[1:]
+    assert LB.shape == UB.shape
+    return LB, UB
+
+
 def error_bar(boot_estimates, original_estimate, confidence=0.95):
     """Build error bar using boostrap method. The results is the same
     regardless of whether the percentile or basic boostrap is used for CIs.
 
     Parameters
     ----------
-    boot_estimates : ndarray, shape (n_boot,)
-        Estimated quantity across different bootstrap replications.
-    original_estimate : float
+    boot_estimates : ndarray, shape (n_boot, ...)
+        Estimated quantity across different bootstrap replications. Each
+        quantity in the trailing dimensions gets its own error bar in one
+        vectorized call.
+    original_estimate : float or ndarray of shape (...)
         Quantity estimated using original (non-bootstrap) data set.
     confidence : float
         Confidence level, use 0.95 for 95% interval. Must be in (0,1).
 
     Returns
     -------
-    EB : float
+    EB : float or ndarray of shape (...)
         Error bar around the original estimate.
     """
-    assert boot_estimates.ndim == 1
-    assert np.ndim(original_estimate) == 0
+    assert boot_estimates.ndim >= 1
+    assert np.shape(original_estimate) == boot_estimates.shape[1:]
 
     LB, UB = percentile(boot_estimates, confidence)
     # This actually ends up the same whether we use basic or percentile
@@ -148,30 +635,111 @@ def error_bar(boot_estimates, original_estimate, confidence=0.95):
     return EB
 
 
+def quantile_mc_se(boot_estimates, q):
+    """Estimate the Monte Carlo standard error of a quantile of the bootstrap
+    distribution due to using a finite number of bootstrap replications. This
+    uses the spread of the order statistics within one binomial standard
+    deviation of the quantile's rank, so it needs no density estimate.
+
+    Parameters
+    ----------
+    boot_estimates : ndarray, shape (n_boot, ...)
+        Estimated quantity across different bootstrap replications. Each
+        quantity in the trailing dimensions gets its own standard error.
+    q : float
+        Quantile level in [0,1].
+
+    Returns
+    -------
+    se : float or ndarray of shape (...)
+        Approximate standard error of the `q` quantile of `boot_estimates`.
+    """
+    assert boot_estimates.ndim >= 1 and boot_estimates.shape[0] >= 1
+    assert not np.any(np.isnan(boot_estimates))
+    assert 0.0 <= q and q <= 1.0
+    n_boot = boot_estimates.shape[0]
+
+    boot_sorted = np.sort(boot_estimates, axis=0)
+    rank, delta = q * (n_boot - 1), np.sqrt(n_boot * q * (1.0 - q))
+    lo = boot_sorted[max(0, int(np.floor(rank - delta)))]
+    hi = boot_sorted[min(n_boot - 1, int(np.ceil(rank + delta)))]
+    se = 0.5 * (hi - lo)
+    return se
+
+
+def error_bar_mc_se(boot_estimates, confidence=0.95):
+    """Estimate the Monte Carlo standard error in `error_bar` due to using a
+    finite number of bootstrap replications.
+
+    Parameters
+    ----------
+    boot_estimates : ndarray, shape (n_boot, ...)
+        Estimated quantity across different bootstrap replications. Each
+        quantity in the trailing dimensions gets its own standard error.
+    confidence : float
+        Confidence level, use 0.95 for 95% interval. Must be in (0,1).
+
+    Returns
+    -------
+    se : float or ndarray of shape (...)
+        Approximate standard error of the error bar. Since the error bar is
+        from one end of the interval, this is the larger of the two ends.
+    """
+    LB_perc, UB_perc = confidence_to_percentiles(confidence)
+    se = np.fmax(quantile_mc_se(boot_estimates, 0.01 * LB_perc), quantile_mc_se(boot_estimates, 0.01 * UB_perc))
+    return se
+
+
+def significance_mc_se(boot_estimates, ref):
+    """Estimate the Monte Carlo standard error in `significance` due to using
+    a finite number of bootstrap replications.
+
+    Parameters
+    ----------
+    boot_estimates : ndarray, shape (n_boot, ...)
+        Estimated quantity across different bootstrap replications.
+    ref : float, ndarray of shape (...), or ndarray of shape (n_boot, ...)
+        Reference value is in hypothesis test, see `significance`.
+
+    Returns
+    -------
+    se : float or ndarray of shape (...)
+        Approximate standard error of the p-value.
+    """
+    assert boot_estimates.ndim >= 1
+    n_boot = boot_estimates.shape[0]
+
+    # p-value is twice a binomial proportion, at least until capped at 1
+    frac = 0.5 * significance(boot_estimates, ref)
+    se = 2.0 * np.sqrt(frac * (1.0 - frac) / n_boot)
+    return se
+
+
 def significance(boot_estimates, ref):
     """Perform a two-sided bootstrap based hypothesis test on whether the
     unknown quantity is equal to some reference.
 
     Parameters
     ----------
-    boot_estimates : ndarray, shape (n_boot,)
-        Estimated quantity across different bootstrap replications.
-    ref : float or ndarray of shape (n_boot,)
+    boot_estimates : ndarray, shape (n_boot, ...)
+        Estimated quantity across different bootstrap replications. Each
+        quantity in the trailing dimensions is tested in one vectorized call.
+    ref : float, ndarray of shape (...), or ndarray of shape (n_boot, ...)
         Reference value is in hypothesis test. Use a scalar value for a known
         reference value or a array of n_boot bootstraped value to perform a
         paired test against another unknown quantity.
 
     Returns
     -------
-    pval : float
+    pval : float or ndarray of shape (...)
         Resulting p-value of hypothesis test in (0,1).
     """
-    assert boot_estimates.ndim == 1
-    assert np.ndim(ref) == 0 or ref.shape == boot_estimates.shape
+    assert boot_estimates.ndim >= 1
+    assert np.ndim(ref) == 0 or np.shape(ref) in (boot_estimates.shape, boot_estimates.shape[1:])
     assert not np.any(np.isnan(boot_estimates))  # NaN ordering is arbitrary
     assert not np.any(np.isnan(ref))  # NaN ordering is arbitrary
 
-    pval = 2.0 * np.minimum(np.mean(boot_estimates <= ref), np.mean(ref <= boot_estimates))
+    pval = 2.0 * np.minimum(np.mean(boot_estimates <= ref, axis=0), np.mean(ref <= boot_estimates, axis=0))
     # Only needed when some boot_estimates == ref exactly:
     pval = np.minimum(1.0, pval)
     return pval
@@ -1,22 +1,33 @@
 # Ryan Turner (turnerry@iro.umontreal.ca)
 from __future__ import absolute_import, division, print_function
 
+import warnings
 from builtins import range
+from collections import namedtuple
+from copy import deepcopy
 
 import numpy as np
 import pandas as pd
-from joblib import Memory
+from joblib import Memory, Parallel, delayed
 from scipy.special import logsumexp
 
 import mlpaper.boot_util as bu
 import mlpaper.perf_curves as pc
+from mlpaper.boot_cache import boot_cache
 from mlpaper.constants import CURVE_STATS, ERR_COL, METHOD, METRIC, PAIRWISE_DEFAULT, PVAL_COL, STAT, STD_STATS
-from mlpaper.mlpaper import loss_summary_table
-from mlpaper.util import area, interp1d, normalize, one_hot
+from mlpaper.mlpaper import N_BOOT, loss_summary_table
+from mlpaper.util import area, check_random_state, interp1d, normalize, one_hot, spawn_random_states
 
 DEFAULT_NGRID = 100
+CACHE_KEY_SETTINGS = ("DEFAULT_NGRID",)  # Settings that change results cached by `boot_cache`
 LABEL = "label"  # Don't put in constants since only needed for classification
 
+# Predictive distributions of several methods as one array of shape
+# (n_methods, n_samples, n_labels), with the method names and the index of the
+# data points. This can be used in place of the MultiIndex DataFrame of
+# predictions, see `as_pred_tensor`.
+PredTensor = namedtuple("PredTensor", ["methods", "log_pred_prob", "index"])
+
 
 def shape_and_validate(y, log_pred_prob):
     """Validate shapes and types of predictive distribution against data and
@@ -51,6 +62,83 @@ def shape_and_validate(y, log_pred_prob):
     return n_samples, n_labels
 
 
+def as_pred_tensor(log_pred_prob_table):
+    """Get the predictive distributions of every method as one array, which
+    avoids slicing (and re-validating) a MultiIndex DataFrame per method.
+
+    Parameters
+    ----------
+    log_pred_prob_table : DataFrame or PredTensor
+        DataFrame of shape (n_samples, n_methods * n_labels) with predictive
+        distributions, whose columns are the cartesian product of
+        methods x labels, see `loss_table`. If already a `PredTensor`, it is
+        only validated.
+
+    Returns
+    -------
+    pred : PredTensor
+        The methods (in the order of the levels of the columns), the log
+        predictive probabilities of shape (n_methods, n_samples, n_labels), and
+        the index of the data points. If the methods' columns are in that
+        order, the array is a view of the DataFrame's data (for a single
+        dtype), so no copy is made.
+    """
+    if isinstance(log_pred_prob_table, PredTensor):
+        pred = log_pred_prob_table._replace(
+            methods=pd.Index(log_pred_prob_table.methods), index=pd.Index(log_pred_prob_table.index)
+        )
+        assert pred.log_pred_prob.ndim == 3
+        assert pred.log_pred_prob.shape[:2] == (len(pred.methods), len(pred.index))
+        assert pred.methods.is_unique
+        return pred
+
+    methods, labels = log_pred_prob_table.columns.levels
+    N, n_methods, n_labels = len(log_pred_prob_table), len(methods), len(labels)
+
+    if log_pred_prob_table.columns.equals(pd.MultiIndex.from_product([methods, range(n_labels)])):
+        # One (n_samples, n_methods * n_labels) array, reshape as a view
+        values = log_pred_prob_table.values
+        if values.flags.f_contiguous:  # Typical, pandas stores the transpose
+            values = np.transpose(np.reshape(values.T, (n_methods, n_labels, N)), (0, 2, 1))
+        else:
+            values = np.transpose(np.reshape(values, (N, n_methods, n_labels)), (1, 0, 2))
+    else:
+        # Make sure the columns are in right order and we aren't mixing things
+        for method in methods:
+            assert list(log_pred_prob_table[method].columns) == list(range(n_labels))
+        values = np.stack([log_pred_prob_table[method].values for method in methods])
+    assert values.shape == (n_methods, N, n_labels)
+
+    pred = PredTensor(methods=pd.Index(methods), log_pred_prob=values, index=log_pred_prob_table.index)
+    return pred
+
+
+def pred_tensor_to_table(pred):
+    """Convert a `PredTensor` to the DataFrame layout of the predictive
+    distributions, see `loss_table`. No copy is made if the array of `pred`
+    is laid out like that of a DataFrame, e.g., from `as_pred_tensor`.
+
+    Parameters
+    ----------
+    pred : PredTensor
+        Predictive distributions of every method.
+
+    Returns
+    -------
+    log_pred_prob_table : DataFrame, shape (n_samples, n_methods * n_labels)
+        DataFrame with predictive distributions. The columns are a
+        hierarchical index that is the cartesian product of methods x labels.
+    """
+    pred = as_pred_tensor(pred)
+    n_methods, N, n_labels = pred.log_pred_prob.shape
+
+    # Numpy only copies if the methods x labels can't be a single axis
+    values = np.reshape(np.transpose(pred.log_pred_prob, (1, 0, 2)), (N, n_methods * n_labels))
+    col_names = pd.MultiIndex.from_product([pred.methods, range(n_labels)], names=[METHOD, LABEL])
+    log_pred_prob_table = pd.DataFrame(data=values, index=pred.index, columns=col_names, copy=False)
+    return log_pred_prob_table
+
+
 # ============================================================================
 # Loss functions
 # ============================================================================
@@ -210,12 +298,77 @@ def spherical_loss(y, log_pred_prob, rescale=True):
     return loss
 
 
+def std_class_losses(y, log_pred_prob, loss_funcs=(log_loss, brier_loss, spherical_loss, hard_loss)):
+    """Compute several of the standard losses (with their default arguments)
+    together. This validates the inputs and exponentiates the predictive
+    distribution once for all of them, and gets the zero-one loss from the
+    most probable label rather than a product with the loss matrix.
+
+    Parameters
+    ----------
+    y : ndarray of type int or bool, shape (n_samples,)
+        True labels for each classication data point.
+    log_pred_prob : ndarray, shape (n_samples, n_labels)
+        Array of shape ``(len(y), n_labels)``. Each row corresponds to a
+        categorical distribution with *normalized* probabilities in log scale.
+        Therefore, the number of columns must be at least 1.
+    loss_funcs : iterable of callable
+        Loss functions to compute, which must be among `log_loss`,
+        `brier_loss`, `spherical_loss`, and `hard_loss`.
+
+    Returns
+    -------
+    losses : dict of callable to ndarray of shape (n_samples,)
+        Loss on each data point for each function in `loss_funcs`, which
+        matches calling the function up to round off.
+    """
+    loss_funcs = set(loss_funcs)
+    assert loss_funcs <= FUSED_CLASS_LOSS
+    N, n_labels = shape_and_validate(y, log_pred_prob)
+
+    rows, y = np.arange(N), y.astype(int)
+    log_pred_prob_y = log_pred_prob[rows, y]
+
+    losses = {}
+    if log_loss in loss_funcs:
+        losses[log_loss] = -log_pred_prob_y
+
+    if loss_funcs & {brier_loss, spherical_loss, hard_loss}:
+        action = np.argmax(log_pred_prob, axis=1)
+        if hard_loss in loss_funcs:
+            losses[hard_loss] = (action != y).astype(float)
+
+    if loss_funcs & {brier_loss, spherical_loss}:
+        # Shift by the max so the exp can neither overflow nor all underflow
+        log_max = log_pred_prob[rows, action]
+        pred_prob = np.exp(log_pred_prob - log_max[:, None])
+        sq_norm = np.einsum("ij,ij->i", pred_prob, pred_prob)
+        pred_prob_y = np.exp(log_pred_prob_y - log_max)
+
+    if spherical_loss in loss_funcs:
+        loss = -pred_prob_y / np.sqrt(sq_norm)
+        c = 1.0 - 1.0 / np.sqrt(n_labels) if n_labels > 1 else 1.0
+        losses[spherical_loss] = (1.0 + loss) / c
+
+    if brier_loss in loss_funcs:
+        # Expand the square so the one-hot matrix is never built
+        scale = np.exp(log_max)
+        loss = np.maximum(0.0, (scale ** 2) * sq_norm - 2.0 * scale * pred_prob_y + 1.0)
+        if n_labels > 1:
+            loss = np.true_divide(n_labels, n_labels - 1) * loss
+        losses[brier_loss] = loss
+    return losses
+
+
+# The loss functions that `std_class_losses` can compute together
+FUSED_CLASS_LOSS = frozenset((log_loss, brier_loss, spherical_loss, hard_loss))
+
 # ============================================================================
 # Loss summary: the main purpose of this file.
 # ============================================================================
 
 
-def loss_table(log_pred_prob_table, y, metrics_dict, assume_normalized=False):
+def loss_table(log_pred_prob_table, y, metrics_dict, assume_normalized=False, dtype=np.float64):
     """Compute loss table from table of probalistic predictions.
 
     Parameters
@@ -225,7 +378,8 @@ def loss_table(log_pred_prob_table, y, metrics_dict, assume_normalized=False):
         The columns should be hierarchical index that is the cartesian product
         of methods x labels. For exampe, ``log_pred_prob_table.loc[5, 'foo']``
         is the categorical distribution (in log scale) prediction that method
-        foo places on ``y[5]``.
+        foo places on ``y[5]``. May also be a `PredTensor` with the same
+        predictions as one array, see `as_pred_tensor`.
     y : ndarray of type int or bool, shape (n_samples,)
         True labels for each classication data point. Must be of same length as
         DataFrame `log_pred_prob_table`.
@@ -235,6 +389,9 @@ def loss_table(log_pred_prob_table, y, metrics_dict, assume_normalized=False):
     assume_normalized : bool
         If False, renormalize the predictive distributions to ensure there is
         no cheating. If True, skips this step for speed.
+    dtype : dtype
+        Data type of the loss table. Use ``np.float32`` to halve the memory of
+        large loss tables, the summaries accumulate the means in float64.
 
     Returns
     -------
@@ -246,26 +403,28 @@ def loss_table(log_pred_prob_table, y, metrics_dict, assume_normalized=False):
         method foo's prediction of ``y[5]`` according to loss function bar is
         stored in ``loss_tbl.loc[5, ('bar', 'foo')]``.
     """
-    methods, labels = log_pred_prob_table.columns.levels
-    n_samples, n_labels = len(log_pred_prob_table), len(labels)
+    pred = as_pred_tensor(log_pred_prob_table)
+    methods = pred.methods
+    _, n_samples, n_labels = pred.log_pred_prob.shape
     assert y.shape == (n_samples,)
     assert n_samples >= 1 and n_labels >= 1 and len(methods) >= 1
 
     col_names = pd.MultiIndex.from_product([metrics_dict.keys(), methods], names=[METRIC, METHOD])
-    loss_tbl = pd.DataFrame(index=log_pred_prob_table.index, columns=col_names, dtype=float)
-    for method in methods:
-        # Make sure the columns are in right order and we aren't mixing things
-        assert list(log_pred_prob_table[method].columns) == list(range(n_labels))
-
-        log_pred_prob = log_pred_prob_table[method].values
-        assert log_pred_prob.shape == (n_samples, n_labels)
+    # Fill an array and build the DataFrame at the end to keep the dtype
+    loss = np.zeros((n_samples, len(col_names)), dtype=dtype)
+    for method, log_pred_prob in zip(methods, pred.log_pred_prob):
         assert not np.any(np.isnan(log_pred_prob))  # Would let method cheat
 
         if not assume_normalized:
             log_pred_prob = normalize(log_pred_prob)
 
+        # Standard losses are done together, others are passed through
+        fused = std_class_losses(y, log_pred_prob, FUSED_CLASS_LOSS.intersection(metrics_dict.values()))
         for metric, metric_f in metrics_dict.items():
-            loss_tbl.loc[:, (metric, method)] = metric_f(y, log_pred_prob)
+            loss[:, col_names.get_loc((metric, method))] = (
+                fused[metric_f] if metric_f in fused else metric_f(y, log_pred_prob)
+            )
+    loss_tbl = pd.DataFrame(data=loss, index=pred.index, columns=col_names)
     return loss_tbl
 
 
@@ -311,23 +470,44 @@ def check_curve(result, x_grid=None):
     return curve
 
 
+def _check_buckets_average(n_buckets, average):
+    """Internal helper to reject quantized scores with one-vs-rest curves. The
+    cells of the quantized bootstrap are buckets of a single score, while the
+    one-vs-rest curves need all the labels of a data point to be resampled
+    together."""
+    if n_buckets is not None and average is not None:
+        raise ValueError("n_buckets=%s can not be combined with average=%s" % (str(n_buckets), str(average)))
+
+
 def curve_boot(
-    y, log_pred_prob, ref, curve_f=pc.roc_curve, x_grid=None, n_boot=1000, pairwise_CI=PAIRWISE_DEFAULT, confidence=0.95
+    y,
+    log_pred_prob,
+    ref,
+    curve_f=pc.roc_curve,
+    x_grid=None,
+    n_boot=1000,
+    pairwise_CI=PAIRWISE_DEFAULT,
+    confidence=0.95,
+    random_state=None,
+    n_buckets=None,
+    average=None,
 ):
     """Perform boot strap analysis of performance curve, e.g., ROC or prec-rec.
-    For binary classification only.
+    For binary classification, or one-vs-rest multi-class with `average`.
 
     Parameters
     ----------
     y : ndarray of type int or bool, shape (n_samples,)
-        Array containing true labels, must be `bool` or {0,1}.
-    log_pred_prob : ndarray, shape (n_samples, 2)
-        Array of shape ``(len(y), 2)``. Each row corresponds to a categorical
-        distribution with *normalized* probabilities in log scale. However,
-        many curves (e.g., ROC) are invariant to monotonic transformation and
-        hence linear scale could also be used.
-    ref : float or ndarray of shape (n_samples, 2)
-        If `ref` is an rray of shape ``(len(y), 2)``: Same as `log_pred_prob`
+        Array containing true labels, must be `bool` or {0,1} unless `average`
+        is used.
+    log_pred_prob : ndarray, shape (n_samples, n_labels)
+        Array of shape ``(len(y), n_labels)``. Each row corresponds to a
+        categorical distribution with *normalized* probabilities in log scale.
+        However, many curves (e.g., ROC) are invariant to monotonic
+        transformation and hence linear scale could also be used. Must have 2
+        labels unless `average` is used.
+    ref : float or ndarray of shape (n_samples, n_labels)
+        If `ref` is an rray of shape ``(len(y), n_labels)``: Same as `log_pred_prob`
         except for the reference (baseline) method if a paired statistical test
         is desired on the area under the curve. If `ref` is a scalar float:
         `curve_boot` tests the statistical significance that the area under the
@@ -335,7 +515,9 @@ def curve_boot(
         is typically 0.5.
     curve_f : callable
         Function to compute the performance curve. Standard choices are:
-        `perf_curves.roc_curve` or `perf_curves.recall_precision_curve`.
+        `perf_curves.roc_curve` or `perf_curves.recall_precision_curve`. The
+        bootstrap weights are passed to `curve_f` as a `boot_util.BootIndex`,
+        which `boot_util.index_to_weights` can convert to a dense matrix.
     x_grid : None or ndarray of shape (n_grid,)
         Grid of points to evaluate curve in results. If `None`, defaults to
         linear grid on [0,1].
@@ -346,6 +528,28 @@ def curve_boot(
         just the summary. This typically results in smaller error bars.
     confidence : float
         Confidence probability (in (0, 1)) to construct error bar.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
+    n_buckets : None or int
+        If not None, quantize the scores into at most `n_buckets` buckets with
+        `perf_curves.quantize_scores` and bootstrap the counts of each bucket
+        (and label and ref bucket), so the replicates cost O(n_boot * n_buckets)
+        rather than O(n_boot * N) when `ref` is a scalar, or
+        O(n_boot * n_buckets ** 2) when paired. This is exact if the scores
+        take at most `n_buckets` distinct values.
+        Otherwise, the error bar is widened by the bound on the error in the
+        area from `perf_curves.quantized_area_bound`. If there is no finite
+        bound (e.g., PRG curves whose area can be -inf), the error bar is not
+        widened and a warning is issued. Must be None if `average` is not.
+    average : None, 'macro', or 'micro'
+        If None, binary classification with label 1 as the positive class.
+        Otherwise, one-vs-rest curves for any number of labels: 'macro'
+        averages the curve (and area) over each label found in `y`, while
+        'micro' pools all (data point, label) pairs into one curve. All the
+        labels are sorted at once and share the boot strap replicates. With
+        'macro', `curve_f` gets a 2D `y_true` with a column per label, which
+        the curves in `perf_curves` support.
 
     Returns
     -------
@@ -360,8 +564,223 @@ def curve_boot(
         end of confidence envelope, and the upper end of the confidence
         envelope.
     """
+    _check_buckets_average(n_buckets, average)
+    results = _curve_boot_dict(
+        y,
+        log_pred_prob,
+        ref,
+        {None: curve_f},
+        x_grid=x_grid,
+        n_boot=n_boot,
+        pairwise_CI=pairwise_CI,
+        confidence=confidence,
+        random_state=random_state,
+        n_buckets=n_buckets,
+        average=average,
+    )
+    summary, curve = results[None]
+    return summary, curve
+
+
+def curve_boot_accumulated(
+    acc, ref=None, curve_f=pc.roc_curve, x_grid=None, pairwise_CI=PAIRWISE_DEFAULT, confidence=0.95
+):
+    """Finalize the boot strap analysis of a performance curve accumulated
+    over a stream of chunks of data points with `perf_curves.accumulate_curve`
+    (and merged with `perf_curves.merge_curve_accumulators`). This is the same
+    as `curve_boot` on the scores quantized to the buckets of the accumulator,
+    except that it uses the Poisson bootstrap.
+
+    Parameters
+    ----------
+    acc : CurveAccumulator
+        Accumulator from `perf_curves.curve_accumulator` with at least one data
+        point.
+    ref : None or float
+        If `acc` is paired, must be None, and the paired statistical test is
+        against the accumulated reference scores. Otherwise, the reference
+        area under the curve for a non-paired test, e.g., 0.5 for ROC.
+    curve_f : callable
+        Function to compute the performance curve, see `curve_boot`.
+    x_grid : None or ndarray of shape (n_grid,)
+        Grid of points to evaluate curve in results. If `None`, defaults to
+        linear grid on [0,1].
+    pairwise_CI : bool
+        If True, compute error bars on ``summary - summary_ref`` instead of
+        just the summary. This typically results in smaller error bars.
+    confidence : float
+        Confidence probability (in (0, 1)) to construct error bar.
+
+    Returns
+    -------
+    summary : tuple of floats, shape (3,)
+        Tuple containing (mu, EB, pval), see `curve_boot`.
+    curve : DataFrame, shape (n_grid, 4)
+        DataFrame containing four columns: `x_grid`, the curve value, the lower
+        end of confidence envelope, and the upper end of the confidence
+        envelope.
+    """
+    assert (ref is None) == acc.paired
+    assert acc.paired or not np.isnan(ref)
+
+    epsilon = 1e-10  # Min bootstrap weight since 0 weight can cause problems
+    x_grid = np.linspace(0.0, 1.0, DEFAULT_NGRID) if x_grid is None else x_grid
+    assert np.ndim(x_grid) == 1
+
+    # Each cell is a data point weighted by its count, which (like a BootIndex)
+    # also gets epsilon for each of its data points in the replicates.
+    y, score, ref_score, counts, boot_counts = pc.accumulator_cells(acc)
+    n_boot = boot_counts.shape[0]
+    chunk_size = bu.boot_chunk_size(counts.size, n_boot, bytes_per_element=bu.CURVE_BYTES)
+    weight_chunks = (
+        boot_counts[start : start + chunk_size, :] + epsilon * counts for start in range(0, n_boot, chunk_size)
+    )
+
+    results = _curve_boot_weights(
+        y,
+        score,
+        ref_score if acc.paired else ref,
+        {None: curve_f},
+        counts[None, :].astype(float),
+        weight_chunks,
+        n_boot,
+        x_grid=x_grid,
+        pairwise_CI=pairwise_CI,
+        confidence=confidence,
+    )
+    summary, curve = results[None]
+    return summary, curve
+
+
+def _quantize_cells(y, score, ref_score, n_buckets):
+    """Internal helper to quantize the scores (and reference scores, if not
+    None) into buckets with `perf_curves.quantize_scores`, and compress the
+    data points to the distinct (bucket, ref bucket, label) cells. Returns the
+    label, quantized score, and quantized ref score of each cell, the count
+    of data points in each cell, and the quantized scores and ref scores of
+    each data point (None where the quantization is exact)."""
+    bucket, thresholds = pc.quantize_scores(score, n_buckets)
+    score_q = thresholds[bucket]
+    code = 2 * bucket + y
+
+    ref_score_q = None
+    if ref_score is not None:
+        ref_bucket, ref_thresholds = pc.quantize_scores(ref_score, n_buckets)
+        ref_score_q = ref_thresholds[ref_bucket]
+        code = code + (2 * thresholds.size) * ref_bucket
+
+    _, first, counts = np.unique(code, return_index=True, return_counts=True)
+    y_cell = y[first]
+    score_cell = score_q[first]
+    ref_score_cell = None if ref_score is None else ref_score_q[first]
+
+    # No error to bound if the scores were not changed
+    score_q = None if np.all(score_q == score) else score_q
+    ref_score_q = None if ref_score is None or np.all(ref_score_q == ref_score) else ref_score_q
+    return y_cell, score_cell, ref_score_cell, counts, (score_q, ref_score_q)
+
+
+def _boot_counts_chunked(counts, n_boot, epsilon=0, random_state=None):
+    """Internal helper to yield the bootstrap counts of each cell from
+    `boot_util.boot_counts` in chunks of replicates, plus `epsilon` as the
+    curve functions need positive weights."""
+    chunk_size = bu.boot_chunk_size(counts.size, n_boot, bytes_per_element=bu.CURVE_BYTES)
+    random_state = check_random_state(random_state)
+    for start in range(0, n_boot, chunk_size):
+        n_chunk = min(chunk_size, n_boot - start)
+        yield bu.boot_counts(counts, n_chunk, random_state=random_state) + epsilon
+
+
+def _one_vs_rest(y, log_pred_prob, ref_pred_prob, average):
+    """Internal helper to set up the one-vs-rest binary problems of a multi-
+    class problem. For 'macro', there is a column for each label found in `y`
+    (the curves are not defined for the others). For 'micro', all the
+    (data point, label) pairs are flattened into one binary problem. Returns
+    the binary targets, scores, and ref scores (None if `ref_pred_prob` is)."""
+    n_labels = log_pred_prob.shape[1]
+    y_bin = one_hot(y.astype(int), n_labels)
+
+    if average == "macro":
+        labels = np.unique(y.astype(int))
+        ref_score = None if ref_pred_prob is None else ref_pred_prob[:, labels]
+        return y_bin[:, labels], log_pred_prob[:, labels], ref_score
+
+    assert average == "micro"
+    ref_score = None if ref_pred_prob is None else ref_pred_prob.ravel()
+    return y_bin.ravel(), log_pred_prob.ravel(), ref_score
+
+
+def _repeat_index(boot_idx, n_repeat):
+    """Internal helper to expand a `boot_util.BootIndex` over data points to
+    the `n_repeat` consecutive items of each data point, e.g., all the labels
+    of a data point in the flattened micro-averaged problem."""
+    index = n_repeat * boot_idx.index[:, :, None] + np.arange(n_repeat)
+    index = index.reshape((boot_idx.index.shape[0], -1))
+    return bu.BootIndex(index=index, N=boot_idx.N * n_repeat, epsilon=boot_idx.epsilon)
+
+
+def _col_mean(x, n_cols):
+    """Internal helper to average the results of the curves of a replicate,
+    which are `n_cols` consecutive rows in `x`, e.g., for macro-averaging."""
+    x = np.mean(np.reshape(x, (-1, n_cols) + np.shape(x)[1:]), axis=1)
+    return x
+
+
+def _binary_problems(y, log_pred_prob, ref_pred_prob, average):
+    """Internal helper to put everything into a vector of right type for
+    binary classification, or a binary problem per label for one-vs-rest.
+    Returns the binary targets, scores, ref scores (None if `ref_pred_prob`
+    is), and the number of consecutive curves to average."""
+    pos_label = 1  # Label=1 of [0,1] is considered a positive case
+    if average is None:
+        y = y.astype(bool)
+        score = log_pred_prob[:, pos_label]
+        ref_score = None if ref_pred_prob is None else ref_pred_prob[:, pos_label]
+    else:
+        y, score, ref_score = _one_vs_rest(y, log_pred_prob, ref_pred_prob, average)
+    n_cols = score.shape[1] if average == "macro" else 1  # Curves to average
+    return y, score, ref_score, n_cols
+
+
+def _boot_index_chunks(N, n_labels, n_boot, epsilon, average=None, random_state=None):
+    """Internal helper to draw the bootstrap replicates of the data points as
+    chunks of `boot_util.BootIndex`. Only a chunk of the replicates is
+    materialized at a time to bound the memory usage. The curve functions
+    take the sparse index representation of the weights directly."""
+    n_elements = N if average is None else N * n_labels
+    chunk_size = bu.boot_chunk_size(n_elements, n_boot, bytes_per_element=bu.CURVE_BYTES)
+    weight_chunks = bu.boot_index_chunked(N, n_boot, epsilon=epsilon, chunk_size=chunk_size, random_state=random_state)
+    if average == "micro":
+        weight_chunks = (_repeat_index(weight, n_labels) for weight in weight_chunks)
+    return weight_chunks
+
+
+@boot_cache
+def _curve_boot_dict(
+    y,
+    log_pred_prob,
+    ref,
+    curve_dict,
+    x_grid=None,
+    n_boot=1000,
+    pairwise_CI=PAIRWISE_DEFAULT,
+    confidence=0.95,
+    random_state=None,
+    n_buckets=None,
+    envelope=True,
+    average=None,
+):
+    """Internal helper to do `curve_boot` for every curve in `curve_dict` at
+    once. The scores are sorted once, and all the curves use the same
+    bootstrap replicates, so each chunk of replicates needs only one pair of
+    weighted cumsums for all the curves. Returns a dict mapping curve name to
+    the output of `curve_boot`. If `envelope` is False, the curve output is
+    None, and the replicates use `perf_curves.AREA_FUNCS` where available
+    instead of building the curves."""
     N, n_labels = shape_and_validate(y, log_pred_prob)
-    assert n_labels == 2
+    assert average in (None, "macro", "micro")
+    assert n_labels == 2 or average is not None
+    assert average is None or n_buckets is None
     assert np.ndim(ref) == 0 or ref.shape == log_pred_prob.shape
     assert not np.any(np.isnan(ref))
     assert n_boot >= 1
@@ -369,49 +788,174 @@ def curve_boot(
 
     # Setup constants
     epsilon = 1e-10  # Min bootstrap weight since 0 weight can cause problems
-    pos_label = 1  # Label=1 of [0,1] is considered a positive case
     x_grid = np.linspace(0.0, 1.0, DEFAULT_NGRID) if x_grid is None else x_grid
     assert np.ndim(x_grid) == 1
 
-    # Put everything into a vector of right type for binary classification
-    y = y.astype(bool)
-    log_pred_prob = log_pred_prob[:, pos_label]
+    paired = np.ndim(ref) == 2  # Note dim must be 0 or 2
+    y, score, ref_score, n_cols = _binary_problems(y, log_pred_prob, ref if paired else None, average)
+
+    if n_buckets is None:
+        weight_orig = None
+        weight_chunks = _boot_index_chunks(N, n_labels, n_boot, epsilon, average=average, random_state=random_state)
+    else:
+        # Replace the data by the counts of each (bucket, ref bucket, label)
+        # cell, then the replicates only need to draw the counts.
+        y_points = y
+        y, score, ref_score, counts, (score_q, ref_score_q) = _quantize_cells(y, score, ref_score, n_buckets)
+        weight_orig = counts[None, :].astype(float)
+        weight_chunks = _boot_counts_chunked(counts, n_boot, epsilon=epsilon, random_state=random_state)
+
+    results = _curve_boot_weights(
+        y,
+        score,
+        ref_score if paired else ref,
+        curve_dict,
+        weight_orig,
+        weight_chunks,
+        n_boot,
+        x_grid=x_grid,
+        pairwise_CI=pairwise_CI,
+        confidence=confidence,
+        envelope=envelope,
+        n_cols=n_cols,
+    )
+
+    # Widen the error bars by the bound on the error from quantizing
+    if n_buckets is not None:
+        for name, curve_f in curve_dict.items():
+            (auc, EB, pval), curve = results[name]
+            bound = 0.0 if score_q is None else pc.quantized_area_bound(y_points, score_q, curve_f)
+            if pairwise_CI and ref_score_q is not None:
+                bound = bound + pc.quantized_area_bound(y_points, ref_score_q, curve_f)
+            if np.isfinite(bound):
+                EB = EB + bound
+            else:
+                # e.g., PRG, whose area can be -inf for other orders in a bucket
+                warnings.warn(
+                    "no finite quantization bound for curve %s, error bar does not include quantization error"
+                    % str(name)
+                )
+            results[name] = ((auc, EB, pval), curve)
+    return results
+
+
+@boot_cache
+def _curve_boot_replicates(
+    y, log_pred_prob, curve_dict, x_grid=None, n_boot=1000, random_state=None, envelope=True, average=None
+):
+    """Internal helper to get the curve summaries of one method on the
+    original data and on the bootstrap replicates, without any reference.
+    Methods given the same `random_state` are evaluated on the same
+    replicates, so they can be compared with `_curve_summary` afterwards.
+    Returns a dict mapping curve name to the output of `_curve_boot_raw`."""
+    N, n_labels = shape_and_validate(y, log_pred_prob)
+    assert average in (None, "macro", "micro")
+    assert n_labels == 2 or average is not None
+    assert n_boot >= 1
+    assert not np.any(np.isnan(log_pred_prob))  # Would let method cheat
+
+    epsilon = 1e-10  # Min bootstrap weight since 0 weight can cause problems
+    x_grid = np.linspace(0.0, 1.0, DEFAULT_NGRID) if x_grid is None else x_grid
+    assert np.ndim(x_grid) == 1
+
+    y, score, _, n_cols = _binary_problems(y, log_pred_prob, None, average)
+    weight_chunks = _boot_index_chunks(N, n_labels, n_boot, epsilon, average=average, random_state=random_state)
+    raw, _ = _curve_boot_raw(
+        y, score, None, curve_dict, None, weight_chunks, n_boot, x_grid, envelope=envelope, n_cols=n_cols
+    )
+    return raw
+
+
+def _curve_boot_raw(
+    y, score, ref_score, curve_dict, weight_orig, weight_chunks, n_boot, x_grid, envelope=True, n_cols=1
+):
+    """Internal helper to get the curve summaries of `score` (and `ref_score`
+    if not None) given the weights of the original data `weight_orig` (None
+    for all ones) and an iterable `weight_chunks` of chunks of replicate
+    weights, which must have `n_boot` replicates in total. The curves of
+    `n_cols` consecutive rows are averaged, e.g., for macro-averaging. Returns
+    dicts mapping curve name to ``(auc, auc_boot, y_grid, y_grid_boot)`` for
+    `score` (the last two None if not `envelope`), and ``(auc, auc_boot)``
+    for `ref_score` (empty if None)."""
+    paired = ref_score is not None
+
+    # Sort the scores once for all the curves and replicates
+    score_idx = pc.score_index(y, score)
+    ref_idx = pc.score_index(y, ref_score) if paired else None
 
     # Get estimator on original data. Could use _interp1d directly since only 1
     # curve, but this is more consistent with bootstrap version below.
-    curve = check_curve(curve_f(y, log_pred_prob), x_grid)
-    auc, = area(*curve)
-    assert auc.ndim == 0
-    y_grid, = interp1d(x_grid, *curve)
-    assert y_grid.shape == x_grid.shape
-
-    # Setup boot strap weights
-    weight = bu.boot_weights(N, n_boot, epsilon=epsilon)
-
-    # Get boot strapped scores
-    curve_boot_ = check_curve(curve_f(y, log_pred_prob, weight), x_grid)
-    auc_boot = area(*curve_boot_)
-    assert auc_boot.shape == (n_boot,)
-    y_grid_boot = interp1d(x_grid, *curve_boot_)
-    assert y_grid_boot.shape == (n_boot, x_grid.size)
-
-    # Repeat area boot strap with reference predictor (if provided)
-    ref_boot = ref
-    if np.ndim(ref) == 2:  # Note dim must be 0 or 2
-        ref_boot = area(*check_curve(curve_f(y, ref[:, pos_label], weight)))
-        assert ref_boot.shape == (n_boot,)
-        ref, = area(*check_curve(curve_f(y, ref[:, pos_label])))
-    assert np.ndim(ref) == 0
+    curves = {name: check_curve(curve_f(y, score_idx, weight_orig), x_grid) for name, curve_f in curve_dict.items()}
+
+    # Without the envelopes, some areas are faster to get without the curve
+    fast = not envelope and n_cols == 1
+    area_funcs = {name: pc.AREA_FUNCS.get(curve_f) for name, curve_f in curve_dict.items()} if fast else {}
+
+    # Get boot strapped scores for all the curves on the same replicates
+    boot = {name: ([], [], []) for name in curve_dict}
+    for weight in weight_chunks:
+        for name, curve_f in curve_dict.items():
+            auc_boot, y_grid_boot, ref_boot = boot[name]
+            area_f = area_funcs.get(name)
+            if area_f is not None:
+                auc_boot.append(area_f(y, score_idx, weight))
+                if paired:
+                    ref_boot.append(area_f(y, ref_idx, weight))
+                continue
+
+            curve_boot_ = check_curve(curve_f(y, score_idx, weight), x_grid)
+            auc_boot.append(_col_mean(area(*curve_boot_), n_cols))
+            if envelope:
+                y_grid_boot.append(_col_mean(interp1d(x_grid, *curve_boot_), n_cols))
+
+            # Repeat area boot strap with reference predictor (if provided)
+            if paired:
+                ref_boot.append(_col_mean(area(*check_curve(curve_f(y, ref_idx, weight))), n_cols))
+
+    raw, ref_raw = {}, {}
+    for name, curve_f in curve_dict.items():
+        auc, = _col_mean(area(*curves[name]), n_cols)
+        auc_boot, y_grid_boot, ref_boot = boot[name]
+        auc_boot = np.concatenate(auc_boot)
+        assert auc.ndim == 0 and auc_boot.shape == (n_boot,)
+
+        y_grid = None
+        if envelope:
+            y_grid, = _col_mean(interp1d(x_grid, *curves[name]), n_cols)
+            y_grid_boot = np.concatenate(y_grid_boot, axis=0)
+            assert y_grid.shape == x_grid.shape and y_grid_boot.shape == (n_boot, x_grid.size)
+        else:
+            y_grid_boot = None
+        raw[name] = (auc, auc_boot, y_grid, y_grid_boot)
+
+        if paired:
+            ref_auc, = _col_mean(area(*check_curve(curve_f(y, ref_idx, weight_orig))), n_cols)
+            ref_boot = np.concatenate(ref_boot)
+            assert ref_auc.ndim == 0 and ref_boot.shape == (n_boot,)
+            ref_raw[name] = (ref_auc, ref_boot)
+    return raw, ref_raw
+
+
+def _curve_summary(raw, ref_raw, x_grid, pairwise_CI=PAIRWISE_DEFAULT, confidence=0.95):
+    """Internal helper to pack up the output of `curve_boot` from the curve
+    summaries `raw` of a method from `_curve_boot_raw`. The reference
+    `ref_raw` is either ``(ref_auc, ref_boot)`` on the same replicates for a
+    paired test, or the float ref summary."""
+    auc, auc_boot, y_grid, y_grid_boot = raw
+    ref_auc, ref_boot = ref_raw if isinstance(ref_raw, tuple) else (ref_raw, ref_raw)
 
     # Pack up standard numeric summary triple
     EB = (
-        bu.error_bar(auc_boot - ref_boot, auc - ref, confidence=confidence)
+        bu.error_bar(auc_boot - ref_boot, auc - ref_auc, confidence=confidence)
         if pairwise_CI
         else bu.error_bar(auc_boot, auc, confidence=confidence)
     )
     pval = bu.significance(auc_boot, ref_boot)
     summary = (auc, EB, pval)
 
+    if y_grid is None:
+        return summary, None
+
     # Pack up data frame with graphical summaries (performance curves)
     # Could also try bu.basic and see which works better
     y_LB, y_UB = bu.percentile(y_grid_boot, confidence)
@@ -421,6 +965,92 @@ def curve_boot(
     return summary, curve
 
 
+def _curve_boot_weights(
+    y,
+    score,
+    ref,
+    curve_dict,
+    weight_orig,
+    weight_chunks,
+    n_boot,
+    x_grid,
+    pairwise_CI=PAIRWISE_DEFAULT,
+    confidence=0.95,
+    envelope=True,
+    n_cols=1,
+):
+    """Internal helper to do the bootstrap of `_curve_boot_dict` given the
+    weights of the original data and the replicates, see `_curve_boot_raw`.
+    `ref` is the ref scores if paired, otherwise the float ref summary.
+    Returns the same dict as `_curve_boot_dict`."""
+    paired = np.ndim(ref) > 0
+    raw, ref_raw = _curve_boot_raw(
+        y,
+        score,
+        ref if paired else None,
+        curve_dict,
+        weight_orig,
+        weight_chunks,
+        n_boot,
+        x_grid,
+        envelope=envelope,
+        n_cols=n_cols,
+    )
+    results = {
+        name: _curve_summary(raw[name], ref_raw[name] if paired else ref, x_grid, pairwise_CI, confidence)
+        for name in curve_dict
+    }
+    return results
+
+
+def _curve_boot_table_quantized(
+    pred,
+    y,
+    curve_dict,
+    log_pred_prob_ref,
+    x_grid=None,
+    n_boot=1000,
+    pairwise_CI=PAIRWISE_DEFAULT,
+    confidence=0.95,
+    random_state=None,
+    n_jobs=1,
+    n_buckets=None,
+    envelope=True,
+    average=None,
+):
+    """Internal helper for `curve_summary_table` with `n_buckets`, which does
+    a paired `_curve_boot_dict` for each method with its own child stream.
+    Returns a list with the output of `_curve_boot_dict` for each method of
+    the `PredTensor` `pred`."""
+    # Draw the child streams up front so each curve boot strap is reproducible
+    random_state = check_random_state(random_state)
+    child_states = spawn_random_states(random_state, len(pred.methods))
+
+    # One job per method, so each method sorts its scores once for all curves
+    jobs = []
+    for log_pred_prob, child_state in zip(pred.log_pred_prob, child_states):
+        job = delayed(_curve_boot_dict)(
+            y,
+            log_pred_prob,
+            log_pred_prob_ref,
+            curve_dict,
+            x_grid=x_grid,
+            n_boot=n_boot,
+            pairwise_CI=pairwise_CI,
+            confidence=confidence,
+            random_state=child_state,
+            n_buckets=n_buckets,
+            envelope=envelope,
+            average=average,
+        )
+        jobs.append(job)
+
+    # Parallel returns results in the order of the jobs, whatever n_jobs is
+    results = Parallel(n_jobs=n_jobs)(jobs)
+    assert len(results) == len(pred.methods)
+    return results
+
+
 def curve_summary_table(
     log_pred_prob_table,
     y,
@@ -430,6 +1060,11 @@ def curve_summary_table(
     n_boot=1000,
     pairwise_CI=PAIRWISE_DEFAULT,
     confidence=0.95,
+    random_state=None,
+    n_jobs=1,
+    n_buckets=None,
+    envelope=True,
+    average=None,
 ):
     """Build table with mean and error bars of curve summaries from a table of
     probalistic predictions.
@@ -441,7 +1076,8 @@ def curve_summary_table(
         The columns should be hierarchical index that is the cartesian product
         of methods x labels. For exampe, ``log_pred_prob_table.loc[5, 'foo']``
         is the categorical distribution (in log scale) prediction that method
-        foo places on ``y[5]``.
+        foo places on ``y[5]``. May also be a `PredTensor` with the same
+        predictions as one array, see `as_pred_tensor`.
     y : ndarray of type int or bool, shape (n_samples,)
         True labels for each classication data point. Must be of same length as
         DataFrame `log_pred_prob_table`.
@@ -462,6 +1098,28 @@ def curve_summary_table(
         just the summary. This typically results in smaller error bars.
     confidence : float
         Confidence probability (in (0, 1)) to construct error bar.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`. All the methods and curves are evaluated
+        on the same replicates, so the bootstrap of the reference method is
+        only done once and the paired tests use a common resample. With
+        `n_buckets`, each method instead gets its own child stream.
+    n_jobs : int
+        Number of worker processes to spread the methods over,
+        using the `joblib` conventions (e.g., -1 means use all cores). The
+        results do not depend on `n_jobs`.
+    n_buckets : None or int
+        If not None, bootstrap the curves on scores quantized into at most
+        `n_buckets` buckets, see `curve_boot`. Must be None if `average` is
+        not.
+    envelope : bool
+        If False, skip the confidence envelopes of the curves and return an
+        empty `curve_dump`. The curve summaries are then computed faster,
+        e.g., the AUC of the ROC curve comes from weighted rank sums (see
+        `perf_curves.roc_auc`) rather than a full curve for each replicate.
+    average : None, 'macro', or 'micro'
+        If not None, use one-vs-rest curves for multi-class problems, see
+        `curve_boot`.
 
     Returns
     -------
@@ -478,17 +1136,19 @@ def curve_summary_table(
         Each key is a pair of (method name, curve name) with the value being
         a pandas dataframe with the performance curve, which has four columns:
         `x_grid`, the curve value, the lower end of confidence envelope,
-        and the upper end of the confidence envelope.
+        and the upper end of the confidence envelope. Empty if `envelope` is
+        False.
     """
-    methods, labels = log_pred_prob_table.columns.levels
-    N, n_labels = len(log_pred_prob_table), len(labels)
+    _check_buckets_average(n_buckets, average)
+    pred = as_pred_tensor(log_pred_prob_table)
+    methods = pred.methods
+    _, N, n_labels = pred.log_pred_prob.shape
     assert y.shape == (N,)
     assert ref_method in methods  # ==> len(methods) >= 1
     assert N >= 1 and n_labels >= 1 and len(curve_dict) >= 1
 
-    assert list(log_pred_prob_table[ref_method].columns) == list(range(n_labels))
-    log_pred_prob_ref = log_pred_prob_table[ref_method].values
-    assert log_pred_prob_ref.shape == (N, n_labels)
+    jj_ref = methods.get_loc(ref_method)
+    log_pred_prob_ref = pred.log_pred_prob[jj_ref]
     # Note: Most curve methods are rank based and so normalization is not
     # needed to prevent cheating. However, if we expect non-normalized methods
     # they should be normalized before to keep consistency with loss metrics.
@@ -497,30 +1157,71 @@ def curve_summary_table(
     curve_tbl = pd.DataFrame(index=methods, columns=col_names, dtype=float)
     curve_tbl.index.set_names(METHOD, inplace=True)
 
-    curve_dump = {}
-    for method in methods:
-        assert list(log_pred_prob_table[method].columns) == list(range(n_labels))
-        log_pred_prob = log_pred_prob_table[method].values
-        assert log_pred_prob.shape == (N, n_labels)
-
-        for curve_name, curve_f in curve_dict.items():
-            R = curve_boot(
+    if n_buckets is not None:
+        # The cells of each method are joint with the ref buckets, so each
+        # method needs its own paired bootstrap.
+        results = _curve_boot_table_quantized(
+            pred,
+            y,
+            curve_dict,
+            log_pred_prob_ref,
+            x_grid=x_grid,
+            n_boot=n_boot,
+            pairwise_CI=pairwise_CI,
+            confidence=confidence,
+            random_state=random_state,
+            n_jobs=n_jobs,
+            n_buckets=n_buckets,
+            envelope=envelope,
+            average=average,
+        )
+    else:
+        # Every method replays the same random stream, so all methods are on
+        # the same replicates as the reference, whose bootstrap is only done
+        # once for all the methods.
+        random_state = check_random_state(random_state)
+        shared_state, = spawn_random_states(random_state, 1)
+
+        # One job per method, so each method sorts its scores once for all curves
+        jobs = []
+        for log_pred_prob in pred.log_pred_prob:
+            job = delayed(_curve_boot_replicates)(
                 y,
                 log_pred_prob,
-                ref=log_pred_prob_ref,
-                curve_f=curve_f,
+                curve_dict,
                 x_grid=x_grid,
                 n_boot=n_boot,
-                pairwise_CI=pairwise_CI,
-                confidence=confidence,
+                random_state=deepcopy(shared_state),
+                envelope=envelope,
+                average=average,
             )
-            curve_summary, curr_curve = R
+            jobs.append(job)
+
+        # Parallel returns results in the order of the jobs, whatever n_jobs is
+        raws = Parallel(n_jobs=n_jobs)(jobs)
+        assert len(raws) == len(methods)
+
+        x_grid = np.linspace(0.0, 1.0, DEFAULT_NGRID) if x_grid is None else x_grid
+        ref_raws = raws[jj_ref]
+        results = [
+            {
+                name: _curve_summary(raw[name], ref_raws[name][:2], x_grid, pairwise_CI, confidence)
+                for name in curve_dict
+            }
+            for raw in raws
+        ]
+
+    curve_dump = {}
+    for method, R in zip(methods, results):
+        for curve_name in curve_dict:
+            curve_summary, curr_curve = R[curve_name]
             curve_tbl.loc[method, curve_name] = curve_summary
             if pairwise_CI and method == ref_method:
                 curve_tbl.loc[method, (curve_name, ERR_COL)] = np.nan
             if method == ref_method:  # NaN probably makes more sense than 1
                 curve_tbl.loc[method, (curve_name, PVAL_COL)] = np.nan
-            curve_dump[(method, curve_name)] = curr_curve
+            if envelope:
+                curve_dump[(method, curve_name)] = curr_curve
     return curve_tbl, curve_dump
 
 
@@ -536,6 +1237,14 @@ def summary_table(
     confidence=0.95,
     method_EB="t",
     limits={},
+    random_state=None,
+    n_jobs=1,
+    n_buckets=None,
+    envelope=True,
+    average=None,
+    dtype=np.float64,
+    n_boot_loss=N_BOOT,
+    return_n_boot=False,
 ):
     """Build table with mean and error bars of both loss and curve summaries
     from a table of probalistic predictions.
@@ -547,7 +1256,8 @@ def summary_table(
         The columns should be hierarchical index that is the cartesian product
         of methods x labels. For exampe, ``log_pred_prob_table.loc[5, 'foo']``
         is the categorical distribution (in log scale) prediction that method
-        foo places on ``y[5]``.
+        foo places on ``y[5]``. May also be a `PredTensor` with the same
+        predictions as one array, see `as_pred_tensor`.
     y : ndarray of type int or bool, shape (n_samples,)
         True labels for each classication data point. Must be of same length as
         DataFrame `log_pred_prob_table`.
@@ -571,12 +1281,36 @@ def summary_table(
         just the summary. This typically results in smaller error bars.
     confidence : float
         Confidence probability (in (0, 1)) to construct error bar.
-    method_EB : {'t', 'bernstein', 'boot'}
+    method_EB : {'t', 'bernstein', 'boot', 'bca'}
         Method to use for building error bar.
     limits : dict of str to (float, float)
         Dictionary mapping metric name to tuple with (lower, upper) which are
         the theoretical limits on the mean loss. For instance, zero-one loss
         should be ``(0.0, 1.0)``. If entry missing, (-inf, inf) is used.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
+    n_jobs : int
+        Number of worker processes for the curve summaries, see
+        `curve_summary_table`.
+    n_buckets : None or int
+        If not None, bootstrap the curves on quantized scores, see
+        `curve_boot`. Must be None if `average` is not.
+    envelope : bool
+        If False, skip the confidence envelopes of the curves, which makes
+        the curve summaries faster, see `curve_summary_table`.
+    average : None, 'macro', or 'micro'
+        If not None, use one-vs-rest curves for multi-class problems, see
+        `curve_boot`.
+    dtype : dtype
+        Data type of the loss table, see `loss_table`.
+    n_boot_loss : int or 'auto'
+        Number of bootstrap iterations to perform for the loss summaries when
+        `method_EB` is a bootstrap. If 'auto', stop adaptively, see
+        `mlpaper.loss_summary_table`.
+    return_n_boot : bool
+        If True, also return the number of bootstrap replications used for
+        the loss summaries.
 
     Returns
     -------
@@ -595,11 +1329,19 @@ def summary_table(
         a pandas dataframe with the performance curve, which has four columns:
         `x_grid`, the curve value, the lower end of confidence envelope,
         and the upper end of the confidence envelope. Only metrics from
-        `curve_dict` and *not* from `loss_dict` are found here.
+        `curve_dict` and *not* from `loss_dict` are found here. Empty if
+        `envelope` is False.
+    n_boot_used : int
+        Number of bootstrap replications used for the loss summaries, only
+        returned if `return_n_boot`, see `mlpaper.loss_summary_table`.
     """
+    _check_buckets_average(n_buckets, average)
+    curve_state, loss_state = spawn_random_states(check_random_state(random_state), 2)
+    pred = as_pred_tensor(log_pred_prob_table)  # Validate and slice only once
+
     # Do the curve metrics
     curve_summary, dump_tbl = curve_summary_table(
-        log_pred_prob_table,
+        pred,
         y,
         curve_dict,
         ref_method,
@@ -607,16 +1349,31 @@ def summary_table(
         n_boot=n_boot,
         pairwise_CI=pairwise_CI,
         confidence=confidence,
+        random_state=curve_state,
+        n_jobs=n_jobs,
+        n_buckets=n_buckets,
+        envelope=envelope,
+        average=average,
     )
 
     # Do loss based metrics
-    loss_tbl = loss_table(log_pred_prob_table, y, loss_dict)
-    loss_summary = loss_summary_table(
-        loss_tbl, ref_method, pairwise_CI=pairwise_CI, confidence=confidence, method_EB=method_EB, limits=limits
+    loss_tbl = loss_table(pred, y, loss_dict, dtype=dtype)
+    loss_summary, n_boot_used = loss_summary_table(
+        loss_tbl,
+        ref_method,
+        pairwise_CI=pairwise_CI,
+        confidence=confidence,
+        method_EB=method_EB,
+        limits=limits,
+        random_state=loss_state,
+        n_boot=n_boot_loss,
+        return_n_boot=True,
     )
 
     # Return the combo
     full_tbl = pd.concat((loss_summary, curve_summary), axis=1)
+    if return_n_boot:
+        return full_tbl, dump_tbl, n_boot_used
     return full_tbl, dump_tbl
 
 
@@ -653,8 +1410,34 @@ class JustNoise:
         return pred_log_prob
 
 
+def _train_predict_log_prob(method_obj, X_train, y_train, X_test, method_name=None, verbose=False):
+    """Internal helper to fit a classifier and get its predictive log
+    probabilities on the test set. This is at module level so the jobs of
+    `get_pred_log_prob` can be pickled to worker processes. The `verbose`
+    message is printed here, when the fit starts, not when the job is queued."""
+    if verbose:
+        print("Running fit/predict for {}".format(method_name))
+    method_obj.fit(X_train, y_train)
+    try:
+        pred_log_prob = method_obj.predict_log_proba(X_test)
+    except:  # noqa: E722 If there is no log proba available
+        # TODO add exception type
+        with np.errstate(divide="ignore"):  # Not unusual to have some p=0 cases
+            pred_log_prob = np.log(method_obj.predict_proba(X_test))
+    return pred_log_prob
+
+
 def get_pred_log_prob(
-    X_train, y_train, X_test, n_labels, methods, min_log_prob=-np.inf, verbose=False, checkpointdir=None
+    X_train,
+    y_train,
+    X_test,
+    n_labels,
+    methods,
+    min_log_prob=-np.inf,
+    verbose=False,
+    checkpointdir=None,
+    n_jobs=1,
+    backend=None,
 ):
     """Get the predictive probability tables for each test point on a
     collection of classification methods.
@@ -682,10 +1465,22 @@ def get_pred_log_prob(
         Minimum value to floor the predictive log probabilities (while still
         normalizing). Must be < 0. Useful to prevent inf log loss penalties.
     verbose : bool
-        If True, display which method being trained.
+        If True, print the name of each method as its fit starts, from the
+        thread or process running it. Nothing is printed for the methods
+        loaded from `checkpointdir`.
     checkpointdir : str (directory)
         If provided, stores checkpoint results using joblib for the train/test
         in case process interrupted. If None, no checkpointing is done.
+    n_jobs : int
+        Number of methods to fit and predict concurrently, using the `joblib`
+        conventions (e.g., -1 means use all cores). The results do not depend
+        on `n_jobs`.
+    backend : None or str
+        The `joblib` backend to run the methods on, e.g., 'threading' for a
+        thread pool (good for estimators that release the GIL), or
+        'multiprocessing' for worker processes. Any backend registered with
+        `joblib.register_parallel_backend` also works. If None, the `joblib`
+        default is used.
 
     Returns
     -------
@@ -698,8 +1493,9 @@ def get_pred_log_prob(
 
     Notes
     -----
-    If a train/test operation is loaded from a checkpoint file, the estimator
-    object in methods will not be in a fit state.
+    If a train/test operation is loaded from a checkpoint file, or run in a
+    worker process, the estimator object in methods will not be in a fit
+    state.
     """
     n_test = X_test.shape[0]
     assert n_test > 0
@@ -712,29 +1508,26 @@ def get_pred_log_prob(
     assert X_train.dtype.kind == X_test.dtype.kind  # Would be weird otherwise
     assert min_log_prob < 0.0  # Ensure is a log-prob
 
+    # The checkpoints are in the cache, whatever process runs the method
     memory = Memory(cachedir=checkpointdir, verbose=0)
+    train_predict = memory.cache(_train_predict_log_prob, ignore=["method_name", "verbose"])
 
-    @memory.cache
-    def train_predict(method_obj, X_train, y_train, X_test):
-        method_obj.fit(X_train, y_train)
-        try:
-            pred_log_prob = method_obj.predict_log_proba(X_test)
-        except:  # noqa: E722 If there is no log proba available
-            # TODO add exception type
-            with np.errstate(divide="ignore"):  # Not unusual to have some p=0 cases
-                pred_log_prob = np.log(method_obj.predict_proba(X_test))
-        return pred_log_prob
-
-    col_names = pd.MultiIndex.from_product([methods.keys(), range(n_labels)], names=[METHOD, LABEL])
-    log_pred_prob_table = pd.DataFrame(index=range(n_test), columns=col_names, dtype=float)
+    jobs = []
     for method_name, method_obj in methods.items():
-        if verbose:
-            print("Running fit/predict for {}".format(method_name))
-        pred_log_prob = train_predict(method_obj, X_train, y_train, X_test)
+        jobs.append(delayed(train_predict)(method_obj, X_train, y_train, X_test, method_name, verbose))
+    # Parallel returns results in the order of the jobs, whatever n_jobs is
+    results = Parallel(n_jobs=n_jobs, backend=backend)(jobs)
+    assert len(results) == len(methods)
+
+    # Fill in the layout of a DataFrame (labels x samples per method), so the
+    # table at the end is a view rather than a copy.
+    values = np.zeros((len(methods), n_labels, n_test))
+    for method_values, pred_log_prob in zip(values, results):
         assert pred_log_prob.shape == (n_test, n_labels)
 
-        pred_log_prob = normalize(np.maximum(min_log_prob, pred_log_prob))
-        log_pred_prob_table.loc[:, method_name] = pred_log_prob
+        method_values[:] = normalize(np.maximum(min_log_prob, pred_log_prob)).T
+    pred = PredTensor(methods=list(methods.keys()), log_pred_prob=np.transpose(values, (0, 2, 1)), index=range(n_test))
+    log_pred_prob_table = pred_tensor_to_table(pred)
     return log_pred_prob_table
 
 
@@ -752,6 +1545,10 @@ def just_benchmark(
     pairwise_CI=PAIRWISE_DEFAULT,
     method_EB="t",
     limits={},
+    random_state=None,
+    dtype=np.float64,
+    n_boot_loss=N_BOOT,
+    return_n_boot=False,
 ):
     """Simplest one-call interface to this package. Just pass it data and
     method objects and a performance summary DataFrame is returned.
@@ -794,12 +1591,23 @@ def just_benchmark(
     pairwise_CI : bool
         If True, compute error bars on the mean of ``loss - loss_ref`` instead
         of just the mean of `loss`. This typically gives smaller error bars.
-    method_EB : {'t', 'bernstein', 'boot'}
+    method_EB : {'t', 'bernstein', 'boot', 'bca'}
         Method to use for building error bar.
     limits : dict of str to (float, float)
         Dictionary mapping metric name to tuple with (lower, upper) which are
         the theoretical limits on the mean loss. For instance, zero-one loss
         should be ``(0.0, 1.0)``. If entry missing, (-inf, inf) is used.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
+    dtype : dtype
+        Data type of the loss table, see `loss_table`.
+    n_boot_loss : int or 'auto'
+        Number of bootstrap iterations for the loss summaries, see
+        `summary_table`.
+    return_n_boot : bool
+        If True, also return the number of bootstrap replications used for
+        the loss summaries.
 
     Returns
     -------
@@ -819,10 +1627,24 @@ def just_benchmark(
         `x_grid`, the curve value, the lower end of confidence envelope,
         and the upper end of the confidence envelope. Only metrics from
         `curve_dict` and *not* from `loss_dict` are found here.
+    n_boot_used : int
+        Number of bootstrap replications used for the loss summaries, only
+        returned if `return_n_boot`.
     """
     assert y_train.dtype == y_test.dtype  # Would be weird otherwise
     pred_tbl = get_pred_log_prob(X_train, y_train, X_test, n_labels, methods, min_log_prob=min_pred_log_prob)
-    full_tbl, dump = summary_table(
-        pred_tbl, y_test, loss_dict, curve_dict, ref_method, pairwise_CI=pairwise_CI, method_EB=method_EB, limits=limits
+    out = summary_table(
+        pred_tbl,
+        y_test,
+        loss_dict,
+        curve_dict,
+        ref_method,
+        pairwise_CI=pairwise_CI,
+        method_EB=method_EB,
+        limits=limits,
+        random_state=random_state,
+        dtype=dtype,
+        n_boot_loss=n_boot_loss,
+        return_n_boot=return_n_boot,
     )
-    return full_tbl, dump
+    return out
@@ -6,6 +6,8 @@ from builtins import range
 import numpy as np
 import pandas as pd
 
+from mlpaper.util import check_random_state
+
 RANDOM = "random"
 ORDRED = "ordered"
 LINEAR = "linear"
@@ -90,7 +92,7 @@ def index_to_series(index):
     return S
 
 
-def rand_subset(x, frac):
+def rand_subset(x, frac, random_state=None):
     """Take random subset of array `x` with a certain fraction. Rounds number
     of elements up to next integer when exact fraction is not possible.
 
@@ -100,6 +102,8 @@ def rand_subset(x, frac):
         List that we want a subset of.
     frac : float
         Fraction of `x` elements we want to keep in subset. Must be in [0,1].
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
 
     Returns
     -------
@@ -107,16 +111,17 @@ def rand_subset(x, frac):
         Array that is subset with m_samples = ceil(frac * n_samples) samples.
     """
     assert 0.0 <= frac and frac <= 1.0
+    random_state = check_random_state(random_state)
 
     N = int(np.ceil(frac * len(x)))
     assert 0 <= N and N <= len(x)
-    L = np.random.choice(x, N, replace=False)
+    L = random_state.choice(x, N, replace=False)
     assert len(L) >= len(x) * frac
     assert len(L) - 1 < len(x) * frac
     return L
 
 
-def rand_mask(n_samples, frac):
+def rand_mask(n_samples, frac, random_state=None):
     """Make a random binary mask with a certain fraction. Rounds number of
     elements up to next integer when exact fraction is not possible.
 
@@ -126,6 +131,8 @@ def rand_mask(n_samples, frac):
         Length of mask.
     frac : float
         Fraction of elements we want to be True. Must be in [0,1].
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
 
     Returns
     -------
@@ -133,7 +140,7 @@ def rand_mask(n_samples, frac):
         Random binary mask.
     """
     # Input validation on frac done in rand_subset()
-    pos = rand_subset(range(n_samples), frac)
+    pos = rand_subset(range(n_samples), frac, random_state=random_state)
     mask = np.zeros(n_samples, dtype=bool)
     mask[pos] = True
     assert np.sum(mask) >= n_samples * frac
@@ -141,7 +148,7 @@ def rand_mask(n_samples, frac):
     return mask
 
 
-def random_split_series(S, frac, assume_sorted=False, assume_unique=False):
+def random_split_series(S, frac, assume_sorted=False, assume_unique=False, random_state=None):
     """Create a binary mask to split a series into training/test based on a
     random split based on values of series. That is, elements with the same
     value in the series always get grouped into both train or both test.
@@ -159,6 +166,8 @@ def random_split_series(S, frac, assume_sorted=False, assume_unique=False):
     assume_unique : bool
         If True, assume all values in series are unique. This can be
         used for computational speedups.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`.
 
     Returns
     -------
@@ -169,16 +178,16 @@ def random_split_series(S, frac, assume_sorted=False, assume_unique=False):
     # Frac range checking taken care of by sub-routines
 
     if assume_unique:
-        train_curr = pd.Series(index=S.index, data=rand_mask(len(S), frac))
+        train_curr = pd.Series(index=S.index, data=rand_mask(len(S), frac, random_state=random_state))
     else:
         # Note: pd.unique() does not sort, this is required to maintain
         # identical result to assume_unique case (w/ same random seed).
-        train_cases = rand_subset(S.unique(), frac)
+        train_cases = rand_subset(S.unique(), frac, random_state=random_state)
         train_curr = S.isin(train_cases)
     return train_curr
 
 
-def ordered_split_series(S, frac, assume_sorted=False, assume_unique=False):
+def ordered_split_series(S, frac, assume_sorted=False, assume_unique=False, random_state=None):
     """Create a binary mask to split a series into training/test based on a
     ordered split based on values of series. That is, indices with a lower
     value get put in train and the rest go in test.
@@ -196,6 +205,8 @@ def ordered_split_series(S, frac, assume_sorted=False, assume_unique=False):
     assume_unique : bool
         If True, assume all values in series are unique. This can be
         used for computational speedups.
+    random_state : None, int, RandomState, or Generator
+        Unused, accepted so all splitters in `SPLITTER_LIB` share a signature.
 
     Returns
     -------
@@ -223,7 +234,7 @@ def ordered_split_series(S, frac, assume_sorted=False, assume_unique=False):
     return train_curr
 
 
-def linear_split_series(S, frac, assume_sorted=False, assume_unique=False):
+def linear_split_series(S, frac, assume_sorted=False, assume_unique=False, random_state=None):
     """Create a binary mask to split a series into training/test based on a
     linear split based on values of series. That is, the train/test divide is
     based on a point that is a linear interpolation between lowest value and
@@ -243,6 +254,8 @@ def linear_split_series(S, frac, assume_sorted=False, assume_unique=False):
     assume_unique : bool
         If True, assume all values in series are unique. This can be
         used for computational speedups.
+    random_state : None, int, RandomState, or Generator
+        Unused, accepted so all splitters in `SPLITTER_LIB` share a signature.
 
     Returns
     -------
@@ -270,7 +283,7 @@ def linear_split_series(S, frac, assume_sorted=False, assume_unique=False):
 SPLITTER_LIB = {RANDOM: random_split_series, ORDRED: ordered_split_series, LINEAR: linear_split_series}
 
 
-def split_df(df, splits=DEFAULT_SPLIT, assume_unique=(), assume_sorted=()):
+def split_df(df, splits=DEFAULT_SPLIT, assume_unique=(), assume_sorted=(), random_state=None):
     """Split a pandas data frame based on criteria across multiple columns.
 
     A seperate train test split is done for each column specified as a split
@@ -299,6 +312,9 @@ def split_df(df, splits=DEFAULT_SPLIT, assume_unique=(), assume_sorted=()):
     assume_unique : array-like of str
         Columns that we can assume have unique values. This can be used for
         computational speedups.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `util.check_random_state`. The random
+        splits draw from this stream in the iteration order of `splits`.
 
     Returns
     -------
@@ -313,6 +329,7 @@ def split_df(df, splits=DEFAULT_SPLIT, assume_unique=(), assume_sorted=()):
     assert len(splits) > 0
     assert len(df) > 0  # It is not hard to get working with len 0, but why.
     assert INDEX not in df  # None repr for INDEX, col name is reserved here.
+    random_state = check_random_state(random_state)
 
     train_series = pd.Series(index=df.index, data=True)
     test_series = pd.Series(index=df.index, data=True)
@@ -323,7 +340,11 @@ def split_df(df, splits=DEFAULT_SPLIT, assume_unique=(), assume_sorted=()):
 
         S = index_to_series(df.index) if feature is INDEX else df[feature]
         train_curr = splitter_f(
-            S, frac, assume_sorted=(feature in assume_sorted), assume_unique=(feature in assume_unique)
+            S,
+            frac,
+            assume_sorted=(feature in assume_sorted),
+            assume_unique=(feature in assume_unique),
+            random_state=random_state,
         )
 
         assert train_curr.dtype.kind == "b"  # Make sure ~ does right thing
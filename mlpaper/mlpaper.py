@@ -1,16 +1,45 @@
 # Ryan Turner (turnerry@iro.umontreal.ca)
 from __future__ import absolute_import, division, print_function
 
+from itertools import chain
+
 import numpy as np
 import pandas as pd
 import scipy.stats as ss
 
 import mlpaper.boot_util as bu
+from mlpaper.boot_cache import boot_cache
 from mlpaper.constants import METHOD, METRIC, PAIRWISE_DEFAULT, STAT, STD_STATS
-from mlpaper.util import clip_chk
+from mlpaper.util import check_random_state, clip_chk
 
 N_BOOT = 1000  # Default number of bootstrap replications
 
+# Settings for n_boot='auto', which draws replications in batches until the
+# Monte Carlo standard error is small enough: the error bar must be within
+# BOOT_EB_RTOL (relative) and the p-value within BOOT_PVAL_RTOL (relative) or
+# BOOT_PVAL_ATOL (absolute), whichever is looser. The relative tolerance on
+# the p-value draws more replications for small p-values near significance.
+N_BOOT_BATCH = 200
+N_BOOT_MAX = 50000
+BOOT_EB_RTOL = 0.05
+BOOT_PVAL_RTOL = 0.05
+BOOT_PVAL_ATOL = 0.001
+
+# The bootstrap resamples the counts of the distinct values (rows) instead of
+# the data points when there are at most this many, e.g., zero-one loss.
+BOOT_DISTINCT_MAX = 256
+
+# Settings above that change the results cached by `boot_cache`. N_BOOT is only
+# a default argument, so its value is already in the key.
+CACHE_KEY_SETTINGS = (
+    "N_BOOT_BATCH",
+    "N_BOOT_MAX",
+    "BOOT_EB_RTOL",
+    "BOOT_PVAL_RTOL",
+    "BOOT_PVAL_ATOL",
+    "BOOT_DISTINCT_MAX",
+)
+
 # ============================================================================
 # Statistical util functions
 # ============================================================================
@@ -21,18 +50,21 @@ def clip_EB(mu, EB, lower=-np.inf, upper=np.inf, min_EB=0.0):
     determined by trivial error bars from the a prior known limits of the
     unknown parameter `theta`. Similar to `np.clip`, but for error bars.
 
+    All arguments except `min_EB` may also be arrays, which are broadcast
+    against each other to clip many error bars at once.
+
     Parameters
     ----------
-    mu : float
+    mu : float or ndarray
         Point estimate of unknown parameter `theta` around which error bars are
         based.
-    EB : float
+    EB : float or ndarray
         Size of error bar around `mu` (``EB > 0``). The confidence interval on
         `theta` is ``[mu - EB, mu + EB]``.
-    lower : float
+    lower : float or ndarray
         A priori known theoretical lower limit on unknown parameter `theta`.
         For instance, for mean zero-one loss, ``lower=0``.
-    upper : float
+    upper : float or ndarray
         A priori known theoretical upper limit on unknown parameter `theta`.
         For instance, for mean zero-one loss, ``upper=1``.
     min_EB : float
@@ -41,24 +73,22 @@ def clip_EB(mu, EB, lower=-np.inf, upper=np.inf, min_EB=0.0):
 
     Returns
     -------
-    EB : float
+    EB : float or ndarray
         Error bar after possible clipping.
     """
-    assert np.ndim(mu) == 0 and np.ndim(EB) == 0
-    assert np.ndim(lower) == 0 and np.ndim(upper) == 0
-    assert upper - lower >= 0.0  # Also catch (inf, inf) or nans
+    assert np.all(upper - lower >= 0.0)  # Also catch (inf, inf) or nans
     assert np.ndim(min_EB) == 0
     assert 0.0 <= min_EB and min_EB < np.inf
 
     # Note: These conditions are designed to pass when NaNs are supplied.
-    if lower > mu or mu > upper:
-        raise ValueError("mu %f outside of given limits (%f, %f)" % (mu, lower, upper))
-    if 2 * min_EB > upper - lower:
-        raise ValueError("min error bar %f too small for limits (%f, %f)" % (min_EB, lower, upper))
+    if np.any(lower > mu) or np.any(mu > upper):
+        raise ValueError("mu %s outside of given limits (%s, %s)" % (mu, lower, upper))
+    if np.any(2 * min_EB > upper - lower):
+        raise ValueError("min error bar %f too small for limits (%s, %s)" % (min_EB, lower, upper))
 
     with np.errstate(invalid="ignore"):  # expect non-finite here
         EB_trivial = np.fmax(upper - mu, mu - lower)
-    assert not (min_EB > EB_trivial)  # Let NaNs pass
+    assert not np.any(min_EB > EB_trivial)  # Let NaNs pass
     EB = np.clip(EB, min_EB, EB_trivial)
     return EB
 
@@ -79,17 +109,7 @@ def t_test(x):
     """
     assert np.ndim(x) == 1 and (not np.any(np.isnan(x)))
 
-    if (len(x) <= 1) or (not np.all(np.isfinite(x))):
-        return 1.0  # Can't say anything about scale => p=1
-
-    _, pval = ss.ttest_1samp(x, 0.0)
-    if np.isnan(pval):
-        # Should only be possible if scale underflowed to zero:
-        assert np.var(x, ddof=1) <= 1e-100
-        # It is debatable if the condition should be ``np.mean(x) == 0.0`` or
-        # ``np.all(x == 0.0)``. Should not matter in practice.
-        pval = np.float(np.mean(x) == 0.0)
-    assert 0.0 <= pval and pval <= 1.0
+    pval, = t_test_cols(np.reshape(x, (-1, 1)))
     return pval
 
 
@@ -111,19 +131,8 @@ def t_EB(x, confidence=0.95):
         ``[mean(x) - EB, mean(x) + EB]``. `EB` is inf when ``len(x) <= 1``.
     """
     assert np.ndim(x) == 1 and (not np.any(np.isnan(x)))
-    assert np.ndim(confidence) == 0
-    assert 0.0 < confidence and confidence < 1.0
-
-    N = len(x)
-    if (N <= 1) or (not np.all(np.isfinite(x))):
-        return np.inf
 
-    # loc cancels out when we just want EB anyway
-    LB, UB = ss.t.interval(confidence, N - 1, loc=0.0, scale=1.0)
-    assert not (LB > UB)
-    # Just multiplying scale=ss.sem(x) is better for when scale=0
-    EB = 0.5 * ss.sem(x) * (UB - LB)
-    assert np.ndim(EB) == 0 and EB >= 0.0
+    EB, = t_EB_cols(np.reshape(x, (-1, 1)), confidence=confidence)
     return EB
 
 
@@ -154,39 +163,8 @@ def bernstein_test(x, lower, upper):
     """
     assert np.ndim(x) == 1 and (not np.any(np.isnan(x)))
     assert np.ndim(lower) == 0 and np.ndim(upper) == 0
-    range_ = upper - lower
-    assert range_ >= 0.0  # Also catch (inf, inf) or nans
-    assert np.all(lower <= x) and np.all(x <= upper)
 
-    if (len(x) <= 1) or (not np.all(np.isfinite(x))):
-        return 1.0  # Can't say anything about scale => p=1
-    if (range_ == 0.0) or (range_ == np.inf):
-        # If range_ = inf, we could use p=0, if 0 is outside of [lower, upper],
-        # but it is unclear if there is any advantage to the extra hassle.
-        # If range_ = 0, then roots not invertible and distn on data x is a
-        # point mass => everything has p=1.
-        return 1.0
-
-    # Get the moments
-    N = len(x)
-    mu = np.mean(x)
-    std = np.std(x, ddof=0)
-
-    coef = [(3.0 * range_) / N, std * np.sqrt(2.0 / N), -np.abs(mu)]
-    assert np.all(np.isfinite(coef))  # Should have caught non-finite cases
-    coef_roots = np.roots(coef)
-    assert len(coef_roots) == 2
-    assert coef_roots.dtype.kind == "f"  # Appears roots are always real
-    # Appears to always be one neg and one pos root, but we looking for square
-    # root so the positive one is the correct one. The roots can be zero.
-    assert np.sum(coef_roots <= 0.0) >= 1
-    assert np.sum(coef_roots >= 0.0) >= 1
-    B = np.max(coef_roots) ** 2  # Bernstein test statistic
-    # Sampling CDF is bounded by exponential for any true distn on x.
-    delta = 3.0 * np.exp(-B)
-
-    pval = np.minimum(1.0, delta)  # Can cap at 1 to make p-value
-    assert 0.0 <= pval and pval <= 1.0
+    pval, = bernstein_test_cols(np.reshape(x, (-1, 1)), lower, upper)
     return pval
 
 
@@ -229,28 +207,193 @@ def bernstein_EB(x, lower, upper, confidence=0.95):
     """
     assert np.ndim(x) == 1 and (not np.any(np.isnan(x)))
     assert np.ndim(lower) == 0 and np.ndim(upper) == 0
+
+    EB, = bernstein_EB_cols(np.reshape(x, (-1, 1)), lower, upper, confidence=confidence)
+    return EB
+
+
+def _check_cols(x):
+    """Internal helper to validate data for the column-wise tests and return
+    it transposed to contiguous rows. Then, the reductions over each row give
+    the same result as on a 1D array with just that column. Keeps float32 data
+    as float32 rather than making a float64 copy."""
+    x = np.asarray(x)
+    assert x.ndim == 2 and (not np.any(np.isnan(x)))
+    xT = np.ascontiguousarray(np.transpose(x), dtype=np.promote_types(x.dtype, np.float32))
+    return xT
+
+
+def t_test_cols(x):
+    """Vectorized version of `t_test` that tests each column of `x`.
+
+    Parameters
+    ----------
+    x : array-like, shape (n_samples, n_cols)
+        Array of data points to test, one test per column.
+
+    Returns
+    -------
+    pval : ndarray, shape (n_cols,)
+        p-value (in [0,1]) from t-test on each column of `x`.
+    """
+    xT = _check_cols(x)
+    n_cols, N = xT.shape
+
+    # Can't say anything about scale => p=1
+    valid = (N > 1) & np.all(np.isfinite(xT), axis=1)
+
+    pval = np.ones(n_cols)
+    if np.any(valid):
+        with np.errstate(invalid="ignore", divide="ignore"):  # Handled below
+            _, pval[valid] = ss.ttest_1samp(xT[valid, :], 0.0, axis=1)
+    degen = np.isnan(pval)
+    if np.any(degen):
+        # Should only be possible if scale underflowed to zero:
+        assert np.all(np.var(xT[degen, :], ddof=1, axis=1) <= 1e-100)
+        # It is debatable if the condition should be ``np.mean(x) == 0.0`` or
+        # ``np.all(x == 0.0)``. Should not matter in practice.
+        pval[degen] = np.mean(xT[degen, :], axis=1) == 0.0
+    assert np.all(0.0 <= pval) and np.all(pval <= 1.0)
+    return pval
+
+
+def t_EB_cols(x, confidence=0.95):
+    """Vectorized version of `t_EB` that gets error bars on the mean of each
+    column of `x`.
+
+    Parameters
+    ----------
+    x : array-like, shape (n_samples, n_cols)
+        Data points to estimate mean of each column. Must not contain NaNs.
+    confidence : float
+        Confidence probability (in (0, 1)) to construct confidence interval
+        from t statistic.
+
+    Returns
+    -------
+    EB : ndarray, shape (n_cols,)
+        Size of error bar on mean of each column (>= 0). `EB` is inf when
+        ``n_samples <= 1`` or the column is not all finite.
+    """
+    xT = _check_cols(x)
+    assert np.ndim(confidence) == 0
+    assert 0.0 < confidence and confidence < 1.0
+    n_cols, N = xT.shape
+
+    valid = (N > 1) & np.all(np.isfinite(xT), axis=1)
+
+    EB = np.full(n_cols, np.inf)
+    if np.any(valid):
+        # loc cancels out when we just want EB anyway
+        LB, UB = ss.t.interval(confidence, N - 1, loc=0.0, scale=1.0)
+        assert not (LB > UB)
+        # Just multiplying scale=ss.sem(x) is better for when scale=0
+        EB[valid] = 0.5 * ss.sem(xT[valid, :], axis=1) * (UB - LB)
+    assert np.all(EB >= 0.0)
+    return EB
+
+
+def bernstein_test_cols(x, lower, upper):
+    """Vectorized version of `bernstein_test` that tests each column of `x`.
+
+    Parameters
+    ----------
+    x : array-like, shape (n_samples, n_cols)
+        Array of data points to test, one test per column.
+    lower : float or ndarray of shape (n_cols,)
+        A priori known theoretical lower limit on unknown mean of each column.
+    upper : float or ndarray of shape (n_cols,)
+        A priori known theoretical upper limit on unknown mean of each column.
+
+    Returns
+    -------
+    pval : ndarray, shape (n_cols,)
+        p-value (in [0,1]) from Bernstein test on each column of `x`.
+    """
+    xT = _check_cols(x)
+    n_cols, N = xT.shape
+    lower, upper = np.broadcast_to(lower, (n_cols,)), np.broadcast_to(upper, (n_cols,))
     range_ = upper - lower
-    assert range_ >= 0.0  # Also catch (inf, inf) or nans
-    assert np.all(lower <= x) and np.all(x <= upper)
+    assert np.all(range_ >= 0.0)  # Also catch (inf, inf) or nans
+    assert np.all(lower[:, None] <= xT) and np.all(xT <= upper[:, None])
+
+    # Can't say anything about scale => p=1. If range_ = inf, we could use
+    # p=0, if 0 is outside of [lower, upper], but it is unclear if there is
+    # any advantage to the extra hassle. If range_ = 0, then roots not
+    # invertible and distn on data x is a point mass => everything has p=1.
+    valid = (N > 1) & np.all(np.isfinite(xT), axis=1) & (0.0 < range_) & (range_ < np.inf)
+
+    pval = np.ones(n_cols)
+    if np.any(valid):
+        # Get the moments
+        mu = np.mean(xT[valid, :], axis=1, dtype=np.float64)
+        std = np.std(xT[valid, :], ddof=0, axis=1, dtype=np.float64)
+
+        # Positive root of a * r ** 2 + b * r - c, in the form that avoids
+        # cancellation between -b and the square root of the discriminant.
+        a, b, c = (3.0 * range_[valid]) / N, std * np.sqrt(2.0 / N), np.abs(mu)
+        with np.errstate(invalid="ignore", divide="ignore"):  # 0/0 if c = 0
+            root = np.where(c > 0.0, (2.0 * c) / (b + np.sqrt(b ** 2 + 4.0 * a * c)), 0.0)
+        assert np.all(root >= 0.0)
+        B = root ** 2  # Bernstein test statistic
+        # Sampling CDF is bounded by exponential for any true distn on x.
+        delta = 3.0 * np.exp(-B)
+        pval[valid] = np.minimum(1.0, delta)  # Can cap at 1 to make p-value
+    assert np.all(0.0 <= pval) and np.all(pval <= 1.0)
+    return pval
+
+
+def bernstein_EB_cols(x, lower, upper, confidence=0.95):
+    """Vectorized version of `bernstein_EB` that gets error bars on the mean of
+    each column of `x`.
+
+    Parameters
+    ----------
+    x : array-like, shape (n_samples, n_cols)
+        Data points to estimate mean of each column. Must not contain NaNs.
+    lower : float or ndarray of shape (n_cols,)
+        A priori known theoretical lower limit on unknown mean of each column.
+    upper : float or ndarray of shape (n_cols,)
+        A priori known theoretical upper limit on unknown mean of each column.
+    confidence : float
+        Confidence probability (in (0, 1)) to construct confidence interval.
+
+    Returns
+    -------
+    EB : ndarray, shape (n_cols,)
+        Size of error bar on mean of each column (>= 0). ``EB = upper - lower``
+        when ``n_samples <= 1`` or the column is not all finite.
+    """
+    xT = _check_cols(x)
+    n_cols, N = xT.shape
+    lower, upper = np.broadcast_to(lower, (n_cols,)), np.broadcast_to(upper, (n_cols,))
+    range_ = upper - lower
+    assert np.all(range_ >= 0.0)  # Also catch (inf, inf) or nans
+    assert np.all(lower[:, None] <= xT) and np.all(xT <= upper[:, None])
     assert np.ndim(confidence) == 0
     assert 0.0 < confidence and confidence < 1.0
 
-    N = x.size
-    if (N <= 1) or (not np.all(np.isfinite(x))):
-        return range_
+    valid = (N > 1) & np.all(np.isfinite(xT), axis=1)
 
-    # From Thm 1 of Audibert et. al. (2009), must use MLE for std ==> ddof=0
-    delta = 1.0 - confidence
-    A = np.log(3.0 / delta)
-    EB = np.std(x, ddof=0) * np.sqrt((2.0 * A) / N) + (3.0 * A * range_) / N
-    assert np.ndim(EB) == 0 and EB >= 0.0
+    EB = np.array(range_, dtype=float)
+    if np.any(valid):
+        # From Thm 1 of Audibert et. al. (2009), must use MLE for std ==> ddof=0
+        delta = 1.0 - confidence
+        A = np.log(3.0 / delta)
+        std = np.std(xT[valid, :], ddof=0, axis=1, dtype=np.float64)
+        EB[valid] = std * np.sqrt((2.0 * A) / N) + (3.0 * A * range_[valid]) / N
+    assert np.all(EB >= 0.0)
     return EB
 
 
-def _boot_EB_and_test(x, confidence=0.95, n_boot=N_BOOT, return_EB=True, return_test=True, return_CI=False):
+@boot_cache
+def _boot_EB_and_test(
+    x, confidence=0.95, n_boot=N_BOOT, return_EB=True, return_test=True, return_CI=False, random_state=None, bca=False
+):
     """Internal helper function to compute both bootstrap EB and significance
     using the same random bootstrap weights, which saves computation and
-    guarantees the results are coherent with each other."""
+    guarantees the results are coherent with each other. If `bca`, the EB and
+    CI are from the BCa bootstrap rather than the percentile bootstrap."""
     assert np.ndim(x) == 1 and (not np.any(np.isnan(x)))
     # confidence is checked by bu.error_bar
 
@@ -258,14 +401,19 @@ def _boot_EB_and_test(x, confidence=0.95, n_boot=N_BOOT, return_EB=True, return_
     if (N <= 1) or (not np.all(np.isfinite(x))):
         return np.inf, 1.0, (-np.inf, np.inf)
 
-    weight = bu.boot_weights(N, n_boot)
-    mu_boot = np.mean(x * weight, axis=1)
+    mu_boot = _boot_mean(x, confidence=confidence, n_boot=n_boot, random_state=random_state)
 
     pval = bu.significance(mu_boot, ref=0.0) if return_test else 1.0
 
+    mu = np.mean(x)
+    if bca:
+        LB, UB = bu.bca(mu_boot, mu, bu.jackknife_mean_accel(x), confidence=confidence)
+        EB = np.fmax(UB - mu, mu - LB) if return_EB else np.inf
+        CI = (LB, UB) if return_CI else (-np.inf, np.inf)
+        return EB, pval, CI
+
     EB = np.inf
     if return_EB:
-        mu = np.mean(x)
         EB = bu.error_bar(mu_boot, mu, confidence=confidence)
 
     # Useful in test:
@@ -275,7 +423,298 @@ def _boot_EB_and_test(x, confidence=0.95, n_boot=N_BOOT, return_EB=True, return_
     return EB, pval, CI
 
 
-def boot_test(x, n_boot=N_BOOT):
+def _distinct_rows(x, max_distinct=BOOT_DISTINCT_MAX):
+    """Internal helper to compress the rows of `x` (1D or 2D) to its distinct
+    rows and their counts. Returns None if there are more than `max_distinct`
+    distinct rows, which is first checked on a prefix of `x` to bail out
+    early on continuous data."""
+    N = x.shape[0]
+    x_ = np.reshape(x, (N, -1))
+    if np.unique(x_[: 16 * max_distinct], axis=0).shape[0] > max_distinct:
+        return None
+
+    # Code the rows one column at a time, which is much faster than sorting
+    # the rows, and keep the codes small by re-coding after each column.
+    code = np.zeros(N, dtype=np.int64)
+    for jj in range(x_.shape[1]):
+        _, col_code = np.unique(x_[:, jj], return_inverse=True)
+        _, code = np.unique(code * (max_distinct + 1) + col_code, return_inverse=True)
+        if np.max(code) >= max_distinct:
+            return None
+    _, first, counts = np.unique(code, return_index=True, return_counts=True)
+    return x[first], counts
+
+
+def _boot_mean_counts(values, counts, n_boot=N_BOOT, random_state=None):
+    """Internal helper to compute the mean of the data on bootstrap
+    replicates from only its distinct rows `values` and their `counts`, see
+    `bu.boot_counts`. Returns ndarray of shape (n_boot,) + values.shape[1:]."""
+    counts_boot = bu.boot_counts(counts, n_boot, random_state=random_state)
+    mu_boot = np.dot(counts_boot, values) / float(np.sum(counts))
+    return mu_boot
+
+
+def _boot_auto_done(est_boot, est, delta_boot, confidence=0.95):
+    """Internal helper for ``n_boot='auto'`` to check if the Monte Carlo
+    standard error of the error bar of each column of `est_boot` (around
+    `est`) and of the p-value of each column of `delta_boot` (against zero)
+    are within tolerance. The worst column decides, and columns whose
+    replicates are all the same (e.g., the reference against itself) have no
+    Monte Carlo error."""
+    est_boot = np.reshape(est_boot, (est_boot.shape[0], -1))
+    est = np.reshape(est, (-1,))
+    delta_boot = np.reshape(delta_boot, (delta_boot.shape[0], -1))
+
+    varies = np.any(est_boot != est_boot[:1, :], axis=0)
+    EB = bu.error_bar(est_boot[:, varies], est[varies], confidence=confidence)
+    EB_se = bu.error_bar_mc_se(est_boot[:, varies], confidence=confidence)
+    EB_done = np.all(EB_se <= BOOT_EB_RTOL * EB)
+
+    varies = np.any(delta_boot != delta_boot[:1, :], axis=0)
+    pval = bu.significance(delta_boot[:, varies], ref=0.0)
+    pval_se = bu.significance_mc_se(delta_boot[:, varies], ref=0.0)
+    pval_done = np.all(pval_se <= np.fmax(BOOT_PVAL_RTOL * pval, BOOT_PVAL_ATOL))
+    return EB_done and pval_done
+
+
+def _boot_mean(x, confidence=0.95, n_boot=N_BOOT, random_state=None):
+    """Internal helper to compute the mean of `x` on bootstrap replicates. If
+    ``n_boot='auto'``, replicates are drawn in batches of `N_BOOT_BATCH` until
+    the Monte Carlo standard error of the bootstrap error bar (at level
+    `confidence`) and p-value (against zero) are within tolerance, or
+    `N_BOOT_MAX` replicates are drawn. Returns the
+    replicates as an ndarray of shape (n_boot_used,)."""
+    N = x.size
+    distinct = _distinct_rows(x)
+    if n_boot != "auto" and distinct is not None:
+        return _boot_mean_counts(*distinct, n_boot=n_boot, random_state=random_state)
+    if n_boot != "auto":
+        # Only materialize a chunk of the replicates at a time to bound memory,
+        # and gather the drawn points rather than multiply by a weight matrix.
+        chunk_size = bu.boot_chunk_size(N, n_boot, bytes_per_element=bu.GATHER_BYTES)
+        boot_chunks = bu.boot_index_chunked(N, n_boot, chunk_size=chunk_size, random_state=random_state)
+        mu_boot = np.concatenate([np.mean(x[boot_idx.index], axis=1, dtype=np.float64) for boot_idx in boot_chunks])
+        assert mu_boot.shape == (n_boot,)
+        return mu_boot
+
+    random_state = check_random_state(random_state)  # Batches share stream
+    mu = np.mean(x, dtype=np.float64)
+    mu_boot = np.zeros(0)
+    while mu_boot.size < N_BOOT_MAX:
+        n_batch = min(N_BOOT_BATCH, N_BOOT_MAX - mu_boot.size)
+        if distinct is not None:
+            mu_boot = np.concatenate((mu_boot, _boot_mean_counts(*distinct, n_boot=n_batch, random_state=random_state)))
+        else:
+            chunk_size = bu.boot_chunk_size(N, n_batch, bytes_per_element=bu.GATHER_BYTES)
+            boot_chunks = bu.boot_index_chunked(N, n_batch, chunk_size=chunk_size, random_state=random_state)
+            mu_boot = np.concatenate(
+                [mu_boot] + [np.mean(x[boot_idx.index], axis=1, dtype=np.float64) for boot_idx in boot_chunks]
+            )
+
+        if _boot_auto_done(mu_boot, mu, mu_boot, confidence=confidence):
+            break
+    return mu_boot
+
+
+def _boot_mean_table(x, confidence=0.95, n_boot=N_BOOT, jj_ref=None, pairwise_CI=False, random_state=None):
+    """Internal helper to compute the mean of each column of `x` on bootstrap
+    replicates of its rows. All the columns use the same replicates, which
+    allows for paired tests across columns. If `x` has at most
+    `BOOT_DISTINCT_MAX` distinct rows, only their counts are resampled, which
+    costs O(n_boot * n_distinct) instead of O(n_boot * n_samples).
+
+    Parameters
+    ----------
+    x : ndarray, shape (n_samples, n_cols)
+        Data points to resample. Must be all finite.
+    confidence : float
+        Confidence probability (in (0, 1)) of the error bars, only used to
+        decide when to stop if ``n_boot='auto'``.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform. If 'auto', draw batches of
+        `N_BOOT_BATCH` replications until the Monte Carlo standard error of
+        the error bar and p-value of every column is within tolerance, see
+        `boot_EB_and_test`, using at most `N_BOOT_MAX` replications.
+    jj_ref : None or ndarray of type int, shape (n_cols,)
+        Column each column is compared to in the paired tests, only used if
+        ``n_boot='auto'``. If None, each column is tested against zero.
+    pairwise_CI : bool
+        If True, the error bars are on the difference with the `jj_ref`
+        column, only used if ``n_boot='auto'``.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
+
+    Returns
+    -------
+    mu_boot : ndarray, shape (n_boot_used, n_cols)
+        Mean of each column of `x` on each bootstrap replicate.
+    """
+    N, n_cols = x.shape
+    assert N >= 1 and np.all(np.isfinite(x))
+
+    # Few distinct rows (e.g., all zero-one loss) => only resample the counts
+    distinct = _distinct_rows(x)
+    if n_boot != "auto":
+        mu_boot = _boot_mean_batch(x, distinct, n_boot=n_boot, random_state=random_state)
+        return mu_boot
+
+    assert jj_ref is not None or not pairwise_CI
+    random_state = check_random_state(random_state)  # Batches share stream
+    mu = np.mean(x, axis=0, dtype=np.float64)
+    mu_boot = np.zeros((0, n_cols))
+    while mu_boot.shape[0] < N_BOOT_MAX:
+        n_batch = min(N_BOOT_BATCH, N_BOOT_MAX - mu_boot.shape[0])
+        mu_boot_batch = _boot_mean_batch(x, distinct, n_boot=n_batch, random_state=random_state)
+        mu_boot = np.concatenate((mu_boot, mu_boot_batch), axis=0)
+
+        # Test against zero if there is no reference, like _boot_mean
+        delta_boot = mu_boot if jj_ref is None else mu_boot - mu_boot[:, jj_ref]
+        if pairwise_CI:
+            done = _boot_auto_done(delta_boot, mu - mu[jj_ref], delta_boot, confidence=confidence)
+        else:
+            done = _boot_auto_done(mu_boot, mu, delta_boot, confidence=confidence)
+        if done:
+            break
+    return mu_boot
+
+
+def _boot_mean_batch(x, distinct, n_boot=N_BOOT, random_state=None):
+    """Internal helper for `_boot_mean_table` to draw a fixed number of
+    replicates, where `distinct` is the output of `_distinct_rows` on `x`.
+    Returns ndarray of shape (n_boot, n_cols)."""
+    N, n_cols = x.shape
+
+    if distinct is not None:
+        mu_boot = _boot_mean_counts(*distinct, n_boot=n_boot, random_state=random_state)
+        assert mu_boot.shape == (n_boot, n_cols)
+        return mu_boot
+
+    if x.dtype == np.float64:
+        # One matrix product with the weights of each chunk does all columns
+        chunk_size = bu.boot_chunk_size(N, n_boot, bytes_per_element=bu.GATHER_BYTES)
+        boot_chunks = bu.boot_index_chunked(N, n_boot, chunk_size=chunk_size, random_state=random_state)
+        mu_boot = np.concatenate([bu.boot_means(bu.index_to_weights(boot_idx), x) for boot_idx in boot_chunks])
+    else:
+        # Gather all the columns at once, bounding the size of the gathered
+        # chunk, and accumulate in float64 without a float64 copy of x.
+        chunk_size = bu.boot_chunk_size(N * n_cols, n_boot, bytes_per_element=bu.GATHER_BYTES)
+        boot_chunks = bu.boot_index_chunked(N, n_boot, chunk_size=chunk_size, random_state=random_state)
+        mu_boot = np.concatenate(
+            [np.mean(x[boot_idx.index, :], axis=1, dtype=np.float64) for boot_idx in boot_chunks], axis=0
+        )
+    assert mu_boot.shape == (n_boot, n_cols)
+    return mu_boot
+
+
+def _boot_mean_stream(x_chunks, n_boot=N_BOOT, random_state=None):
+    """Internal helper to compute the mean of each column of `x` and its
+    Poisson bootstrap replicates in a single pass over a stream of chunks of
+    rows of `x`, which never needs all of `x` in memory at once.
+
+    Parameters
+    ----------
+    x_chunks : iterable of ndarray of shape (n_chunk, n_cols)
+        Chunks of rows of data that make up `x` when stacked. Must not
+        contain NaNs.
+    n_boot : int
+        Number of bootstrap iterations to perform.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
+
+    Returns
+    -------
+    N : int
+        Total number of rows in `x`.
+    mu : ndarray, shape (n_cols,)
+        Mean of each column of `x`. Entries for non-finite columns of `x` are
+        not meaningful.
+    mu_boot : ndarray, shape (n_boot, n_cols)
+        Mean of each column of `x` on each bootstrap replicate. All columns
+        use the same weights, which allows for paired tests across columns.
+    finite : ndarray of type bool, shape (n_cols,)
+        Indicates which columns of `x` are all finite.
+    """
+    random_state = check_random_state(random_state)
+
+    N, sum_x, sum_wx, sum_w, finite = 0, 0.0, 0.0, 0.0, True
+    for x in x_chunks:
+        x = np.asarray(x, dtype=float)
+        assert x.ndim == 2 and (not np.any(np.isnan(x)))
+
+        N += x.shape[0]
+        sum_x = sum_x + np.sum(x, axis=0)
+
+        finite = finite & np.all(np.isfinite(x), axis=0)
+        x = np.where(np.isfinite(x), x, 0.0)  # Boot for these cols not used
+
+        # Sub-chunk the rows so the weights drawn at once stay bounded, the rows
+        # are planned like replicates in the memory plan.
+        n_rows = bu.boot_chunk_size(n_boot, max(1, x.shape[0]), bytes_per_element=bu.GATHER_BYTES)
+        for start in range(0, x.shape[0], n_rows):
+            x_sub = x[start : start + n_rows, :]
+            weight = bu.poisson_weights(x_sub.shape[0], n_boot, random_state=random_state)
+            sum_wx = sum_wx + np.dot(weight, x_sub)
+            sum_w = sum_w + np.sum(weight, axis=1)
+    assert N >= 1  # Must not be empty
+
+    mu = sum_x / N
+    # The replicates are a ratio estimator of the mean since the Poisson
+    # weights do not sum to N. Empty replicates (with prob exp(-N)) are not
+    # defined, so just fall back to the original estimate there.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu_boot = np.where(sum_w[:, None] > 0, sum_wx / sum_w[:, None], mu[None, :])
+    assert mu_boot.shape == (n_boot, mu.size)
+    return N, mu, mu_boot, finite
+
+
+def boot_EB_and_test(x, confidence=0.95, n_boot="auto", random_state=None):
+    """Get bootstrap error bars on mean of `x` and perform a bootstrap test of
+    whether `x` has a zero mean, both from the same bootstrap replications.
+    This also reports how many replications were used, which is useful with
+    the adaptive ``n_boot='auto'``.
+
+    Parameters
+    ----------
+    x : array-like, shape (n_samples,)
+        Data points to estimate mean. Must not be empty or contain NaNs.
+    confidence : float
+        Confidence probability (in (0, 1)) to construct confidence interval.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform. If 'auto', draw batches of
+        `N_BOOT_BATCH` replications until the Monte Carlo standard error of
+        `EB` is within `BOOT_EB_RTOL` of `EB`, and that of `pval` is within
+        `BOOT_PVAL_RTOL` of `pval` or `BOOT_PVAL_ATOL`, using at most
+        `N_BOOT_MAX` replications.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
+
+    Returns
+    -------
+    EB : float
+        Size of error bar on mean (>= 0). The confidence interval is
+        ``[mean(x) - EB, mean(x) + EB]``. `EB` is inf when ``len(x) <= 1``.
+    pval : float
+        p-value (in [0,1]) from bootstrap test on `x`.
+    n_boot_used : int
+        Number of bootstrap replications used. This is 0 when the bootstrap
+        is not needed since ``len(x) <= 1`` or `x` is not all finite.
+    """
+    assert np.ndim(x) == 1 and (not np.any(np.isnan(x)))
+
+    N = x.size
+    if (N <= 1) or (not np.all(np.isfinite(x))):
+        return np.inf, 1.0, 0
+
+    mu_boot = _boot_mean(x, confidence=confidence, n_boot=n_boot, random_state=random_state)
+    EB = bu.error_bar(mu_boot, np.mean(x), confidence=confidence)
+    pval = bu.significance(mu_boot, ref=0.0)
+    return EB, pval, mu_boot.size
+
+
+def boot_test(x, n_boot=N_BOOT, random_state=None):
     """Perform a bootstrap-based test to test if the values in `x` are sampled
     from a distribution with a zero mean.
 
@@ -283,20 +722,23 @@ def boot_test(x, n_boot=N_BOOT):
     ----------
     x : array-like, shape (n_samples,)
         array of data points to test.
-    n_boot : int
-        Number of bootstrap iterations to perform.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform, see `boot_EB_and_test`.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
 
     Returns
     -------
     pval : float
         p-value (in [0,1]) from t-test on `x`.
     """
-    _, pval, _ = _boot_EB_and_test(x, n_boot=n_boot, return_EB=False, return_test=True)
+    _, pval, _ = _boot_EB_and_test(x, n_boot=n_boot, return_EB=False, return_test=True, random_state=random_state)
     assert 0.0 <= pval and pval <= 1.0
     return pval
 
 
-def boot_EB(x, confidence=0.95, n_boot=N_BOOT):
+def boot_EB(x, confidence=0.95, n_boot=N_BOOT, random_state=None):
     """Get bootstrap bound based error bars on mean of `x`.
 
     Parameters
@@ -306,8 +748,11 @@ def boot_EB(x, confidence=0.95, n_boot=N_BOOT):
     confidence : float
         Confidence probability (in (0, 1)) to construct confidence interval
         from t statistic.
-    n_boot : int
-        Number of bootstrap iterations to perform.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform, see `boot_EB_and_test`.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
 
     Returns
     -------
@@ -315,12 +760,49 @@ def boot_EB(x, confidence=0.95, n_boot=N_BOOT):
         Size of error bar on mean (>= 0). The confidence interval is
         ``[mean(x) - EB, mean(x) + EB]``. `EB` is inf when ``len(x) <= 1``.
     """
-    EB, _, _ = _boot_EB_and_test(x, confidence=confidence, n_boot=n_boot, return_EB=True, return_test=False)
+    EB, _, _ = _boot_EB_and_test(
+        x, confidence=confidence, n_boot=n_boot, return_EB=True, return_test=False, random_state=random_state
+    )
     assert np.ndim(EB) == 0 and EB >= 0.0
     return EB
 
 
-def get_mean_and_EB(x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf, method="t"):
+def bca_EB(x, confidence=0.95, n_boot=N_BOOT, random_state=None):
+    """Get BCa bootstrap based error bars on mean of `x`. This is better
+    calibrated than `boot_EB` when the distribution of `x` is skewed. The
+    acceleration uses the closed form jackknife for the mean, so this costs
+    about the same as `boot_EB`.
+
+    Parameters
+    ----------
+    x : array-like, shape (n_samples,)
+        Data points to estimate mean. Must not be empty or contain NaNs.
+    confidence : float
+        Confidence probability (in (0, 1)) to construct confidence interval.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform, see `boot_EB_and_test`.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap from, see
+        `util.check_random_state`.
+
+    Returns
+    -------
+    EB : float
+        Size of error bar on mean (>= 0). The BCa confidence interval is not
+        symmetric, so this is the larger of its two sides and
+        ``[mean(x) - EB, mean(x) + EB]`` contains it. `EB` is inf when
+        ``len(x) <= 1``.
+    """
+    EB, _, _ = _boot_EB_and_test(
+        x, confidence=confidence, n_boot=n_boot, return_EB=True, return_test=False, random_state=random_state, bca=True
+    )
+    assert np.ndim(EB) == 0 and EB >= 0.0
+    return EB
+
+
+def get_mean_and_EB(
+    x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf, method="t", random_state=None, n_boot=N_BOOT
+):
     """Get mean loss and estimated error bar.
 
     Parameters
@@ -337,8 +819,14 @@ def get_mean_and_EB(x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf,
     upper : float
         A priori known theoretical upper limit on unknown mean of `x`. For
         instance, for mean zero-one loss, ``upper=1``.
-    method : {'t', 'bernstein', 'boot'}
+    method : {'t', 'bernstein', 'boot', 'bca'}
         Method to use for building error bar.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from when ``method`` is 'boot' or 'bca', see
+        `util.check_random_state`.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform when ``method`` is 'boot' or
+        'bca', see `boot_EB_and_test`.
 
     Returns
     -------
@@ -355,7 +843,9 @@ def get_mean_and_EB(x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf,
     elif method == "bernstein":
         EB = bernstein_EB(x, lower, upper, confidence=confidence)
     elif method == "boot":
-        EB = boot_EB(x, confidence=confidence)
+        EB = boot_EB(x, confidence=confidence, n_boot=n_boot, random_state=random_state)
+    elif method == "bca":
+        EB = bca_EB(x, confidence=confidence, n_boot=n_boot, random_state=random_state)
     else:
         assert False
 
@@ -365,7 +855,7 @@ def get_mean_and_EB(x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf,
     return mu, EB
 
 
-def get_test(x, lower=-np.inf, upper=np.inf, method="t"):
+def get_test(x, lower=-np.inf, upper=np.inf, method="t", random_state=None, n_boot=N_BOOT):
     """Perform a statistical test to determine if the values in `x` are sampled
     from a distribution with a zero mean.
 
@@ -379,8 +869,15 @@ def get_test(x, lower=-np.inf, upper=np.inf, method="t"):
     upper : float
         A priori known theoretical upper limit on unknown mean of `x`. For
         instance, for mean zero-one loss, ``upper=1``.
-    method : {'t', 'bernstein', 'boot'}
-        Method to use statistical test.
+    method : {'t', 'bernstein', 'boot', 'bca'}
+        Method to use statistical test. The 'bca' method uses the same
+        bootstrap test as 'boot'.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from when ``method`` is 'boot' or 'bca', see
+        `util.check_random_state`.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform when ``method`` is 'boot' or
+        'bca', see `boot_EB_and_test`.
 
     Returns
     -------
@@ -391,14 +888,16 @@ def get_test(x, lower=-np.inf, upper=np.inf, method="t"):
         pval = t_test(x)
     elif method == "bernstein":
         pval = bernstein_test(x, lower, upper)
-    elif method == "boot":
-        pval = boot_test(x)
+    elif method in ("boot", "bca"):
+        pval = boot_test(x, n_boot=n_boot, random_state=random_state)
     else:
         assert False
     return pval
 
 
-def get_mean_EB_test(x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf, method="t"):
+def get_mean_EB_test(
+    x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf, method="t", random_state=None, n_boot=N_BOOT
+):
     """Get mean loss and estimated error bar. Also, perform a statistical test
     to determine if the values in `x` are sampled from a distribution with a
     zero mean.
@@ -417,8 +916,14 @@ def get_mean_EB_test(x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf
     upper : float
         A priori known theoretical upper limit on unknown mean of `x`. For
         instance, for mean zero-one loss, ``upper=1``.
-    method : {'t', 'bernstein', 'boot'}
+    method : {'t', 'bernstein', 'boot', 'bca'}
         Method to use for building error bar.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from when ``method`` is 'boot' or 'bca', see
+        `util.check_random_state`.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform when ``method`` is 'boot' or
+        'bca', see `boot_EB_and_test`.
 
     Returns
     -------
@@ -439,7 +944,9 @@ def get_mean_EB_test(x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf
         EB = bernstein_EB(x, lower, upper, confidence=confidence)
         pval = bernstein_test(x, lower, upper)
     elif method == "boot":
-        EB, pval, _ = _boot_EB_and_test(x, confidence=confidence)
+        EB, pval, _ = _boot_EB_and_test(x, confidence=confidence, n_boot=n_boot, random_state=random_state)
+    elif method == "bca":
+        EB, pval, _ = _boot_EB_and_test(x, confidence=confidence, n_boot=n_boot, random_state=random_state, bca=True)
     else:
         assert False
 
@@ -454,7 +961,214 @@ def get_mean_EB_test(x, confidence=0.95, min_EB=0.0, lower=-np.inf, upper=np.inf
 # ============================================================================
 
 
-def loss_summary_table(loss_table, ref_method, pairwise_CI=PAIRWISE_DEFAULT, confidence=0.95, method_EB="t", limits={}):
+def _check_loss_table(loss_table, columns, limits={}):
+    """Internal helper to validate (a chunk of rows of) a loss table against
+    the expected columns and the limits on each metric. Returns the losses as
+    an ndarray of shape (n_samples, n_metrics * n_methods)."""
+    assert loss_table.columns.equals(columns)
+    loss = loss_table.values
+    assert not np.any(np.isnan(loss))  # Would let method cheat
+    for metric in columns.levels[0]:
+        lower, upper = limits.get(metric, (-np.inf, np.inf))
+        assert lower <= upper
+        loss_metric = loss_table[metric].values
+        assert np.all(lower <= loss_metric) and np.all(loss_metric <= upper)
+    return loss
+
+
+def _column_limits(columns, ref_method, limits):
+    """Internal helper to get the limits of each column of the loss table as
+    arrays, the index of the `ref_method` column for the same metric, and
+    which columns are the reference method itself."""
+    assert columns.names == (METRIC, METHOD)
+    assert columns.is_unique  # Weird stuff happens if names not unique
+    lower = np.array([limits.get(metric, (-np.inf, np.inf))[0] for metric, _ in columns], dtype=float)
+    upper = np.array([limits.get(metric, (-np.inf, np.inf))[1] for metric, _ in columns], dtype=float)
+    jj_ref = np.array([columns.get_loc((metric, ref_method)) for metric, _ in columns], dtype=int)
+    self_comparison = np.asarray(columns.get_level_values(METHOD) == ref_method)
+    return lower, upper, jj_ref, self_comparison
+
+
+def _perf_tbl_from_stats(columns, mu, EB, pval):
+    """Internal helper to gather the stats for each (method, metric) column of
+    the loss table into the summary table in one step."""
+    metrics, methods = columns.levels
+    stats = np.stack((mu, EB, pval), axis=1)
+    assert stats.shape == (len(columns), len(STD_STATS))
+    jj = np.array([[columns.get_loc((metric, method)) for metric in metrics] for method in methods], dtype=int)
+    col_names = pd.MultiIndex.from_product([metrics, STD_STATS], names=[METRIC, STAT])
+    perf_tbl = pd.DataFrame(data=np.reshape(stats[jj, :], (len(methods), -1)), index=methods, columns=col_names)
+    perf_tbl.index.set_names(METHOD, inplace=True)
+    return perf_tbl
+
+
+def _loss_summary_from_boot(
+    columns, ref_method, N, mu, mu_boot, finite, pairwise_CI=PAIRWISE_DEFAULT, confidence=0.95, limits={}, accel=None
+):
+    """Internal helper to build the loss summary table from the mean of every
+    column of the loss table and its bootstrap replicates, which must use the
+    same replicates for every column. The arguments are the same as
+    `loss_summary_table`, with the outputs of `_boot_mean_stream` in place of
+    the loss table itself. If `accel` (one per column) is given, the error bars
+    are from the BCa bootstrap with that acceleration, otherwise from the
+    percentile bootstrap."""
+    metrics, methods = columns.levels
+    assert ref_method in methods  # ==> len(methods) >= 1
+    assert len(metrics) >= 1
+    assert mu_boot.shape == (mu_boot.shape[0], len(columns))
+    lower, upper, jj_ref, self_comparison = _column_limits(columns, ref_method, limits)
+    range_ = upper - lower
+
+    # Same as _boot_EB_and_test, can't say anything for these cases
+    valid = (N > 1) & finite
+    valid_delta = valid & finite[jj_ref]
+    delta_boot = mu_boot - mu_boot[:, jj_ref]
+    delta = np.where(self_comparison, 0.0, mu - mu[jj_ref])  # Avoid inf - inf
+
+    def boot_EB(est_boot, est, valid_):
+        if accel is None:
+            return bu.error_bar(est_boot, est, confidence=confidence)
+        LB, UB = bu.bca(est_boot, est, accel[valid_], confidence=confidence)
+        return np.fmax(UB - est, est - LB)
+
+    # All the columns get error bars and tests in one call on the replicates
+    EB, pval = np.full(len(columns), np.inf), np.ones(len(columns))
+    if pairwise_CI:
+        if np.any(valid_delta):
+            EB[valid_delta] = boot_EB(delta_boot[:, valid_delta], delta[valid_delta], valid_delta)
+        EB = clip_EB(clip_chk(delta, -range_, range_), EB, -range_, range_)
+        EB[self_comparison] = np.nan  # Otherwise leave both as nan
+    else:
+        if np.any(valid):
+            EB[valid] = boot_EB(mu_boot[:, valid], mu[valid], valid)
+        EB = clip_EB(clip_chk(mu, lower, upper), EB, lower, upper)
+    if np.any(valid_delta):
+        pval[valid_delta] = bu.significance(delta_boot[:, valid_delta], ref=0.0)
+    pval[self_comparison] = np.nan
+
+    perf_tbl = _perf_tbl_from_stats(columns, mu, EB, pval)
+    return perf_tbl
+
+
+@boot_cache
+def _loss_summary_boot(
+    loss_table,
+    ref_method,
+    pairwise_CI=PAIRWISE_DEFAULT,
+    confidence=0.95,
+    limits={},
+    random_state=None,
+    n_boot=N_BOOT,
+    bca=False,
+):
+    """Internal helper to build the loss summary table with a bootstrap that
+    resamples the whole loss table at once, so every method and metric is
+    evaluated on the same replicates. See `loss_summary_table` for arguments.
+    If `bca`, the error bars are from the BCa bootstrap rather than the
+    percentile bootstrap. Returns the summary table and the number of
+    replicates used."""
+    columns = loss_table.columns
+    loss = _check_loss_table(loss_table, columns, limits)
+    N = loss.shape[0]
+    _, _, jj_ref, _ = _column_limits(columns, ref_method, limits)
+
+    mu = np.mean(loss, axis=0, dtype=np.float64)
+    finite = np.all(np.isfinite(loss), axis=0)
+    loss = np.where(finite[None, :], loss, 0.0)  # Boot for these cols not used
+    mu_boot = _boot_mean_table(
+        loss, confidence=confidence, n_boot=n_boot, jj_ref=jj_ref, pairwise_CI=pairwise_CI, random_state=random_state
+    )
+
+    accel = None
+    if bca:
+        # Closed form jackknife of the mean for each column (or difference)
+        accel = bu.jackknife_mean_accel(loss - loss[:, jj_ref] if pairwise_CI else loss)
+
+    perf_tbl = _loss_summary_from_boot(
+        columns,
+        ref_method,
+        N,
+        mu,
+        mu_boot,
+        finite,
+        pairwise_CI=pairwise_CI,
+        confidence=confidence,
+        limits=limits,
+        accel=accel,
+    )
+    return perf_tbl, mu_boot.shape[0]
+
+
+def _loss_summary_cols(loss_table, ref_method, pairwise_CI=PAIRWISE_DEFAULT, confidence=0.95, method_EB="t", limits={}):
+    """Internal helper to build the loss summary table for the t and Bernstein
+    methods using the column-wise tests on the whole loss matrix at once. See
+    `loss_summary_table` for arguments and return value."""
+    columns = loss_table.columns
+    loss = _check_loss_table(loss_table, columns, limits)
+
+    # Get the limits and the reference column for every column of loss table
+    lower, upper, jj_ref, self_comparison = _column_limits(columns, ref_method, limits)
+    range_ = upper - lower
+
+    # Mean of contiguous rows of transpose matches mean of each column alone
+    mu = np.mean(_check_cols(loss), axis=1, dtype=np.float64)
+    deltas = loss - loss[:, jj_ref]
+
+    if method_EB == "t":
+        EB = t_EB_cols(deltas if pairwise_CI else loss, confidence=confidence)
+        pval = t_test_cols(deltas)
+    elif method_EB == "bernstein":
+        if pairwise_CI:
+            EB = bernstein_EB_cols(deltas, -range_, range_, confidence=confidence)
+        else:
+            EB = bernstein_EB_cols(loss, lower, upper, confidence=confidence)
+        pval = bernstein_test_cols(deltas, -range_, range_)
+    else:
+        assert False
+
+    if pairwise_CI:
+        mu_deltas = clip_chk(np.mean(_check_cols(deltas), axis=1, dtype=np.float64), -range_, range_)
+        EB = clip_EB(mu_deltas, EB, -range_, range_)
+        EB[self_comparison] = np.nan
+    else:
+        EB = clip_EB(clip_chk(mu, lower, upper), EB, lower, upper)
+    # This is two-sided, could include one-sided option too.
+    pval[self_comparison] = np.nan
+
+    perf_tbl = _perf_tbl_from_stats(columns, mu, EB, pval)
+    return perf_tbl
+
+
+def _loss_summary_stream(
+    loss_chunks, ref_method, pairwise_CI=PAIRWISE_DEFAULT, confidence=0.95, limits={}, random_state=None, n_boot=N_BOOT
+):
+    """Internal helper to build the loss summary table in a single pass over a
+    stream of chunks of rows of the loss table using the Poisson bootstrap. See
+    `loss_summary_table` for arguments and return value."""
+    loss_chunks = iter(loss_chunks)
+    first_chunk = next(loss_chunks)  # Must not be empty
+    columns = first_chunk.columns
+
+    validated = (_check_loss_table(loss_chunk, columns, limits) for loss_chunk in chain([first_chunk], loss_chunks))
+    N, mu, mu_boot, finite = _boot_mean_stream(validated, n_boot=n_boot, random_state=random_state)
+
+    perf_tbl = _loss_summary_from_boot(
+        columns, ref_method, N, mu, mu_boot, finite, pairwise_CI=pairwise_CI, confidence=confidence, limits=limits
+    )
+    return perf_tbl
+
+
+def loss_summary_table(
+    loss_table,
+    ref_method,
+    pairwise_CI=PAIRWISE_DEFAULT,
+    confidence=0.95,
+    method_EB="t",
+    limits={},
+    random_state=None,
+    n_boot=N_BOOT,
+    return_n_boot=False,
+):
     """Build table with mean and error bar summaries from a loss table that
     contains losses on a per data point basis.
 
@@ -466,7 +1180,11 @@ def loss_summary_table(loss_table, ref_method, pairwise_CI=PAIRWISE_DEFAULT, con
         matches `log_pred_prob_table`). The columns are a hierarchical index
         that is the cartesian product of loss x method. That is, the loss of
         method foo's prediction of ``y[5]`` according to loss function bar is
-        stored in ``loss_tbl.loc[5, ('bar', 'foo')]``.
+        stored in ``loss_tbl.loc[5, ('bar', 'foo')]``. This may also be an
+        iterable of DataFrames with the same columns, each with a chunk of the
+        rows of the loss table. Then, the summary is computed in a single pass
+        over the chunks using a Poisson bootstrap, which never needs the whole
+        loss table in memory. This requires ``method_EB='boot'``.
     ref_method : str
         Name of method that is used as reference point in paired statistical
         tests. This is usually some some of baseline method. `ref_method` must
@@ -476,12 +1194,27 @@ def loss_summary_table(loss_table, ref_method, pairwise_CI=PAIRWISE_DEFAULT, con
         of just the mean of `loss`. This typically gives smaller error bars.
     confidence : float
         Confidence probability (in (0, 1)) to construct error bar.
-    method_EB : {'t', 'bernstein', 'boot'}
-        Method to use for building error bar.
+    method_EB : {'t', 'bernstein', 'boot', 'bca'}
+        Method to use for building error bar. The 'bca' method uses the same
+        bootstrap replicates and test as 'boot', but BCa error bars.
     limits : dict of str to (float, float)
         Dictionary mapping metric name to tuple with (lower, upper) which are
         the theoretical limits on the mean loss. For instance, zero-one loss
         should be ``(0.0, 1.0)``. If entry missing, (-inf, inf) is used.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from when `method_EB` is 'boot' or 'bca', see
+        `util.check_random_state`. All methods and metrics are evaluated on
+        the same bootstrap replicates, so the comparisons with `ref_method`
+        are paired.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform when `method_EB` is 'boot'
+        or 'bca'.
+        If 'auto', draw batches of `N_BOOT_BATCH` replications until the
+        error bar and p-value of every method and metric are within the
+        Monte Carlo tolerances of `boot_EB_and_test`. A stream of losses
+        requires a fixed number.
+    return_n_boot : bool
+        If True, also return the number of bootstrap replications used.
 
     Returns
     -------
@@ -495,45 +1228,46 @@ def loss_summary_table(loss_table, ref_method, pairwise_CI=PAIRWISE_DEFAULT, con
         The statistical significance is a p-value from a two-sided hypothesis
         test on the hypothesis H0 that foo has the same mean loss as the
         reference method `ref_method`.
+    n_boot_used : int
+        Number of bootstrap replications used, only returned if
+        `return_n_boot`. This is 0 when `method_EB` is not a bootstrap.
     """
+    if not isinstance(loss_table, pd.DataFrame):
+        # Streams of losses only work with the one pass bootstrap
+        assert method_EB == "boot" and n_boot != "auto"
+        perf_tbl = _loss_summary_stream(
+            loss_table,
+            ref_method,
+            pairwise_CI=pairwise_CI,
+            confidence=confidence,
+            limits=limits,
+            random_state=random_state,
+            n_boot=n_boot,
+        )
+        return (perf_tbl, n_boot) if return_n_boot else perf_tbl
+
     assert loss_table.columns.names == (METRIC, METHOD)
     metrics, methods = loss_table.columns.levels
     assert ref_method in methods  # ==> len(methods) >= 1
     assert len(loss_table) >= 1 and len(metrics) >= 1
     # Could also test these are cartesian product if we wanted to be exhaustive
 
-    col_names = pd.MultiIndex.from_product([metrics, STD_STATS], names=[METRIC, STAT])
-    perf_tbl = pd.DataFrame(index=methods, columns=col_names, dtype=float)
-    perf_tbl.index.set_names(METHOD, inplace=True)
-    for metric in metrics:
-        lower, upper = limits.get(metric, (-np.inf, np.inf))
-        assert lower <= upper
-        loss_ref = loss_table.loc[:, (metric, ref_method)].values
-        assert loss_ref.ndim == 1  # Weird stuff happens if names not unique
-        assert not np.any(np.isnan(loss_ref))  # Would let method cheat
-        assert np.all(lower <= loss_ref) and np.all(loss_ref <= upper)
-        for method in methods:
-            loss = loss_table.loc[:, (metric, method)].values
-            assert loss.ndim == 1  # Weird stuff happens if names not unique
-            assert not np.any(np.isnan(loss))  # Would let method cheat
-            assert np.all(lower <= loss) and np.all(loss <= upper)
-
-            mu = np.mean(loss)  # This is the same in all cases
-
-            deltas = loss - loss_ref
-            range_ = upper - lower
-            self_comparison = method == ref_method
-
-            EB, pval = np.nan, np.nan
-            if pairwise_CI:
-                if not self_comparison:  # Otherwise leave both as nan
-                    _, EB, pval = get_mean_EB_test(deltas, confidence, lower=-range_, upper=range_, method=method_EB)
-            else:
-                mu_, EB = get_mean_and_EB(loss, confidence=confidence, lower=lower, upper=upper, method=method_EB)
-                assert mu_ == mu
-                if not self_comparison:  # Otherwise pval as nan
-                    pval = get_test(deltas, lower=-range_, upper=range_, method=method_EB)
-
-            # This is two-sided, could include one-sided option too.
-            perf_tbl.loc[method, metric] = (mu, EB, pval)
-    return perf_tbl
+    if method_EB in ("boot", "bca"):
+        # Draw one set of replicates for the whole table in one batch
+        perf_tbl, n_boot_used = _loss_summary_boot(
+            loss_table,
+            ref_method,
+            pairwise_CI=pairwise_CI,
+            confidence=confidence,
+            limits=limits,
+            random_state=random_state,
+            n_boot=n_boot,
+            bca=(method_EB == "bca"),
+        )
+        return (perf_tbl, n_boot_used) if return_n_boot else perf_tbl
+
+    # Vectorized over all the (metric, method) columns at once
+    perf_tbl = _loss_summary_cols(
+        loss_table, ref_method, pairwise_CI=pairwise_CI, confidence=confidence, method_EB=method_EB, limits=limits
+    )
+    return (perf_tbl, 0) if return_n_boot else perf_tbl
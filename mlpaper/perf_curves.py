@@ -1,14 +1,28 @@
 # Ryan Turner (turnerry@iro.umontreal.ca)
 from __future__ import absolute_import, print_function
 
+from collections import namedtuple
+
 import numpy as np
 
+import mlpaper.boot_util as bu
+from mlpaper.util import area, check_random_state
+
 EPSILON = 1e-10  # Size of pseudo-point to add to true/false positive count.
+CACHE_KEY_SETTINGS = ("EPSILON",)  # Settings that change results cached by `boot_cache`
 
 # Interpolation kinds used here
 LINEAR = "linear"
 PREV = "previous"
 
+# The scores sorted once, so all the curves (and bootstrap chunks) of one
+# method can share the sort and tie detection. See `score_index`.
+ScoreIndex = namedtuple("ScoreIndex", ["y_true", "order", "group", "threshold_idxs", "thresholds", "memo"])
+
+# Counts of each (label, score bucket, ref score bucket) cell of a stream of
+# data points, and their Poisson bootstrap replicates. See `curve_accumulator`.
+CurveAccumulator = namedtuple("CurveAccumulator", ["thresholds", "paired", "counts", "boot_counts"])
+
 # ============================================================================
 # Create general binary count curves
 # ============================================================================
@@ -45,12 +59,143 @@ def _add_pseudo_points(fps, tps):
     tps_fix = tps[:, -1] == 0
 
     if np.any(fps_fix) or np.any(tps_fix):
-        fps, tps = fps.astype(float), tps.astype(float)
+        dtype = np.promote_types(fps.dtype, np.float32)  # Keep float32 as is
+        fps, tps = fps.astype(dtype), tps.astype(dtype)
         fps[fps_fix, :] = EPSILON * tps[fps_fix, :]
         tps[tps_fix, :] = EPSILON * fps[tps_fix, :]
     return fps, tps
 
 
+def score_index(y_true, y_score):
+    """Sort the scores of a binary classifier and find the thresholds once, so
+    that many curves and bootstrap replicates for the same scores can be
+    computed without sorting again. The result can be passed in place of
+    `y_score` to `_binary_clf_curve` and all the curve functions here.
+
+    If `y_true` and `y_score` are 2D, each column is a one-vs-rest binary
+    problem (e.g., one per class) and all the columns are sorted at once.
+
+    Parameters
+    ----------
+    y_true : ndarray of type bool, shape (n_samples,) or (n_samples, n_cols)
+        True targets of binary classification. Cannot be empty.
+    y_score : ndarray, shape (n_samples,) or (n_samples, n_cols)
+        Estimated probabilities or decision function. Must be finite.
+
+    Returns
+    -------
+    score_idx : ScoreIndex
+        Named tuple with `y_true`, the `order` that sorts `y_score` in
+        decreasing order, the threshold `group` of each data point (in
+        original order), `threshold_idxs` (last position in sorted order for
+        each distinct score), and the distinct `thresholds` in decreasing
+        order. The `memo` dict keeps the counts for the last sample weights,
+        so curves that use the same weights object share the cumsums. In 2D,
+        `order`, `threshold_idxs`, and `thresholds` are per column with shape
+        (n_samples, n_cols): `threshold_idxs` is the last position of the
+        ties of each position in sorted order, `thresholds` are all the
+        scores sorted, and `group` is None.
+    """
+    assert y_true.ndim in (1, 2) and y_true.dtype.kind == "b"
+    assert y_score.shape == y_true.shape and np.all(np.isfinite(y_score))
+    assert y_true.size >= 1, "y_true.size {}".format(y_true.size)
+
+    if y_true.ndim == 2:
+        return _ovr_score_index(y_true, y_score)
+
+    # sort scores and corresponding truth values
+    desc_score_indices = np.argsort(y_score, kind="mergesort")[::-1]
+    y_score = y_score[desc_score_indices]
+
+    # y_score typically has many tied values. Here we extract
+    # the indices associated with the distinct values. We also
+    # concatenate a value for the end of the curve.
+    distinct = np.diff(y_score) != 0
+    threshold_idxs = np.r_[np.where(distinct)[0], y_true.size - 1]
+
+    # Find the threshold of each data point in the original order
+    group = np.zeros(y_true.size, dtype=int)
+    group[desc_score_indices] = np.r_[0, np.cumsum(distinct)]
+
+    score_idx = ScoreIndex(
+        y_true=y_true,
+        order=desc_score_indices,
+        group=group,
+        threshold_idxs=threshold_idxs,
+        thresholds=y_score[threshold_idxs],
+        memo={},
+    )
+    return score_idx
+
+
+def _ovr_score_index(y_true, y_score):
+    """Internal helper for `score_index` with a column per binary problem.
+    The ties are not collapsed, so every column has the same number of
+    thresholds. Instead, each position points to the end of its ties."""
+    N, n_cols = y_true.shape
+
+    # Same sort as in 1D, but all the columns at once
+    desc_score_indices = np.argsort(y_score, axis=0, kind="mergesort")[::-1]
+    y_score = np.take_along_axis(y_score, desc_score_indices, axis=0)
+
+    # Last position of the ties of each position, via a reverse cummin
+    distinct = np.concatenate((np.diff(y_score, axis=0) != 0, np.ones((1, n_cols), dtype=bool)), axis=0)
+    last = np.where(distinct, np.arange(N)[:, None], N - 1)
+    threshold_idxs = np.minimum.accumulate(last[::-1, :], axis=0)[::-1, :]
+
+    score_idx = ScoreIndex(
+        y_true=y_true, order=desc_score_indices, group=None, threshold_idxs=threshold_idxs, thresholds=y_score, memo={}
+    )
+    return score_idx
+
+
+def _ovr_counts(score_idx, sample_weight):
+    """Internal helper for `_binary_clf_curve` with a column per binary
+    problem, see `score_index`. Returns the false and true positive counts
+    with shape (n_boot * n_cols, n_samples), so the curves of each replicate
+    are in consecutive rows. Positions in the middle of ties take the counts
+    at the end of the ties, which only adds duplicate points to the curve."""
+    y_true, order, threshold_idxs = score_idx.y_true, score_idx.order, score_idx.threshold_idxs
+    N, n_cols = y_true.shape
+
+    epsilon = 0.0
+    if sample_weight is None:
+        weight = np.ones((1, N))
+    elif isinstance(sample_weight, bu.BootIndex):
+        assert sample_weight.N == N
+        assert sample_weight.epsilon > 0  # 0 can violate assumps. of other funcs
+        # Integer counts keep the cumsums exact, epsilon is added after
+        epsilon = sample_weight.epsilon
+        weight = bu.index_to_weights(sample_weight._replace(epsilon=0))
+    else:
+        assert sample_weight.ndim == 2
+        assert sample_weight.shape[1] == N
+        assert np.all(np.isfinite(sample_weight))
+        assert np.all(sample_weight > 0)
+        weight = sample_weight
+
+    # Weights in the sorted order of each column, shape (n_boot, n_cols, N)
+    # so each curve is contiguous for the cumsums.
+    order, y_true, threshold_idxs = (np.ascontiguousarray(x.T) for x in (order, y_true, threshold_idxs))
+    y_true = np.take_along_axis(y_true, order, axis=1)
+    weight = np.take(weight, order, axis=1)  # C order, unlike weight[:, order]
+    total = np.cumsum(weight, axis=2)
+    weight *= y_true
+    tps = np.cumsum(weight, axis=2)
+    fps = total - tps  # Exact with the integer counts of a BootIndex
+    if epsilon != 0:
+        tps += np.cumsum(epsilon * y_true, axis=1)
+        fps += np.cumsum(epsilon * ~y_true, axis=1)
+
+    # Counts at the end of the ties (if any), then each curve on its own row
+    if np.any(threshold_idxs != np.arange(N)):
+        tps = np.take_along_axis(tps, threshold_idxs[None, :, :], axis=2)
+        fps = np.take_along_axis(fps, threshold_idxs[None, :, :], axis=2)
+    tps = tps.reshape((-1, N))
+    fps = fps.reshape((-1, N))
+    return fps, tps
+
+
 def _binary_clf_curve(y_true, y_score, sample_weight=None):
     """Calculate true and false positives per binary classification threshold.
 
@@ -63,12 +208,22 @@ def _binary_clf_curve(y_true, y_score, sample_weight=None):
 
     Parameters
     ----------
-    y_true : ndarray of type bool, shape (n_samples,)
-        True targets of binary classification. Cannot be empty.
-    y_score : ndarray, shape (n_samples,)
-        Estimated probabilities or decision function. Must be finite.
-    sample_weight : None or ndarray of shape (n_boot, n_samples)
-        Sample weights. If `None`, all weights are one.
+    y_true : ndarray of type bool, shape (n_samples,) or (n_samples, n_cols)
+        True targets of binary classification. Cannot be empty. If 2D, each
+        column is a separate one-vs-rest problem, and the output has a row for
+        each column of each replicate, i.e., ``n_boot * n_cols`` rows.
+    y_score : ndarray of shape (n_samples,) or ScoreIndex
+        Estimated probabilities or decision function. Must be finite. Must be
+        the same shape as `y_true` if not a `ScoreIndex`. If a `ScoreIndex`
+        (from `score_index` on `y_true`), the sort is skipped.
+        Then, repeated calls with the same `sample_weight` object (which must
+        not be modified in between) reuse the counts from the last call.
+    sample_weight : None, ndarray of shape (n_boot, n_samples), or BootIndex
+        Sample weights. If `None`, all weights are one. If a `BootIndex` (from
+        `boot_util.boot_index`), the weights implied by the drawn indices are
+        used without building the dense weight matrix. The counts are then
+        accumulated in exact integer arithmetic, and output as ``float32`` if
+        `y_score` is ``float32`` to save memory.
 
     Returns
     -------
@@ -83,27 +238,51 @@ def _binary_clf_curve(y_true, y_score, sample_weight=None):
         number of positive samples is equal to ``tps[-1]`` (thus false
         negatives are given by ``tps[-1] - tps``).
     thresholds : ndarray, shape (n_thresholds,)
-        Decreasing score values.
+        Decreasing score values. If `y_true` is 2D, shape is
+        (n_cols, n_thresholds) with a row for each column.
     """
-    assert y_true.ndim == 1 and y_true.dtype.kind == "b"
-    assert y_score.shape == y_true.shape and np.all(np.isfinite(y_score))
-    assert y_true.size >= 1, "y_true.size {}".format(y_true.size)
-
-    # sort scores and corresponding truth values
-    desc_score_indices = np.argsort(y_score, kind="mergesort")[::-1]
-    y_score, y_true = y_score[desc_score_indices], y_true[desc_score_indices]
-
-    # y_score typically has many tied values. Here we extract
-    # the indices associated with the distinct values. We also
-    # concatenate a value for the end of the curve.
-    distinct_value_indices = np.where(np.diff(y_score))[0]
-    threshold_idxs = np.r_[distinct_value_indices, y_true.size - 1]
-
-    if sample_weight is None:
+    shared = isinstance(y_score, ScoreIndex)
+    score_idx = y_score if shared else score_index(y_true, y_score)
+    assert y_true is score_idx.y_true or np.array_equal(y_true, score_idx.y_true)
+    if "weight" in score_idx.memo and score_idx.memo["weight"] is sample_weight:
+        return score_idx.memo["curve"]
+
+    desc_score_indices, threshold_idxs = score_idx.order, score_idx.threshold_idxs
+
+    if score_idx.y_true.ndim == 2:
+        # Each column has its own order, which _ovr_counts applies itself
+        fps, tps = _ovr_counts(score_idx, sample_weight)
+    elif sample_weight is None:
+        y_true = y_true[desc_score_indices]
         tps = np.cumsum(y_true)[threshold_idxs]
         fps = 1 + threshold_idxs - tps
         assert fps[-1] == np.sum(~y_true) and tps[-1] == np.sum(y_true)
         tps, fps = tps[None, :], fps[None, :]  # Make output 2D in either case
+    elif isinstance(sample_weight, bu.BootIndex):
+        assert sample_weight.N == y_true.size
+        assert sample_weight.epsilon > 0  # 0 can violate assumps. of other funcs
+
+        # Use the threshold of each data point in the original order to get
+        # the total (positive) weight at each threshold without densifying.
+        group, y_orig = score_idx.group, score_idx.y_true
+        n_groups = threshold_idxs.size
+        dtype = np.float32 if score_idx.thresholds.dtype == np.float32 else np.float64
+
+        # Count the draws of each class at each threshold as integers so the
+        # cumsums are exact (even if output is float32), then add epsilon.
+        assert y_true.size < 2 ** 31  # Counts must fit in int32
+        no_eps = sample_weight._replace(epsilon=0)
+        # Put the negatives in an extra group at the end to drop
+        pos_group = np.where(y_orig, group, n_groups)
+        pos_counts = bu.index_group_sums(no_eps, pos_group, n_groups + 1, dtype=np.int32)[:, :-1]
+        neg_counts = bu.index_group_sums(no_eps, group, n_groups, dtype=np.int32) - pos_counts
+        pos_eps = sample_weight.epsilon * np.bincount(group[y_orig], minlength=n_groups)
+        neg_eps = sample_weight.epsilon * np.bincount(group[~y_orig], minlength=n_groups)
+
+        tps = np.cumsum(pos_counts, axis=1).astype(dtype) + np.cumsum(pos_eps).astype(dtype)
+        fps = np.cumsum(neg_counts, axis=1).astype(dtype) + np.cumsum(neg_eps).astype(dtype)
+        total = sample_weight.N * (1.0 + sample_weight.epsilon)
+        assert np.allclose(fps[:, -1] + tps[:, -1], total)
     else:
         assert sample_weight.ndim == 2
         assert sample_weight.shape[1] == y_true.size
@@ -112,6 +291,7 @@ def _binary_clf_curve(y_true, y_score, sample_weight=None):
         # Negative weight makes no sense, 0 can violate assumps. of other funcs
         assert np.all(sample_weight > 0)
 
+        y_true = y_true[desc_score_indices]
         weight = sample_weight[:, desc_score_indices]
         tps = np.cumsum(y_true[None, :] * weight, axis=1)[:, threshold_idxs]
         fps = np.cumsum(weight, axis=1)[:, threshold_idxs] - tps
@@ -121,8 +301,8 @@ def _binary_clf_curve(y_true, y_score, sample_weight=None):
     # Now put in the (0, 0) coord (y_score >= np.inf)
     zero_vec = np.zeros((fps.shape[0], 1), dtype=fps.dtype)
     fps, tps = np.c_[zero_vec, fps], np.c_[zero_vec, tps]
-    thresholds = np.r_[np.inf, y_score[threshold_idxs]]
-    assert thresholds.ndim == 1 and thresholds.size >= 2
+    thresholds = np.concatenate((np.full(score_idx.thresholds.shape[1:], np.inf)[None], score_idx.thresholds)).T
+    assert thresholds.shape[-1] == fps.shape[1] and thresholds.shape[-1] >= 2
 
     # Clean up corner case
     fps, tps = _add_pseudo_points(fps, tps)
@@ -133,9 +313,244 @@ def _binary_clf_curve(y_true, y_score, sample_weight=None):
     fps = np.maximum.accumulate(fps, axis=1)
     assert np.all((np.diff(fps, axis=1) >= 0.0) & (np.diff(tps, axis=1) >= 0.0))
 
+    if shared:
+        # Shared with later calls for the same weights, so must not be changed
+        for arr in (fps, tps, thresholds):
+            arr.flags.writeable = False
+        score_idx.memo.clear()
+        score_idx.memo.update(weight=sample_weight, curve=(fps, tps, thresholds))
     return fps, tps, thresholds
 
 
+def quantize_scores(y_score, n_buckets):
+    """Bucket the scores into at most `n_buckets` thresholds, so the curves
+    (and their bootstrap) only need counts per bucket. This is exact if there
+    are at most `n_buckets` distinct scores, e.g., probabilities from the
+    leaves of a tree. Otherwise, the thresholds are quantiles of the scores,
+    which ties the scores within each bucket.
+
+    Parameters
+    ----------
+    y_score : ndarray, shape (n_samples,)
+        Estimated probabilities or decision function. Must be finite.
+    n_buckets : int
+        Max number of buckets, must be >= 1.
+
+    Returns
+    -------
+    bucket : ndarray of type int, shape (n_samples,)
+        Bucket of each score, such that
+        ``thresholds[bucket - 1] < y_score <= thresholds[bucket]``.
+    thresholds : ndarray, shape (n_thresholds,)
+        Increasing upper end of each bucket, which is a score in the bucket.
+        Using ``thresholds[bucket]`` as the score gives the quantized scores.
+    """
+    assert y_score.ndim == 1 and np.all(np.isfinite(y_score))
+    assert n_buckets >= 1
+
+    thresholds = np.unique(y_score)
+    if thresholds.size > n_buckets:
+        # Use actual scores as quantiles, so no bucket is empty
+        q = np.linspace(0.0, 100.0, n_buckets + 1)[1:]
+        thresholds = np.unique(np.percentile(y_score, q, interpolation="higher"))
+    bucket = np.searchsorted(thresholds, y_score, side="left")
+    assert np.all(y_score <= thresholds[bucket])
+    return bucket, thresholds
+
+
+def quantized_area_bound(y_true, y_score, curve_f):
+    """Bound the error in the area under a curve from quantizing the scores,
+    e.g., with `quantize_scores`. The curve on the quantized scores treats the
+    scores in each bucket as ties. The area for the unquantized scores is
+    between the area when the positives in each bucket are ranked first and
+    the area when they are ranked last. This holds for
+    ROC and precision-recall curves, but not for PRG curves whose area can be
+    -inf for other orderings.
+
+    Parameters
+    ----------
+    y_true : ndarray of type bool, shape (n_samples,)
+        True targets of binary classification. Cannot be empty.
+    y_score : ndarray, shape (n_samples,)
+        Quantized scores of each data point. Must be finite.
+    curve_f : callable
+        Curve function, e.g., `roc_curve` or `recall_precision_curve`.
+
+    Returns
+    -------
+    bound : float
+        Max absolute difference between the area on the quantized scores and
+        the area for any ordering of the scores within each bucket (>= 0).
+    """
+    # Positives first in each bucket, with no ties left since a run of tied
+    # positives is one step of a precision-recall curve.
+    best = np.empty(y_score.shape)
+    best[np.lexsort((y_true, y_score))] = np.arange(y_score.size)
+    # Positives last in each bucket, and tied with each other
+    _, rank = np.unique(y_score, return_inverse=True)
+    worst = 2.0 * rank + ~y_true
+
+    (auc, auc_best, auc_worst), = np.stack(
+        [area(*curve_f(y_true, score)[0]) for score in (y_score, best, worst)], axis=1
+    )
+    with np.errstate(invalid="ignore"):  # inf - inf => nan bound for PRG
+        bound = np.maximum(0.0, np.maximum(auc_best - auc, auc - auc_worst))
+    return bound
+
+
+# ============================================================================
+# Accumulate the bucket counts of a stream of data points
+# ============================================================================
+
+
+def curve_accumulator(thresholds, n_boot, paired=False):
+    """Create an empty accumulator for the curves of a stream of chunks of
+    data points, e.g., predictions made in shards, that never needs all the
+    data in memory at once. The scores are put in fixed buckets, so the
+    accumulators of different shards (or processes) can be merged with
+    `merge_curve_accumulators`. The curves are then the same as on the scores
+    quantized to the buckets, like with `quantize_scores`.
+
+    Parameters
+    ----------
+    thresholds : ndarray, shape (n_thresholds,)
+        Increasing upper end of each bucket, which must be the same for all
+        the accumulators to merge. The scores above ``thresholds[-1]`` go in
+        an extra bucket at the end. For instance, the `thresholds` from
+        `quantize_scores` on a sample of the scores.
+    n_boot : int
+        Number of bootstrap replicates, must be >= 1.
+    paired : bool
+        If True, also bucket the scores of a reference method with the same
+        `thresholds`. This is needed for paired tests, but uses
+        ``n_thresholds + 1`` times more memory.
+
+    Returns
+    -------
+    acc : CurveAccumulator
+        Accumulator with no data points, for `accumulate_curve`.
+    """
+    assert np.ndim(thresholds) == 1 and np.all(np.isfinite(thresholds))
+    assert np.all(np.diff(thresholds) > 0)
+    assert n_boot >= 1
+
+    n_buckets = thresholds.size + 1
+    n_cells = 2 * n_buckets * (n_buckets if paired else 1)
+    acc = CurveAccumulator(
+        thresholds=thresholds,
+        paired=paired,
+        counts=np.zeros(n_cells, dtype=np.int64),
+        boot_counts=np.zeros((n_boot, n_cells), dtype=np.int64),
+    )
+    return acc
+
+
+def accumulate_curve(acc, y_true, y_score, ref_score=None, random_state=None):
+    """Add a chunk of data points to an accumulator from `curve_accumulator`.
+    Each data point gets independent Poisson(1) bootstrap weights (see
+    `boot_util.poisson_weights`), so the chunks can be added in any order and
+    split over any number of accumulators.
+
+    Parameters
+    ----------
+    acc : CurveAccumulator
+        Accumulator to add the chunk to, which is updated in place.
+    y_true : ndarray of type bool, shape (n_samples,)
+        True targets of binary classification of the chunk.
+    y_score : ndarray, shape (n_samples,)
+        Estimated probabilities or decision function. Must be finite.
+    ref_score : None or ndarray of shape (n_samples,)
+        Scores of the reference method, must be given iff `acc` is paired.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the bootstrap weights from, see
+        `util.check_random_state`. Accumulators merged later must use
+        independent streams, e.g., from `util.spawn_random_states`.
+
+    Returns
+    -------
+    acc : CurveAccumulator
+        The same accumulator, after adding the chunk.
+    """
+    assert y_true.ndim == 1 and y_true.shape == y_score.shape
+    assert np.all(np.isfinite(y_score))
+    assert (ref_score is not None) == acc.paired
+    random_state = check_random_state(random_state)
+
+    n_buckets = acc.thresholds.size + 1
+    cell = y_true.astype(int) + 2 * np.searchsorted(acc.thresholds, y_score, side="left")
+    if acc.paired:
+        assert ref_score.shape == y_score.shape and np.all(np.isfinite(ref_score))
+        cell = cell + (2 * n_buckets) * np.searchsorted(acc.thresholds, ref_score, side="left")
+    counts = np.bincount(cell, minlength=acc.counts.size)
+
+    # The sum of the Poisson(1) weights of the points in a cell is Poisson with
+    # the count as its mean, so only the non-empty cells need a draw.
+    nz = np.flatnonzero(counts)
+    acc.counts[nz] += counts[nz]
+    acc.boot_counts[:, nz] += random_state.poisson(counts[nz], size=(acc.boot_counts.shape[0], nz.size))
+    return acc
+
+
+def merge_curve_accumulators(accs):
+    """Merge accumulators of disjoint chunks of data points, e.g., from
+    different shards or processes.
+
+    Parameters
+    ----------
+    accs : iterable of CurveAccumulator
+        Accumulators to merge, which must have the same thresholds, number of
+        bootstrap replicates, and be all paired or all not paired.
+
+    Returns
+    -------
+    acc : CurveAccumulator
+        New accumulator with the data points of all of `accs`.
+    """
+    accs = list(accs)
+    assert len(accs) >= 1
+    first = accs[0]
+    assert all(np.array_equal(acc.thresholds, first.thresholds) and acc.paired == first.paired for acc in accs)
+    assert all(acc.boot_counts.shape == first.boot_counts.shape for acc in accs)
+
+    acc = first._replace(
+        counts=np.sum([acc.counts for acc in accs], axis=0),
+        boot_counts=np.sum([acc.boot_counts for acc in accs], axis=0),
+    )
+    return acc
+
+
+def accumulator_cells(acc):
+    """Get the non-empty cells of an accumulator as a data set with a weight
+    for each cell, which the curve functions take as `sample_weight`.
+
+    Parameters
+    ----------
+    acc : CurveAccumulator
+        Accumulator with at least one data point.
+
+    Returns
+    -------
+    y_cell : ndarray of type bool, shape (n_cells,)
+        True target of each cell.
+    score_cell : ndarray of type int, shape (n_cells,)
+        Score bucket of each cell, which has the same order as the scores.
+    ref_score_cell : None or ndarray of type int, shape (n_cells,)
+        Ref score bucket of each cell, None if `acc` is not paired.
+    counts : ndarray of type int, shape (n_cells,)
+        Number of data points in each cell.
+    boot_counts : ndarray of type int, shape (n_boot, n_cells)
+        Sum of the bootstrap weights of the data points in each cell.
+    """
+    cell = np.flatnonzero(acc.counts)
+    assert cell.size >= 1  # Must not be empty
+
+    n_buckets = acc.thresholds.size + 1
+    y_cell = (cell % 2).astype(bool)
+    score_cell = (cell // 2) % n_buckets
+    ref_score_cell = cell // (2 * n_buckets) if acc.paired else None
+    return y_cell, score_cell, ref_score_cell, acc.counts[cell], acc.boot_counts[:, cell]
+
+
 # ============================================================================
 # Convert general binary count curves to ROC, PR, PRG
 # ============================================================================
@@ -155,10 +570,12 @@ def roc_curve(y_true, y_score, sample_weight=None):
     ----------
     y_true : ndarray of type bool, shape (n_samples,)
         True targets of binary classification. Cannot be empty.
-    y_score : ndarray, shape (n_samples,)
-        Estimated probabilities or decision function. Must be finite.
-    sample_weight : None or ndarray of shape (n_samples, n_boot)
-        Sample weights. If `None`, all weights are one.
+    y_score : ndarray of shape (n_samples,) or ScoreIndex
+        Estimated probabilities or decision function. Must be finite. See
+        `_binary_clf_curve` for `ScoreIndex`.
+    sample_weight : None, ndarray of shape (n_boot, n_samples), or BootIndex
+        Sample weights. If `None`, all weights are one. See
+        `_binary_clf_curve` for `BootIndex`.
 
     Returns
     -------
@@ -177,6 +594,69 @@ def roc_curve(y_true, y_score, sample_weight=None):
     return (fpr, tpr, LINEAR), thresholds
 
 
+def roc_auc(y_true, y_score, sample_weight=None):
+    """Compute the area under the ROC curve with optional sample weight matrix
+    as a weighted Mann-Whitney statistic, without building the curve.
+
+    This is the same area as `util.area` on the `roc_curve`, including the
+    corner case when only a single class is present in `y_true`, up to round
+    off. It only needs the total weight of each class at each threshold, so
+    it is much faster for many boot strap replicates.
+
+    Parameters
+    ----------
+    y_true : ndarray of type bool, shape (n_samples,)
+        True targets of binary classification. Cannot be empty.
+    y_score : ndarray of shape (n_samples,) or ScoreIndex
+        Estimated probabilities or decision function. Must be finite. See
+        `_binary_clf_curve` for `ScoreIndex`.
+    sample_weight : None, ndarray of shape (n_boot, n_samples), or BootIndex
+        Sample weights. If `None`, all weights are one. See
+        `_binary_clf_curve` for `BootIndex`.
+
+    Returns
+    -------
+    auc : ndarray, shape (n_boot,)
+        Area under the ROC curve for each column in `sample_weight`.
+    """
+    score_idx = y_score if isinstance(y_score, ScoreIndex) else score_index(y_true, y_score)
+    assert y_true is score_idx.y_true or np.array_equal(y_true, score_idx.y_true)
+    group, n_groups = score_idx.group, score_idx.thresholds.size
+
+    # Total weight of each class at each threshold (in decreasing order). Sum
+    # each class separately, so a missing class has exactly zero weight.
+    if sample_weight is None:
+        pos = np.bincount(group[y_true], minlength=n_groups)[None, :]
+        neg = np.bincount(group[~y_true], minlength=n_groups)[None, :]
+    elif isinstance(sample_weight, bu.BootIndex):
+        assert sample_weight.N == y_true.size
+        # One bincount for both classes with the label in the group code
+        sums = bu.index_group_sums(sample_weight, 2 * group + y_true, 2 * n_groups)
+        neg, pos = sums[:, 0::2], sums[:, 1::2]
+    else:
+        assert sample_weight.ndim == 2
+        assert sample_weight.shape[1] == y_true.size
+        assert np.all(np.isfinite(sample_weight)) and np.all(sample_weight > 0)
+        # Sorted order has each threshold as a contiguous block
+        starts = np.r_[0, score_idx.threshold_idxs[:-1] + 1]
+        weight = sample_weight[:, score_idx.order]
+        y_sorted = y_true[score_idx.order]
+        pos = np.add.reduceat(weight * y_sorted, starts, axis=1)
+        neg = np.add.reduceat(weight * ~y_sorted, starts, axis=1)
+
+    # Each positive beats the negatives at lower scores and ties count half
+    neg_total = np.sum(neg, axis=1)
+    neg_below = neg_total[:, None] - np.cumsum(neg, axis=1)
+    U = np.sum(pos * (neg_below + 0.5 * neg), axis=1)
+    pos_total = np.sum(pos, axis=1)
+
+    # ROC is the diagonal after the pseudo-points when a class is missing
+    single_class = (pos_total == 0) | (neg_total == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        auc = np.where(single_class, 0.5, U / (pos_total * neg_total))
+    return auc
+
+
 def recall_precision_curve(y_true, y_score, sample_weight=None):
     """Compute recall precision curve with optional sample weight matrix. This
     has intentionally been named recall-precision rather than the traditional
@@ -195,10 +675,12 @@ def recall_precision_curve(y_true, y_score, sample_weight=None):
     ----------
     y_true : ndarray of type bool, shape (n_samples,)
         True targets of binary classification. Cannot be empty.
-    y_score : ndarray, shape (n_samples,)
-        Estimated probabilities or decision function. Must be finite.
-    sample_weight : None or ndarray of shape (n_samples, n_boot)
-        Sample weights. If `None`, all weights are one.
+    y_score : ndarray of shape (n_samples,) or ScoreIndex
+        Estimated probabilities or decision function. Must be finite. See
+        `_binary_clf_curve` for `ScoreIndex`.
+    sample_weight : None, ndarray of shape (n_boot, n_samples), or BootIndex
+        Sample weights. If `None`, all weights are one. See
+        `_binary_clf_curve` for `BootIndex`.
 
     Returns
     -------
@@ -228,10 +710,12 @@ def prg_curve(y_true, y_score, sample_weight=None):
     ----------
     y_true : ndarray of type bool, shape (n_samples,)
         True targets of binary classification. Cannot be empty.
-    y_score : ndarray, shape (n_samples,)
-        Estimated probabilities or decision function. Must be finite.
-    sample_weight : None or ndarray of shape (n_samples, n_boot)
-        Sample weights. If `None`, all weights are one.
+    y_score : ndarray of shape (n_samples,) or ScoreIndex
+        Estimated probabilities or decision function. Must be finite. See
+        `_binary_clf_curve` for `ScoreIndex`.
+    sample_weight : None, ndarray of shape (n_boot, n_samples), or BootIndex
+        Sample weights. If `None`, all weights are one. See
+        `_binary_clf_curve` for `BootIndex`.
 
     Returns
     -------
@@ -262,3 +746,8 @@ def prg_curve(y_true, y_score, sample_weight=None):
     assert np.all(rec_gain <= 1.0)
     assert np.all((rec_gain == 0.0) | (prec_gain <= 1.0))
     return (rec_gain, prec_gain, PREV), thresholds
+
+
+# Faster functions for the area under some curves, for when the curve itself
+# is not needed.
+AREA_FUNCS = {roc_curve: roc_auc}
@@ -6,10 +6,10 @@ from builtins import range
 import numpy as np
 import pandas as pd
 import scipy.stats as ss
-from joblib import Memory
+from joblib import Memory, Parallel, delayed
 
 from mlpaper.constants import METHOD, METRIC
-from mlpaper.mlpaper import PAIRWISE_DEFAULT, loss_summary_table
+from mlpaper.mlpaper import N_BOOT, PAIRWISE_DEFAULT, loss_summary_table
 
 MOMENT = "moment"  # Don't put in constants since only needed for regression
 
@@ -129,7 +129,7 @@ def log_loss(y, mu, std):
 # ============================================================================
 
 
-def loss_table(pred_tbl, y, metrics_dict):
+def loss_table(pred_tbl, y, metrics_dict, dtype=np.float64):
     """Compute loss table from table of Gaussian predictions.
 
     Parameters
@@ -145,6 +145,9 @@ def loss_table(pred_tbl, y, metrics_dict):
     metrics_dict : dict of str to callable
         Dictionary mapping loss function name to function that computes loss,
         e.g., `log_loss`, `square_loss`, ...
+    dtype : dtype
+        Data type of the loss table. Use ``np.float32`` to halve the memory of
+        large loss tables, the summaries accumulate the means in float64.
 
     Returns
     -------
@@ -163,13 +166,15 @@ def loss_table(pred_tbl, y, metrics_dict):
     assert n_samples >= 1 and len(methods) >= 1
 
     col_names = pd.MultiIndex.from_product([metrics_dict.keys(), methods], names=[METRIC, METHOD])
-    loss_tbl = pd.DataFrame(index=pred_tbl.index, columns=col_names, dtype=float)
+    # Fill an array and build the DataFrame at the end to keep the dtype
+    loss = np.zeros((n_samples, len(col_names)), dtype=dtype)
     for method in methods:
         # These get validated inside loss function
         mu = pred_tbl[(method, "mu")].values
         std = pred_tbl[(method, "std")].values
         for metric, metric_f in metrics_dict.items():
-            loss_tbl.loc[:, (metric, method)] = metric_f(y, mu, std)
+            loss[:, col_names.get_loc((metric, method))] = metric_f(y, mu, std)
+    loss_tbl = pd.DataFrame(data=loss, index=pred_tbl.index, columns=col_names)
     return loss_tbl
 
 
@@ -204,7 +209,25 @@ class JustNoise:
         return mu, std
 
 
-def get_gauss_pred(X_train, y_train, X_test, methods, min_std=0.0, verbose=False, checkpointdir=None):
+def _train_predict_gauss(method_obj, X_train, y_train, X_test, method_name=None, verbose=False):
+    """Internal helper to fit a regressor and get its predictive mean and
+    standard deviation on the test set. This is at module level so the jobs
+    of `get_gauss_pred` can be pickled to worker processes. The `verbose`
+    message is printed here, when the fit starts, not when the job is queued."""
+    if verbose:
+        print("Running fit/predict for %s" % method_name)
+    method_obj.fit(X_train, y_train)
+    try:
+        mu, std = method_obj.predict(X_test, return_std=True)
+    except TypeError:
+        mu = method_obj.predict(X_test)
+        std = np.ones_like(mu)
+    return mu, std
+
+
+def get_gauss_pred(
+    X_train, y_train, X_test, methods, min_std=0.0, verbose=False, checkpointdir=None, n_jobs=1, backend=None
+):
     """Get the Gaussian prediction tables for each test point on a collection
     of regression methods.
 
@@ -228,10 +251,18 @@ def get_gauss_pred(X_train, y_train, X_test, methods, min_std=0.0, verbose=False
         Minimum value to floor the predictive standard deviation. Must be >= 0.
         Useful to prevent inf log loss penalties.
     verbose : bool
-        If True, display which method being trained.
+        If True, print the name of each method as its fit starts, from the
+        thread or process running it. Nothing is printed for the methods
+        loaded from `checkpointdir`.
     checkpointdir : str (directory)
         If provided, stores checkpoint results using joblib for the train/test
         in case process interrupted. If None, no checkpointing is done.
+    n_jobs : int
+        Number of methods to fit and predict concurrently, using the `joblib`
+        conventions (e.g., -1 means use all cores).
+    backend : None or str
+        The `joblib` backend to run the methods on, see
+        `classification.get_pred_log_prob`.
 
     Returns
     -------
@@ -244,8 +275,9 @@ def get_gauss_pred(X_train, y_train, X_test, methods, min_std=0.0, verbose=False
 
     Notes
     -----
-    If a train/test operation is loaded from a checkpoint file, the estimator
-    object in methods will not be in a fit state.
+    If a train/test operation is loaded from a checkpoint file, or run in a
+    worker process, the estimator object in methods will not be in a fit
+    state.
     """
     n_test = X_test.shape[0]
     assert n_test > 0
@@ -255,24 +287,20 @@ def get_gauss_pred(X_train, y_train, X_test, methods, min_std=0.0, verbose=False
     assert X_train.dtype.kind == X_test.dtype.kind  # Would be weird otherwise
     assert min_std >= 0.0
 
+    # The checkpoints are in the cache, whatever process runs the method
     memory = Memory(cachedir=checkpointdir, verbose=0)
+    train_predict = memory.cache(_train_predict_gauss, ignore=["method_name", "verbose"])
 
-    @memory.cache
-    def train_predict(method_obj, X_train, y_train, X_test):
-        method_obj.fit(X_train, y_train)
-        try:
-            mu, std = method_obj.predict(X_test, return_std=True)
-        except TypeError:
-            mu = method_obj.predict(X_test)
-            std = np.ones_like(mu)
-        return mu, std
+    jobs = []
+    for method_name, method_obj in methods.items():
+        jobs.append(delayed(train_predict)(method_obj, X_train, y_train, X_test, method_name, verbose))
+    # Parallel returns results in the order of the jobs, whatever n_jobs is
+    results = Parallel(n_jobs=n_jobs, backend=backend)(jobs)
+    assert len(results) == len(methods)
 
     col_names = pd.MultiIndex.from_product([methods.keys(), ("mu", "std")], names=[METHOD, MOMENT])
     pred_tbl = pd.DataFrame(index=range(n_test), columns=col_names, dtype=float)
-    for method_name, method_obj in methods.items():
-        if verbose:
-            print("Running fit/predict for %s" % method_name)
-        mu, std = train_predict(method_obj, X_train, y_train, X_test)
+    for method_name, (mu, std) in zip(methods.keys(), results):
         assert mu.shape == (n_test,) and std.shape == (n_test,)
 
         std = np.maximum(min_std, std)
@@ -293,6 +321,10 @@ def just_benchmark(
     pairwise_CI=PAIRWISE_DEFAULT,
     method_EB="t",
     limits={},
+    random_state=None,
+    dtype=np.float64,
+    n_boot=N_BOOT,
+    return_n_boot=False,
 ):
     """Simplest one-call interface to this package. Just pass it data and
     method objects and a performance summary DataFrame is returned.
@@ -329,13 +361,23 @@ def just_benchmark(
     pairwise_CI : bool
         If True, compute error bars on the mean of ``loss - loss_ref`` instead
         of just the mean of `loss`. This typically gives smaller error bars.
-    method_EB : {'t', 'bernstein', 'boot'}
+    method_EB : {'t', 'bernstein', 'boot', 'bca'}
         Method to use for building error bar.
     limits : dict of str to (float, float)
         Dictionary mapping metric name to tuple with (lower, upper) which are
         the theoretical limits on the mean loss. For instance, square loss on a
         bounded y domain of ``(-1.0,1.0)`` would give limits of ``(0.0, 4.0)``.
         If entry missing, (-inf, inf) is used.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from when `method_EB` is 'boot' or 'bca', see
+        `util.check_random_state`.
+    dtype : dtype
+        Data type of the loss table, see `loss_table`.
+    n_boot : int or 'auto'
+        Number of bootstrap iterations to perform when `method_EB` is 'boot'
+        or 'bca', see `mlpaper.loss_summary_table`.
+    return_n_boot : bool
+        If True, also return the number of bootstrap replications used.
 
     Returns
     -------
@@ -349,9 +391,21 @@ def just_benchmark(
         The statistical significance is a p-value from a two-sided hypothesis
         test on the hypothesis H0 that foo has the same mean loss as the
         reference method `ref_method`.
+    n_boot_used : int
+        Number of bootstrap replications used, only returned if
+        `return_n_boot`.
     """
     assert y_train.dtype == y_test.dtype  # Would be weird otherwise
     pred_tbl = get_gauss_pred(X_train, y_train, X_test, methods, min_std=min_std)
-    loss_tbl = loss_table(pred_tbl, y_test, loss_dict)
-    loss_summary = loss_summary_table(loss_tbl, ref_method, pairwise_CI=pairwise_CI, method_EB=method_EB, limits=limits)
-    return loss_summary
+    loss_tbl = loss_table(pred_tbl, y_test, loss_dict, dtype=dtype)
+    out = loss_summary_table(
+        loss_tbl,
+        ref_method,
+        pairwise_CI=pairwise_CI,
+        method_EB=method_EB,
+        limits=limits,
+        random_state=random_state,
+        n_boot=n_boot,
+        return_n_boot=return_n_boot,
+    )
+    return out
@@ -10,6 +10,98 @@ from scipy.special import logsumexp
 
 STRICT_SPACING = False
 
+# Seeds for child random streams are drawn from [0, MAX_SEED)
+MAX_SEED = 2 ** 32 - 1
+
+# Settings above that change the results cached by `boot_cache`
+CACHE_KEY_SETTINGS = ("STRICT_SPACING", "MAX_SEED")
+
+
+def check_random_state(random_state=None):
+    """Turn `random_state` into a random number generator object. Same idea as
+    `sklearn.utils.check_random_state` but avoids extra dependency.
+
+    Parameters
+    ----------
+    random_state : None, int, RandomState, or Generator
+        If None, use the global `numpy.random` state. If int, use a new
+        `RandomState` seeded with it. If already a `RandomState` (or a numpy
+        `Generator`), it is passed through.
+
+    Returns
+    -------
+    random_state : RandomState or Generator
+        Random number generator object to draw from.
+    """
+    if random_state is None:
+        return np.random.mtrand._rand
+    if isinstance(random_state, (int, np.integer)):
+        return np.random.RandomState(random_state)
+    generator_cls = getattr(np.random, "Generator", None)  # Only numpy >= 1.17
+    assert isinstance(random_state, np.random.RandomState) or (
+        generator_cls is not None and isinstance(random_state, generator_cls)
+    )
+    return random_state
+
+
+def randint(random_state, high, size=None, dtype=int):
+    """Draw random integers in ``[0, high)`` from either a `RandomState` or a
+    numpy `Generator`, which unfortunately have different method names.
+
+    Parameters
+    ----------
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw from, see `check_random_state`.
+    high : int
+        Upper limit (exclusive) on the random integers, must be >= 1.
+    size : None or int or tuple of int
+        Shape of output, if None a scalar is returned.
+    dtype : dtype
+        Integer type of the output.
+
+    Returns
+    -------
+    x : int or ndarray of type int, shape `size`
+        Random integers uniform in ``[0, high)``.
+    """
+    random_state = check_random_state(random_state)
+    if isinstance(random_state, np.random.RandomState):
+        x = random_state.randint(0, high, size=size, dtype=dtype)
+    else:
+        x = random_state.integers(0, high, size=size, dtype=dtype)
+    return x
+
+
+def spawn_random_states(random_state, n_streams):
+    """Derive independent child random streams from a parent stream. The
+    children only depend on the state of the parent and their position in the
+    list, so work on each child can be done in any order (e.g., in parallel)
+    and still give the same results.
+
+    Parameters
+    ----------
+    random_state : None, int, RandomState, or Generator
+        Parent random stream, see `check_random_state`.
+    n_streams : int
+        Number of child streams, must be >= 0.
+
+    Returns
+    -------
+    children : list of RandomState or Generator, shape (n_streams,)
+        Child random streams, of the same type as the parent.
+    """
+    assert n_streams >= 0
+    random_state = check_random_state(random_state)
+
+    # Draw all the seeds from the parent at once so the children do not depend
+    # on what order they are used in.
+    seeds = randint(random_state, MAX_SEED, size=n_streams, dtype=np.int64)
+    if isinstance(random_state, np.random.RandomState):
+        children = [np.random.RandomState(seed) for seed in seeds]
+    else:
+        children = [np.random.default_rng(seed) for seed in seeds]
+    return children
+
 
 def clip_chk(a, a_min, a_max):
     a_clip = np.clip(a, a_min, a_max)
@@ -69,7 +161,7 @@ def normalize(log_pred_prob):
     return log_pred_prob
 
 
-def epsilon_noise(x, default_epsilon=1e-10, max_epsilon=1.0):
+def epsilon_noise(x, default_epsilon=1e-10, max_epsilon=1.0, random_state=None):
     """Add a small amount of noise to a vector such that the output vector has
     all unique values. The ordering of the resutiling vector remains the
     same: ``argsort(output) = argsort(input)`` if input values are unique.
@@ -82,6 +174,8 @@ def epsilon_noise(x, default_epsilon=1e-10, max_epsilon=1.0):
         Default noise to add for singleton lists, musts be > 0.0.
     max_epsilon : float
         Maximum amount of noise corruption regardless of scale found in `x`.
+    random_state : None, int, RandomState, or Generator
+        Random stream to draw the noise from, see `check_random_state`.
 
     Returns
     -------
@@ -98,7 +192,8 @@ def epsilon_noise(x, default_epsilon=1e-10, max_epsilon=1.0):
     delta = np.minimum(max_epsilon, delta)
     assert 0.0 < delta and delta <= max_epsilon
 
-    x = x + delta * (np.random.rand(len(x)) - 0.5)
+    random_state = check_random_state(random_state)
+    x = x + delta * (random_state.uniform(size=len(x)) - 0.5)
     return x
 
 
@@ -189,25 +284,43 @@ def cummax_strict(x, copy=True):
 
     Parameters
     ----------
-    x : ndarray, shape (n_samples,)
-        A list of points.
+    x : ndarray, shape (..., n_samples)
+        A list of points, or a batch of lists of points, e.g., one curve per
+        row. Must not be nan. If not floating point, e.g., int, it is cast to
+        float64 first, since the points are stepped to the next float.
     copy : bool
-        If False, modify x in place.
+        If False, modify x in place. A cast `x` is never modified in place.
 
     Returns
     -------
-    x : ndarray, shape (n_samples,)
-        A list of points that are now *strictly* sorted. If `x` was already
-        sorted then the new points will be as miniminally changed as the
-        floating point representation allows.
+    x : ndarray, shape (..., n_samples)
+        A list of points that are now *strictly* sorted (along the last axis).
+        If `x` was already sorted then the new points will be as miniminally
+        changed as the floating point representation allows. Same dtype as
+        `x` if it is floating point, and float64 otherwise.
     """
-    assert x.ndim == 1
-
-    x = np.copy(x) if copy else x
-    for ii in range(1, len(x)):
-        x[ii] = np.maximum(np.nextafter(x[ii - 1], np.inf), x[ii])
-    assert np.all(np.diff(x) > 0)
-    return x
+    assert x.ndim >= 1
+    if x.dtype.kind != "f":
+        x, copy = x.astype(np.float64), True
+    assert not np.any(np.isnan(x))
+
+    # Map the floats to ints with the same order, so np.nextafter is + 1:
+    # the sign bit is flipped to a minus sign (-0.0 and 0.0 both go to 0).
+    int_dtype = np.dtype("i%d" % x.dtype.itemsize)
+    mask = np.iinfo(int_dtype).max
+    bits = x.view(int_dtype)
+    ordered = np.where(bits < 0, -(bits & mask), bits)
+
+    # y[i] = max(y[i - 1] + 1, x[i]) so that y[i] - i is a cummax
+    offset = np.arange(x.shape[-1], dtype=int_dtype)
+    ordered = np.maximum.accumulate(ordered - offset, axis=-1) + offset
+    y = np.where(ordered < 0, (-ordered) | ~mask, ordered).view(x.dtype)
+
+    if not copy:
+        x[...] = y
+        y = x
+    assert np.all(np.diff(y, axis=-1) > 0)
+    return y
 
 
 def eval_step_func(x_grid, xp, yp, ival=None, assume_sorted=False, skip_unique_chk=False):
@@ -311,12 +424,138 @@ def _interp1d(x_grid, xp, yp, kind="linear"):
         # cummax strict to make all points exactly unique to be extra safe.
         xp = cummax_strict(xp) if STRICT_SPACING else xp
         f = si.interp1d(xp, yp, kind=kind, assume_sorted=True)
-        y_grid = f(x_grid)
+        with np.errstate(invalid="ignore"):
+            y_grid = f(x_grid)
+        if kind == "linear" and not np.all(np.isfinite(yp)):
+            # Older numpy gives nan in segments with an infinite end, so use
+            # the same rules as newer numpy (and interp1d) for those points.
+            lo = np.clip(np.searchsorted(xp, x_grid, side="right") - 1, 0, xp.size - 2)
+            y_inf = _interp_linear(x_grid, xp[lo], xp[lo + 1], yp[lo], yp[lo + 1])
+            y_inf = np.where(x_grid == xp[-1], yp[-1], y_inf)
+            y_grid = np.where(np.isnan(y_grid), y_inf, y_grid)
     return y_grid
 
 
-# Make a version of interp1d that supprts vectorized inputs:
-interp1d = np.vectorize(_interp1d, otypes=(float,), excluded=("kind", 3), signature="(n),(m),(m)->(n)")
+def _interp_linear(x, x_lo, x_hi, y_lo, y_hi):
+    """Linear interpolation of `x` between points ``(x_lo, y_lo)`` and
+    ``(x_hi, y_hi)`` following the rules `numpy.interp` uses (numpy >= 1.17)
+    when the points are not finite.
+
+    Points on top of `x_lo` take `y_lo` exactly. If the formula gives nan
+    because of an infinite `y_lo` it is tried from the other end, and if both
+    ends are the same infinity that is the result.
+
+    Parameters
+    ----------
+    x : ndarray
+        Values to evaluate the line segments at.
+    x_lo : ndarray
+        Start of each segment on the x-axis, broadcastable with `x`.
+    x_hi : ndarray
+        End of each segment on the x-axis, broadcastable with `x`.
+    y_lo : ndarray
+        Value at the start of each segment, broadcastable with `x`.
+    y_hi : ndarray
+        Value at the end of each segment, broadcastable with `x`.
+
+    Returns
+    -------
+    y : ndarray
+        Interpolated values, with the broadcast shape of the inputs.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (y_hi - y_lo) / (x_hi - x_lo)
+        y = slope * (x - x_lo) + y_lo
+        # If we get nan in one direction, try the other
+        y = np.where(np.isnan(y), slope * (x - x_hi) + y_hi, y)
+    y = np.where(np.isnan(y) & (y_lo == y_hi), y_lo, y)
+    y = np.where(x == x_lo, y_lo, y)
+    return y
+
+
+def interp1d(x_grid, xp, yp, kind="linear"):
+    """Vectorized version of `_interp1d` that interpolates many curves, e.g.,
+    one per boot strap replicate, onto the same grid in a few numpy calls.
+
+    The results are the same as calling `_interp1d` on each curve, including
+    when there are duplicate points in `xp`. For ``'linear'`` it uses the same
+    formula as `numpy.interp` (which scipy uses for float64 data), and handles
+    infinite values in `yp` with `_interp_linear`. Only ``'linear'`` and
+    ``'previous'`` are vectorized, any other `kind` calls `_interp1d` on each
+    curve in a loop.
+
+    Parameters
+    ----------
+    x_grid : ndarray, shape (n_grid,)
+        Values to evaluate the curves at. Must be within the range of each
+        curve, as there is no extrapolation. This must be 1D as all curves are
+        evaluated on the same grid.
+    xp : ndarray, shape (..., n_samples)
+        Points on the x-axis of each curve. Each curve must be sorted.
+    yp : ndarray, shape (..., n_samples)
+        The values of each curve at each of the points in `xp`.
+    kind : str
+        Type of interpolation scheme, ``'linear'`` and ``'previous'`` are
+        fast, but any `kind` `_interp1d` can process is allowed.
+
+    Returns
+    -------
+    y_grid : ndarray, shape (..., n_grid)
+        Interpolation of each curve in `xp` and `yp` evaluated at the points
+        in `x_grid`.
+    """
+    assert x_grid.ndim == 1
+    assert xp.ndim >= 1 and xp.shape == yp.shape
+    assert xp.shape[-1] >= 2  # at least 2 points need to do area
+
+    lead_shape, n_samples = xp.shape[:-1], xp.shape[-1]
+    xp = np.reshape(xp, (-1, n_samples)).astype(float)
+    yp = np.reshape(yp, (-1, n_samples)).astype(float)
+    n_curves = xp.shape[0]
+    assert np.all(np.diff(xp, axis=1) >= 0)
+
+    if kind not in ("linear", "previous"):
+        y_grid = np.zeros((n_curves, x_grid.size))
+        for ii in range(n_curves):
+            y_grid[ii, :] = _interp1d(x_grid, xp[ii, :], yp[ii, :], kind=kind)
+        y_grid = y_grid.reshape(lead_shape + (x_grid.size,))
+        return y_grid
+
+    if kind == "linear" and STRICT_SPACING:
+        xp = cummax_strict(xp, copy=False)  # Already a copy from astype
+
+    # Find the last point in each curve <= each grid point, i.e., searchsorted
+    # with side='right' minus 1, for all curves at once. The number of points
+    # in a curve <= x_grid[jj] is the number that go before jj in the grid.
+    grid_order = np.argsort(x_grid, kind="mergesort")
+    n_before = np.searchsorted(x_grid[grid_order], xp, side="left")
+    n_before = n_before + (x_grid.size + 1) * np.arange(n_curves)[:, None]
+    counts = np.bincount(n_before.ravel(), minlength=n_curves * (x_grid.size + 1))
+    counts = np.cumsum(counts.reshape((n_curves, x_grid.size + 1)), axis=1)[:, :-1]
+    idx = np.empty((n_curves, x_grid.size), dtype=int)
+    idx[:, grid_order] = counts - 1
+
+    # No extrapolation
+    assert np.all(idx >= 0)
+    assert np.all(x_grid[None, :] <= xp[:, -1:])
+
+    rows = np.arange(n_curves)[:, None]
+    if kind == "previous":
+        # Taking the last point <= x_grid is the same as unique_take_last
+        y_grid = yp[rows, idx]
+    else:  # linear
+        lo = np.minimum(idx, n_samples - 2)
+        x_lo, x_hi = xp[rows, lo], xp[rows, lo + 1]
+        y_lo, y_hi = yp[rows, lo], yp[rows, lo + 1]
+        # Duplicates at the end give 0 width but are replaced below, and -inf
+        # (e.g., in PRG curves) is handled by _interp_linear.
+        y_grid = _interp_linear(x_grid[None, :], x_lo, x_hi, y_lo, y_hi)
+        # The last point is taken exactly, as in numpy.interp
+        at_end = x_grid[None, :] == xp[:, -1:]
+        y_grid = np.where(at_end, yp[:, -1:], y_grid)
+
+    y_grid = y_grid.reshape(lead_shape + (x_grid.size,))
+    return y_grid
 
 
 def area(x_curve, y_curve, kind):
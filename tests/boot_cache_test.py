@@ -0,0 +1,182 @@
+# Ryan Turner (turnerry@iro.umontreal.ca)
+from __future__ import division, print_function
+
+import os
+import pickle
+import pkgutil
+import re
+import warnings
+from importlib import import_module
+from inspect import getsource
+from tempfile import mkdtemp
+
+import numpy as np
+
+import mlpaper
+import mlpaper.boot_cache as bc
+import mlpaper.classification as btc
+import mlpaper.mlpaper as bt
+import mlpaper.perf_curves as pc
+from mlpaper import util
+
+# Module level settings that do not change the cached results: where the cache
+# is, defaults that are bound into the arguments, and the test settings.
+NOT_KEY_SETTINGS = {
+    ("mlpaper.boot_cache", "CACHE_DIR"),
+    ("mlpaper.boot_cache", "CACHE_MAX_BYTES"),
+    ("mlpaper.constants", "PAIRWISE_DEFAULT"),
+    ("mlpaper.data_splitter", "INDEX"),
+    ("mlpaper.mlpaper", "N_BOOT"),
+    ("mlpaper.test_constants", "FPR"),
+    ("mlpaper.test_constants", "MC_REPEATS_LARGE"),
+}
+
+
+def test_boot_cache():
+    N = np.random.randint(low=2, high=10)
+    seed = np.random.randint(low=0, high=10 ** 6)
+    x = np.random.randn(N)
+
+    cache_dir = mkdtemp()
+    orig_dir, bc.CACHE_DIR = bc.CACHE_DIR, cache_dir
+    try:
+        # Not reproducible => not cached
+        bt._boot_EB_and_test(x, n_boot=10)
+        assert len(os.listdir(cache_dir)) == 0
+
+        result = bt._boot_EB_and_test(x, n_boot=10, random_state=seed)
+        assert len(os.listdir(cache_dir)) == 1
+        assert bt._boot_EB_and_test(x, n_boot=10, random_state=seed) == result
+        assert len(os.listdir(cache_dir)) == 1
+
+        # Different data or settings is a new entry
+        bt._boot_EB_and_test(x + 1.0, n_boot=10, random_state=seed)
+        bt._boot_EB_and_test(x, n_boot=11, random_state=seed)
+        assert len(os.listdir(cache_dir)) == 3
+
+        # Random stream left in same state when loaded from cache
+        random_state = np.random.RandomState(seed)
+        result = bt._boot_EB_and_test(x, n_boot=10, random_state=random_state)
+        after = random_state.rand()
+        random_state = np.random.RandomState(seed)
+        assert bt._boot_EB_and_test(x, n_boot=10, random_state=random_state) == result
+        assert random_state.rand() == after
+        assert len(os.listdir(cache_dir)) == 4
+
+        bc.CACHE_DIR = None
+        assert bt._boot_EB_and_test(x, n_boot=10, random_state=seed) == result
+    finally:
+        bc.CACHE_DIR = orig_dir
+
+
+def test_boot_cache_settings():
+    N = np.random.randint(low=2, high=10)
+    seed = np.random.randint(low=0, high=10 ** 6)
+    x = np.random.randn(N)
+
+    cache_dir = mkdtemp()
+    orig_dir, bc.CACHE_DIR = bc.CACHE_DIR, cache_dir
+    orig_max = bt.N_BOOT_MAX
+    try:
+        result = bt._boot_EB_and_test(x, n_boot="auto", random_state=seed)
+        assert len(os.listdir(cache_dir)) == 1
+
+        # A module setting that changes the results is a new entry
+        bt.N_BOOT_MAX = bt.N_BOOT_BATCH
+        result_max = bt._boot_EB_and_test(x, n_boot="auto", random_state=seed)
+        assert len(os.listdir(cache_dir)) == 2
+        assert result_max == bt._boot_EB_and_test.__wrapped__(x, n_boot="auto", random_state=seed)
+        bt.N_BOOT_MAX = orig_max
+
+        # Corrupt entries are recomputed and replaced
+        for junk in (b"junk", b"\x80\x03Xabc", b"\x80\x03\xff", pickle.dumps((1, 2))[:-3]):
+            for fname in os.listdir(cache_dir):
+                with open(os.path.join(cache_dir, fname), "wb") as f:
+                    f.write(junk)
+            assert bt._boot_EB_and_test(x, n_boot="auto", random_state=seed) == result
+        assert bt._boot_EB_and_test(x, n_boot="auto", random_state=seed) == result
+        assert len(os.listdir(cache_dir)) == 2
+    finally:
+        bc.CACHE_DIR = orig_dir
+        bt.N_BOOT_MAX = orig_max
+
+
+def test_boot_cache_unhashable():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    seed = np.random.randint(low=0, high=10 ** 6)
+    y = np.random.rand(N) <= 0.5
+    y_pred = util.normalize(np.random.randn(N, 2))
+
+    # A lambda curve can not be pickled, so it is not cached but still works
+    summary, _ = btc.curve_boot(
+        y, y_pred, 0.5, curve_f=lambda a, b, c=None: pc.roc_curve(a, b, c), n_boot=n_boot, random_state=seed
+    )
+
+    cache_dir = mkdtemp()
+    orig_dir, bc.CACHE_DIR = bc.CACHE_DIR, cache_dir
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            summary2, _ = btc.curve_boot(
+                y, y_pred, 0.5, curve_f=lambda a, b, c=None: pc.roc_curve(a, b, c), n_boot=n_boot, random_state=seed
+            )
+        assert any(issubclass(ww.category, UserWarning) for ww in caught)
+        assert len(os.listdir(cache_dir)) == 0
+    finally:
+        bc.CACHE_DIR = orig_dir
+    assert np.allclose(summary, summary2, equal_nan=True)
+
+
+def test_key_settings_complete():
+    # Every numeric setting defined in the package is in the key, or known not
+    # to change the results, so adding one can not silently serve stale results.
+    settings = set((mod, name) for mod, name, _ in bc.key_settings())
+    for _, mod_name, _ in pkgutil.iter_modules(mlpaper.__path__, prefix="mlpaper."):
+        mod = import_module(mod_name)
+        assert (mod_name in bc.KEY_MODULES) == hasattr(mod, "CACHE_KEY_SETTINGS")
+        for name in re.findall(r"^([A-Z][A-Z0-9_]*) = ", getsource(mod), flags=re.MULTILINE):
+            if isinstance(getattr(mod, name), (bool, int, float, type(None))):
+                assert ((mod_name, name) in settings) != ((mod_name, name) in NOT_KEY_SETTINGS), (mod_name, name)
+
+    # Changing any of them changes the key
+    arguments = {"x": np.random.randn(3), "random_state": 0}
+    key = bc.cache_key(bt._boot_EB_and_test, arguments)
+    for mod_name, name in sorted(settings):
+        mod = import_module(mod_name)
+        orig = getattr(mod, name)
+        setattr(mod, name, 7 if orig is None else orig + 1)
+        try:
+            assert bc.cache_key(bt._boot_EB_and_test, arguments) != key
+        finally:
+            setattr(mod, name, orig)
+    assert bc.cache_key(bt._boot_EB_and_test, arguments) == key
+
+
+def test_evict():
+    n_files = np.random.randint(low=1, high=10)
+    max_bytes = np.random.randint(low=0, high=10 * n_files)
+
+    cache_dir = mkdtemp()
+    for ii in range(n_files):
+        fname = os.path.join(cache_dir, str(ii) + bc.CACHE_EXT)
+        with open(fname, "wb") as f:
+            f.write(b"0" * 10)
+        os.utime(fname, (ii, ii))
+
+    bc.evict(cache_dir, max_bytes)
+    # Most recently used files are kept
+    n_kept = min(n_files, max_bytes // 10)
+    assert sorted(os.listdir(cache_dir)) == sorted(str(ii) + bc.CACHE_EXT for ii in range(n_files - n_kept, n_files))
+
+
+if __name__ == "__main__":
+    np.random.seed(56324)
+
+    for rr in range(100):
+        test_boot_cache()
+        test_boot_cache_settings()
+        test_boot_cache_unhashable()
+        test_key_settings_complete()
+        test_evict()
+    print("passed")
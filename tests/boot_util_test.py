@@ -0,0 +1,227 @@
+# Ryan Turner (turnerry@iro.umontreal.ca)
+from __future__ import division, print_function
+
+import numpy as np
+
+import mlpaper.boot_util as bu
+from mlpaper.test_constants import MC_REPEATS_LARGE
+
+
+def test_boot_chunk_size():
+    N = np.random.randint(low=1, high=100)
+    n_boot = np.random.randint(low=1, high=100)
+    max_elements = np.random.randint(low=1, high=1000)
+
+    chunk_size = bu.boot_chunk_size(N, n_boot, max_elements=max_elements)
+    assert 1 <= chunk_size and chunk_size <= n_boot
+    assert chunk_size == 1 or chunk_size * N <= max_elements
+    assert chunk_size == n_boot or (chunk_size + 1) * N > max_elements
+
+
+def test_memory_plan():
+    N = np.random.randint(low=1, high=100)
+    n_boot = np.random.randint(low=1, high=100)
+    memory_budget = np.random.randint(low=1, high=10000)
+    bytes_per_element = np.random.choice([bu.INDEX_BYTES, bu.GATHER_BYTES, bu.CURVE_BYTES])
+
+    budget, bu.MEMORY_BUDGET = bu.MEMORY_BUDGET, memory_budget
+    try:
+        plan = bu.memory_plan(N, n_boot, bytes_per_element=bytes_per_element)
+        chunk_size = bu.boot_chunk_size(N, n_boot, bytes_per_element=bytes_per_element)
+    finally:
+        bu.MEMORY_BUDGET = budget
+    assert chunk_size == plan.chunk_size
+    assert 1 <= plan.chunk_size and plan.chunk_size <= n_boot
+    assert plan.peak_bytes == plan.chunk_size * N * bytes_per_element
+    assert plan.chunk_size == 1 or plan.peak_bytes <= memory_budget
+    assert plan.chunk_size == n_boot or (plan.chunk_size + 1) * N * bytes_per_element > memory_budget
+    assert (plan.n_chunks - 1) * plan.chunk_size < n_boot and n_boot <= plan.n_chunks * plan.chunk_size
+
+
+def test_boot_weights_chunked():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    chunk_size = np.random.randint(low=1, high=25)
+    epsilon = np.random.choice([0, 1e-10])
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    np.random.seed(seed)
+    weight = bu.boot_weights(N, n_boot, epsilon=epsilon)
+
+    np.random.seed(seed)
+    chunks = list(bu.boot_weights_chunked(N, n_boot, epsilon=epsilon, chunk_size=chunk_size))
+    assert all(len(ww) <= chunk_size for ww in chunks)
+    assert np.all(np.concatenate(chunks, axis=0) == weight)
+
+
+def test_poisson_weights():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    epsilon = np.random.choice([0, 1e-10])
+
+    weight = bu.poisson_weights(N, n_boot, epsilon=epsilon)
+    assert weight.shape == (n_boot, N)
+    assert np.all(weight >= epsilon)
+    assert np.all((weight == epsilon) | (weight == np.round(weight)))
+
+
+def test_boot_counts():
+    n_distinct = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+
+    counts = np.random.randint(low=1, high=10, size=n_distinct)
+    counts_boot = bu.boot_counts(counts, n_boot)
+    assert counts_boot.shape == (n_boot, n_distinct)
+    assert np.all(counts_boot >= 0)
+    assert np.all(np.sum(counts_boot, axis=1) == np.sum(counts))
+
+
+def test_boot_index():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    n_groups = np.random.randint(low=1, high=5)
+    epsilon = np.random.choice([0, 1e-10])
+
+    boot_idx = bu.boot_index(N, n_boot, epsilon=epsilon)
+    assert boot_idx.index.shape == (n_boot, N)
+    assert np.all(0 <= boot_idx.index) and np.all(boot_idx.index < N)
+
+    weight = bu.index_to_weights(boot_idx)
+    assert weight.shape == (n_boot, N)
+    assert np.allclose(np.sum(weight, axis=1), N * (1.0 + epsilon))
+    assert np.all(weight == np.round(weight) + epsilon)
+
+    group = np.random.randint(low=0, high=n_groups, size=N)
+    x = np.random.randn(N)
+    sums = bu.index_group_sums(boot_idx, group, n_groups, x)
+    sums2 = np.stack([np.sum((weight * x)[:, group == gg], axis=1) for gg in range(n_groups)], axis=1)
+    assert np.allclose(sums, sums2)
+
+
+def test_boot_means():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    n_cols = np.random.randint(low=1, high=5)
+
+    weight = bu.index_to_weights(bu.boot_index(N, n_boot))
+    x = np.random.randn(N, n_cols)
+    mu_boot = bu.boot_means(weight, x)
+    assert mu_boot.shape == (n_boot, n_cols)
+    for ii in range(n_boot):
+        assert np.allclose(mu_boot[ii, :], np.average(x, weights=weight[ii, :], axis=0))
+
+
+def test_batched_stats():
+    n_boot = np.random.randint(low=1, high=100)
+    n_cols = np.random.randint(low=1, high=5)
+    confidence = np.random.rand()
+
+    boot_estimates = np.random.randn(n_boot, n_cols)
+    if np.random.rand() <= 0.5:  # make ties with the reference
+        boot_estimates = np.round(boot_estimates)
+    original_estimate = np.random.randn(n_cols)
+    ref = np.random.randn(n_boot, n_cols)
+
+    EB = bu.error_bar(boot_estimates, original_estimate, confidence=confidence)
+    pval = bu.significance(boot_estimates, 0.0)
+    pval_paired = bu.significance(boot_estimates, ref)
+    pval_cols = bu.significance(boot_estimates, original_estimate)
+    se = bu.significance_mc_se(boot_estimates, 0.0)
+    assert EB.shape == (n_cols,) and pval.shape == (n_cols,) and pval_paired.shape == (n_cols,)
+
+    # Same as one column at a time
+    for jj in range(n_cols):
+        assert EB[jj] == bu.error_bar(boot_estimates[:, jj], original_estimate[jj], confidence=confidence)
+        assert pval[jj] == bu.significance(boot_estimates[:, jj], 0.0)
+        assert pval_paired[jj] == bu.significance(boot_estimates[:, jj], ref[:, jj])
+        assert pval_cols[jj] == bu.significance(boot_estimates[:, jj], original_estimate[jj])
+        assert se[jj] == bu.significance_mc_se(boot_estimates[:, jj], 0.0)
+
+
+def test_jackknife_mean_accel():
+    N = np.random.randint(low=2, high=10)
+    x = np.random.randn(N)
+    if np.random.rand() <= 0.1:
+        x[:] = 0.5  # Mean is exact here, so no spread at all
+
+    accel = bu.jackknife_mean_accel(x)
+
+    loo = np.array([np.mean(np.delete(x, ii)) for ii in range(N)])
+    dev = np.mean(loo) - loo
+    accel2 = np.sum(dev ** 3) / (6.0 * np.sum(dev ** 2) ** 1.5) if np.any(dev != 0.0) else 0.0
+    assert np.allclose(accel, accel2)
+
+
+def test_bca():
+    n_boot = np.random.randint(low=1, high=100)
+    n_cols = np.random.randint(low=1, high=5)
+    confidence = np.random.rand()
+
+    boot_estimates = np.random.randn(n_boot, n_cols)
+    original_estimate = np.random.randn(n_cols)
+    accel = 0.1 * np.random.randn(n_cols)
+
+    LB, UB = bu.bca(boot_estimates, original_estimate, accel, confidence=confidence)
+    assert LB.shape == (n_cols,) and UB.shape == (n_cols,)
+    assert np.all(LB <= UB)
+    assert np.all(np.min(boot_estimates, axis=0) <= LB) and np.all(UB <= np.max(boot_estimates, axis=0))
+    # All bounds are replicates
+    assert np.all(np.any(boot_estimates == LB, axis=0)) and np.all(np.any(boot_estimates == UB, axis=0))
+
+    # No bias and no acceleration is the same as percentile, up to round off in
+    # picking the order statistic.
+    boot_estimates = np.concatenate((boot_estimates, 2.0 * original_estimate - boot_estimates), axis=0)
+    LB, UB = bu.bca(boot_estimates, original_estimate, np.zeros(n_cols), confidence=confidence)
+    LB_, UB_ = bu.percentile(boot_estimates, confidence=confidence)
+    srt = np.sort(boot_estimates, axis=0)
+    for jj in range(n_cols):
+        rank, rank_ = np.searchsorted(srt[:, jj], [LB[jj], LB_[jj]])
+        assert np.abs(rank - rank_) <= 1
+        rank, rank_ = np.searchsorted(srt[:, jj], [UB[jj], UB_[jj]])
+        assert np.abs(rank - rank_) <= 1
+
+
+def test_mc_se():
+    n_boot = np.random.randint(low=1, high=100)
+    confidence = np.random.rand()
+    q = np.random.rand()
+
+    boot_estimates = np.random.randn(n_boot)
+    se = bu.quantile_mc_se(boot_estimates, q)
+    assert 0.0 <= se and se <= 0.5 * np.ptp(boot_estimates)
+    assert bu.quantile_mc_se(np.zeros(n_boot), q) == 0.0
+
+    se = bu.error_bar_mc_se(boot_estimates, confidence=confidence)
+    assert 0.0 <= se and se <= 0.5 * np.ptp(boot_estimates)
+
+    se = bu.significance_mc_se(boot_estimates, 0.0)
+    assert 0.0 <= se and se <= 1.0 / np.sqrt(n_boot) + 1e-12
+    assert bu.significance_mc_se(np.abs(boot_estimates) + 1.0, 0.0) == 0.0
+
+    # Same as one column at a time
+    n_cols = np.random.randint(low=1, high=5)
+    boot_estimates = np.random.randn(n_boot, n_cols)
+    q_se = bu.quantile_mc_se(boot_estimates, q)
+    EB_se = bu.error_bar_mc_se(boot_estimates, confidence=confidence)
+    assert q_se.shape == (n_cols,) and EB_se.shape == (n_cols,)
+    for jj in range(n_cols):
+        assert q_se[jj] == bu.quantile_mc_se(boot_estimates[:, jj], q)
+        assert EB_se[jj] == bu.error_bar_mc_se(boot_estimates[:, jj], confidence=confidence)
+
+
+if __name__ == "__main__":
+    np.random.seed(845623)
+
+    for rr in range(MC_REPEATS_LARGE):
+        test_boot_chunk_size()
+        test_memory_plan()
+        test_boot_weights_chunked()
+        test_poisson_weights()
+        test_boot_counts()
+        test_boot_index()
+        test_boot_means()
+        test_batched_stats()
+        test_jackknife_mean_accel()
+        test_bca()
+        test_mc_se()
+    print("passed")
@@ -1,11 +1,21 @@
 # Ryan Turner (turnerry@iro.umontreal.ca)
 from __future__ import absolute_import, division, print_function
 
+import os
+import warnings
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import mkdtemp
+
 import numpy as np
+import pandas as pd
 from sklearn.metrics import brier_score_loss, log_loss, zero_one_loss
 
+import mlpaper.boot_util as bu
 import mlpaper.classification as btc
+import mlpaper.perf_curves as pc
 from mlpaper import util
+from mlpaper.constants import METHOD, PVAL_COL
 from mlpaper.test_constants import MC_REPEATS_LARGE
 
 
@@ -145,6 +155,408 @@ def test_spherical_loss():
         assert np.max(np.abs(loss2 - 1.0)) <= 1e-8
 
 
+def test_std_class_losses():
+    n_labels = np.random.randint(low=1, high=10)
+    N = np.random.randint(low=1, high=10)
+    n_funcs = np.random.randint(low=0, high=len(btc.FUSED_CLASS_LOSS) + 1)
+
+    y = np.random.randint(low=0, high=n_labels, size=N)
+    y_pred = util.normalize(np.random.randn(N, n_labels))
+    if np.random.rand() <= 0.5:  # Some labels with zero prob
+        with np.errstate(divide="ignore"):
+            y_pred = np.log(np.random.rand(N, n_labels) <= 0.5) + y_pred
+        y_pred[np.arange(N), y] = np.maximum(y_pred[np.arange(N), y], -10.0)
+        y_pred = util.normalize(y_pred)
+
+    loss_funcs = list(btc.FUSED_CLASS_LOSS)
+    loss_funcs = [loss_funcs[ii] for ii in np.random.choice(len(loss_funcs), size=n_funcs, replace=False)]
+    losses = btc.std_class_losses(y, y_pred, loss_funcs)
+    assert sorted(losses.keys(), key=id) == sorted(loss_funcs, key=id)
+    for loss_f, loss in losses.items():
+        assert loss.shape == (N,)
+        assert np.allclose(loss, loss_f(y, y_pred))
+
+    # Unknown metrics are passed through
+    metrics_dict = dict(btc.STD_CLASS_LOSS)
+    metrics_dict["half_NLL"] = lambda y, log_pred_prob: 0.5 * btc.log_loss(y, log_pred_prob)
+    cols = pd.MultiIndex.from_product([["m0", "m1"], range(n_labels)])
+    log_pred_prob_table = pd.DataFrame(data=np.concatenate((y_pred, y_pred), axis=1), columns=cols)
+    loss_tbl = btc.loss_table(log_pred_prob_table, y, metrics_dict)
+    for metric, metric_f in metrics_dict.items():
+        for method in ("m0", "m1"):
+            assert np.allclose(loss_tbl[(metric, method)].values, metric_f(y, y_pred))
+
+
+def test_curve_boot_chunked():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    curve_f = np.random.choice([pc.roc_curve, pc.recall_precision_curve, pc.prg_curve])
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    y = np.random.rand(N) <= 0.5
+    y_pred = util.normalize(np.random.randn(N, 2))
+    y_ref = util.normalize(np.random.randn(N, 2))
+    ref = y_ref if np.random.rand() <= 0.5 else 0.5
+
+    np.random.seed(seed)
+    summary, curve = btc.curve_boot(y, y_pred, ref=ref, curve_f=curve_f, n_boot=n_boot)
+
+    # Get the same answer when only a few replicates are drawn at a time
+    chunk_elements, budget = bu.BOOT_CHUNK_ELEMENTS, bu.MEMORY_BUDGET
+    if np.random.rand() <= 0.5:
+        bu.BOOT_CHUNK_ELEMENTS = 1
+    else:
+        bu.MEMORY_BUDGET = np.random.randint(low=1, high=3 * N * bu.CURVE_BYTES)
+    np.random.seed(seed)
+    summary2, curve2 = btc.curve_boot(y, y_pred, ref=ref, curve_f=curve_f, n_boot=n_boot)
+    bu.BOOT_CHUNK_ELEMENTS, bu.MEMORY_BUDGET = chunk_elements, budget
+
+    # Weights are identical, but numpy reductions may round differently by shape
+    assert np.allclose(summary, summary2, equal_nan=True)
+    assert np.allclose(curve.values, curve2.values, equal_nan=True)
+
+
+def test_curve_boot_dict():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    y = np.random.rand(N) <= 0.5
+    y_pred = util.normalize(np.random.randn(N, 2))
+    y_ref = util.normalize(np.random.randn(N, 2))
+    ref = y_ref if np.random.rand() <= 0.5 else 0.5
+
+    # All curves share the replicates, so same as each curve alone
+    results = btc._curve_boot_dict(y, y_pred, ref, btc.STD_BINARY_CURVES, n_boot=n_boot, random_state=seed)
+    for curve_name, curve_f in btc.STD_BINARY_CURVES.items():
+        summary, curve = btc.curve_boot(y, y_pred, ref=ref, curve_f=curve_f, n_boot=n_boot, random_state=seed)
+        summary2, curve2 = results[curve_name]
+        assert np.allclose(summary, summary2, equal_nan=True)
+        assert curve.equals(curve2)
+
+
+def test_curve_boot_quantized():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    n_distinct = np.random.randint(low=1, high=5)
+    curve_f = np.random.choice([pc.roc_curve, pc.recall_precision_curve, pc.prg_curve])
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    # Discrete scores, so the quantization is exact with N buckets
+    y = np.random.rand(N) <= 0.5
+    y_pred = util.normalize(np.random.randint(low=0, high=n_distinct, size=(N, 2)).astype(float))
+    y_ref = util.normalize(np.random.randint(low=0, high=n_distinct, size=(N, 2)).astype(float))
+    ref = y_ref if np.random.rand() <= 0.5 else 0.5
+
+    summary, curve = btc.curve_boot(y, y_pred, ref=ref, curve_f=curve_f, n_boot=n_boot, random_state=seed)
+    summary2, curve2 = btc.curve_boot(
+        y, y_pred, ref=ref, curve_f=curve_f, n_boot=n_boot, random_state=seed, n_buckets=N
+    )
+    # Same estimate, but the replicates are drawn differently
+    assert np.allclose(summary[0], summary2[0], equal_nan=True)
+    assert np.allclose(curve[btc.CURVE_STATS[0]], curve2[btc.CURVE_STATS[0]], equal_nan=True)
+
+    # With a single bucket the error bar is widened to cover the exact area
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        summary3, _ = btc.curve_boot(y, y_pred, ref=ref, curve_f=curve_f, n_boot=n_boot, random_state=seed, n_buckets=1)
+    caught = [ww for ww in caught if issubclass(ww.category, UserWarning)]
+    assert np.isfinite(summary3[1])
+    if curve_f != pc.prg_curve:
+        assert len(caught) == 0
+        assert np.abs(summary3[0] - summary[0]) <= summary3[1] + 1e-8
+
+    # PRG can have no finite bound, then the error bar is not widened
+    changed = np.any(y_pred[:, 1] != y_pred[0, 1])
+    changed = changed or (np.ndim(ref) == 2 and btc.PAIRWISE_DEFAULT and np.any(y_ref[:, 1] != y_ref[0, 1]))
+    bound = pc.quantized_area_bound(y, np.zeros(N), curve_f)
+    assert len(caught) == int(changed and not np.isfinite(bound))
+
+
+def test_curve_boot_accumulated():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=20)
+    n_distinct = np.random.randint(low=1, high=5)
+    curve_f = np.random.choice([pc.roc_curve, pc.recall_precision_curve, pc.prg_curve])
+    paired = np.random.rand() <= 0.5
+
+    # Discrete scores, so the buckets are exact
+    y = np.random.rand(N) <= 0.5
+    y_pred = util.normalize(np.random.randint(low=0, high=n_distinct, size=(N, 2)).astype(float))
+    y_ref = util.normalize(np.random.randint(low=0, high=n_distinct, size=(N, 2)).astype(float))
+    thresholds = np.unique(np.concatenate((y_pred[:, 1], y_ref[:, 1])))
+
+    acc = pc.curve_accumulator(thresholds, n_boot, paired=paired)
+    for idx in np.array_split(np.arange(N), 2):
+        pc.accumulate_curve(acc, y[idx], y_pred[idx, 1], y_ref[idx, 1] if paired else None)
+    summary, curve = btc.curve_boot_accumulated(acc, None if paired else 0.5, curve_f=curve_f)
+
+    # Same estimate as all the data at once, but the replicates are Poisson
+    summary2, curve2 = btc.curve_boot(y, y_pred, ref=y_ref if paired else 0.5, curve_f=curve_f, n_boot=n_boot)
+    assert np.allclose(summary[0], summary2[0], equal_nan=True)
+    assert list(curve.columns) == list(btc.CURVE_STATS)
+    assert np.allclose(curve.values[:, :2], curve2.values[:, :2], equal_nan=True)
+    assert 0.0 <= summary[2] and summary[2] <= 1.0
+
+
+def test_curve_boot_one_vs_rest():
+    N = np.random.randint(low=1, high=10)
+    n_labels = np.random.randint(low=2, high=5)
+    n_boot = np.random.randint(low=1, high=20)
+    curve_f = np.random.choice([pc.roc_curve, pc.recall_precision_curve])
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    y = np.random.randint(low=0, high=n_labels, size=N)
+    y_pred = util.normalize(np.random.randn(N, n_labels))
+    y_ref = util.normalize(np.random.randn(N, n_labels))
+    ref = y_ref if np.random.rand() <= 0.5 else 0.5
+
+    # Macro: the mean of the binary curves of each label in y
+    summary, curve = btc.curve_boot(y, y_pred, ref, curve_f=curve_f, n_boot=n_boot, random_state=seed, average="macro")
+    aucs, y_grids = [], []
+    for label in np.unique(y):
+        y_pred_bin = np.stack((np.zeros(N), y_pred[:, label]), axis=1)
+        summary2, curve2 = btc.curve_boot(y == label, y_pred_bin, 0.5, curve_f=curve_f, n_boot=1)
+        aucs.append(summary2[0])
+        y_grids.append(curve2[btc.CURVE_STATS[1]].values)
+    assert np.allclose(summary[0], np.mean(aucs))
+    assert np.allclose(curve[btc.CURVE_STATS[1]].values, np.mean(y_grids, axis=0))
+    assert np.all(curve[btc.CURVE_STATS[2]] <= curve[btc.CURVE_STATS[3]])
+
+    # Micro: one binary curve over all (data point, label) pairs
+    summary, curve = btc.curve_boot(y, y_pred, ref, curve_f=curve_f, n_boot=n_boot, random_state=seed, average="micro")
+    y_bin = util.one_hot(y, n_labels).ravel()
+    y_pred_bin = np.stack((np.zeros(N * n_labels), y_pred.ravel()), axis=1)
+    summary2, curve2 = btc.curve_boot(y_bin, y_pred_bin, 0.5, curve_f=curve_f, n_boot=1)
+    assert np.allclose(summary[0], summary2[0])
+    assert np.allclose(curve[btc.CURVE_STATS[1]], curve2[btc.CURVE_STATS[1]])
+
+    # Binary problems are the same with either one-vs-rest of the two labels
+    if n_labels == 2 and np.all(np.isin([0, 1], y)):
+        summary, _ = btc.curve_boot(y, y_pred, 0.5, curve_f=pc.roc_curve, n_boot=n_boot, random_state=seed)
+        summary2, _ = btc.curve_boot(y, y_pred, 0.5, n_boot=n_boot, random_state=seed, average="macro")
+        assert np.allclose(summary[0], summary2[0])
+
+
+def test_pred_tensor():
+    N = np.random.randint(low=1, high=10)
+    n_methods = np.random.randint(low=1, high=4)
+    n_labels = np.random.randint(low=1, high=4)
+    n_boot = np.random.randint(low=1, high=20)
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    methods = ["m%d" % ii for ii in range(n_methods)]
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([methods, range(n_labels)], names=[METHOD, btc.LABEL])
+    log_pred_prob_table = pd.DataFrame(data=util.normalize(np.random.randn(N, n_methods * n_labels)), columns=cols)
+    y = np.random.randint(low=0, high=n_labels, size=N)
+
+    pred = btc.as_pred_tensor(log_pred_prob_table)
+    assert list(pred.methods) == methods and pred.index.equals(log_pred_prob_table.index)
+    assert pred.log_pred_prob.shape == (n_methods, N, n_labels)
+    assert np.shares_memory(pred.log_pred_prob, log_pred_prob_table.values)
+    for ii, method in enumerate(methods):
+        assert np.all(pred.log_pred_prob[ii] == log_pred_prob_table[method].values)
+
+    # Round trip with no copy
+    log_pred_prob_table2 = btc.pred_tensor_to_table(pred)
+    assert log_pred_prob_table2.equals(log_pred_prob_table)
+    assert np.shares_memory(pred.log_pred_prob, log_pred_prob_table2.values)
+    assert btc.as_pred_tensor(pred).log_pred_prob is pred.log_pred_prob
+
+    # Same results from either layout
+    loss_tbl = btc.loss_table(log_pred_prob_table, y, btc.STD_CLASS_LOSS)
+    assert loss_tbl.equals(btc.loss_table(pred, y, btc.STD_CLASS_LOSS))
+    if n_labels == 2:
+        curve_tbl, curve_dump = btc.curve_summary_table(
+            log_pred_prob_table, y, btc.STD_BINARY_CURVES, ref_method, n_boot=n_boot, random_state=seed
+        )
+        curve_tbl2, curve_dump2 = btc.curve_summary_table(
+            pred, y, btc.STD_BINARY_CURVES, ref_method, n_boot=n_boot, random_state=seed
+        )
+        assert curve_tbl.equals(curve_tbl2)
+        assert all(curve_dump[kk].equals(curve_dump2[kk]) for kk in curve_dump)
+
+
+def test_curve_summary_table_n_jobs():
+    N = np.random.randint(low=1, high=10)
+    n_methods = np.random.randint(low=1, high=4)
+    n_boot = np.random.randint(low=1, high=20)
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    methods = ["m%d" % ii for ii in range(n_methods)]
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([methods, range(2)])
+    log_pred_prob_table = pd.DataFrame(data=np.random.randn(N, 2 * n_methods), columns=cols)
+    y = np.random.rand(N) <= 0.5
+
+    curve_tbl, curve_dump = btc.curve_summary_table(
+        log_pred_prob_table, y, btc.STD_BINARY_CURVES, ref_method, n_boot=n_boot, random_state=seed
+    )
+    # Same result when the curves are spread over worker processes
+    curve_tbl2, curve_dump2 = btc.curve_summary_table(
+        log_pred_prob_table, y, btc.STD_BINARY_CURVES, ref_method, n_boot=n_boot, random_state=seed, n_jobs=2
+    )
+    assert curve_tbl.equals(curve_tbl2)
+    assert sorted(curve_dump.keys()) == sorted(curve_dump2.keys())
+    assert all(curve_dump[kk].equals(curve_dump2[kk]) for kk in curve_dump)
+
+
+def test_curve_summary_table_shared_ref():
+    N = np.random.randint(low=1, high=10)
+    n_methods = np.random.randint(low=1, high=4)
+    n_boot = np.random.randint(low=1, high=20)
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    methods = ["m%d" % ii for ii in range(n_methods)]
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([methods, range(2)])
+    log_pred_prob_table = pd.DataFrame(data=np.random.randn(N, 2 * n_methods), columns=cols)
+    y = np.random.rand(N) <= 0.5
+
+    curve_tbl, curve_dump = btc.curve_summary_table(
+        log_pred_prob_table, y, btc.STD_BINARY_CURVES, ref_method, n_boot=n_boot, random_state=seed
+    )
+    # Every method is on the same replicates as the ref, so it is the same as
+    # a paired curve_boot with the shared stream.
+    for method in methods:
+        for curve_name, curve_f in btc.STD_BINARY_CURVES.items():
+            shared_state, = util.spawn_random_states(seed, 1)
+            summary, curve = btc.curve_boot(
+                y,
+                log_pred_prob_table[method].values,
+                ref=log_pred_prob_table[ref_method].values,
+                curve_f=curve_f,
+                n_boot=n_boot,
+                random_state=shared_state,
+            )
+            summary2 = curve_tbl.loc[method, curve_name].values
+            assert np.allclose(summary[0], summary2[0])
+            if method != ref_method:
+                assert np.allclose(summary, summary2, equal_nan=True)
+            assert np.allclose(curve.values, curve_dump[(method, curve_name)].values, equal_nan=True)
+
+
+def test_curve_summary_table_envelope():
+    N = np.random.randint(low=1, high=10)
+    n_methods = np.random.randint(low=1, high=4)
+    n_boot = np.random.randint(low=1, high=20)
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    methods = ["m%d" % ii for ii in range(n_methods)]
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([methods, range(2)])
+    log_pred_prob_table = pd.DataFrame(data=np.random.randn(N, 2 * n_methods), columns=cols)
+    y = np.random.rand(N) <= 0.5
+
+    curve_tbl, _ = btc.curve_summary_table(
+        log_pred_prob_table, y, btc.STD_BINARY_CURVES, ref_method, n_boot=n_boot, random_state=seed
+    )
+    # Same summaries (up to round off in AUC) without the envelopes
+    curve_tbl2, curve_dump2 = btc.curve_summary_table(
+        log_pred_prob_table, y, btc.STD_BINARY_CURVES, ref_method, n_boot=n_boot, random_state=seed, envelope=False
+    )
+    assert curve_dump2 == {}
+    assert curve_tbl.columns.equals(curve_tbl2.columns) and curve_tbl.index.equals(curve_tbl2.index)
+    # Round off can break exact ties with the reference differently for the
+    # AUC p-value, so only compare it for the other curves.
+    cols = [cc for cc in curve_tbl.columns if cc[1] != PVAL_COL or cc[0] != "AUC"]
+    assert np.allclose(curve_tbl[cols].values, curve_tbl2[cols].values, equal_nan=True)
+
+
+def test_curve_summary_table_buckets_average():
+    N = np.random.randint(low=1, high=10)
+    n_labels = np.random.randint(low=2, high=5)
+    n_methods = np.random.randint(low=1, high=4)
+    n_boot = np.random.randint(low=1, high=20)
+    average = np.random.choice(["macro", "micro"])
+    curve_dict = {"AUC": pc.roc_curve}
+
+    methods = ["m%d" % ii for ii in range(n_methods)]
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([methods, range(n_labels)])
+    log_pred_prob_table = pd.DataFrame(data=np.random.randn(N, n_labels * n_methods), columns=cols)
+    y = np.random.randint(low=0, high=n_labels, size=N)
+
+    curve_tbl, _ = btc.curve_summary_table(
+        log_pred_prob_table, y, curve_dict, ref_method, n_boot=n_boot, average=average
+    )
+    assert curve_tbl.shape == (n_methods, 3)
+
+    # Quantized scores can not do one-vs-rest curves, so fail loudly
+    for n_labels_ in (2, n_labels):
+        table = log_pred_prob_table.loc[:, (slice(None), slice(0, n_labels_ - 1))]
+        y_ = np.minimum(y, n_labels_ - 1)
+        try:
+            btc.curve_summary_table(table, y_, curve_dict, ref_method, n_boot=n_boot, n_buckets=16, average=average)
+            assert False
+        except ValueError:
+            pass
+        try:
+            btc.summary_table(table, y_, {}, curve_dict, ref_method, n_boot=n_boot, n_buckets=16, average=average)
+            assert False
+        except ValueError:
+            pass
+        try:
+            btc.curve_boot(y_, table[ref_method].values, 0.5, n_boot=n_boot, n_buckets=16, average=average)
+            assert False
+        except ValueError:
+            pass
+
+
+def test_get_pred_log_prob_backend():
+    N = np.random.randint(low=1, high=10)
+    n_labels = np.random.randint(low=1, high=4)
+    n_methods = np.random.randint(low=1, high=4)
+
+    X = np.random.randn(N, 2)
+    y = np.random.randint(low=0, high=n_labels, size=N)
+    methods = {"m%d" % ii: btc.JustNoise(n_labels, pseudo_count=float(ii)) for ii in range(n_methods)}
+
+    pred_tbl = btc.get_pred_log_prob(X, y, X, n_labels, methods)
+    # Same result in method order from a pool, checkpointed through the cache
+    checkpointdir = mkdtemp()
+    for backend in ("threading", "multiprocessing"):
+        pred_tbl2 = btc.get_pred_log_prob(
+            X, y, X, n_labels, methods, checkpointdir=checkpointdir, n_jobs=2, backend=backend
+        )
+        assert pred_tbl.equals(pred_tbl2)
+    assert len(os.listdir(checkpointdir)) >= 1
+
+    # The checkpoints do not depend on verbose, so nothing is fit or printed
+    out = StringIO()
+    with redirect_stdout(out):
+        pred_tbl2 = btc.get_pred_log_prob(X, y, X, n_labels, methods, verbose=True, checkpointdir=checkpointdir)
+    assert pred_tbl.equals(pred_tbl2)
+    assert out.getvalue() == ""
+
+
+def test_get_pred_log_prob_verbose():
+    N = np.random.randint(low=1, high=10)
+    n_labels = np.random.randint(low=1, high=4)
+    n_methods = np.random.randint(low=1, high=4)
+
+    X = np.random.randn(N, 2)
+    y = np.random.randint(low=0, high=n_labels, size=N)
+
+    out = StringIO()
+    printed = []
+
+    class LoggedNoise(btc.JustNoise):
+        def fit(self, X_train, y_train):
+            printed.append(out.getvalue())
+            return btc.JustNoise.fit(self, X_train, y_train)
+
+    methods = {"m%d" % ii: LoggedNoise(n_labels) for ii in range(n_methods)}
+    with redirect_stdout(out):
+        btc.get_pred_log_prob(X, y, X, n_labels, methods, verbose=True)
+
+    # Each method is printed as its fit starts, not all of them up front
+    assert len(printed) == n_methods
+    for ii, msg in enumerate(printed):
+        assert msg.splitlines() == ["Running fit/predict for m%d" % jj for jj in range(ii + 1)]
+
+
 if __name__ == "__main__":
     np.random.seed(845412)
 
@@ -154,4 +566,18 @@ if __name__ == "__main__":
         test_log_loss()
         test_brier_loss()
         test_spherical_loss()
+        test_std_class_losses()
+        test_curve_boot_chunked()
+        test_curve_boot_dict()
+        test_curve_boot_quantized()
+        test_curve_boot_accumulated()
+        test_curve_summary_table_envelope()
+        test_pred_tensor()
+        test_curve_summary_table_shared_ref()
+        test_curve_boot_one_vs_rest()
+        test_curve_summary_table_buckets_average()
+        test_get_pred_log_prob_verbose()
+    # Starting up worker processes is slow, so not in the loop
+    test_curve_summary_table_n_jobs()
+    test_get_pred_log_prob_backend()
     print("passed")
@@ -8,6 +8,7 @@ import numpy as np
 import pandas as pd
 import scipy.stats as ss
 
+import mlpaper.boot_util as bu
 import mlpaper.constants as cc
 import mlpaper.mlpaper as bt
 from mlpaper.test_constants import FPR, MC_REPEATS_LARGE
@@ -255,6 +256,35 @@ def test_bernstein_test_to_EB():
         assert np.allclose(np.abs(np.mean(x)), EB)
 
 
+def test_cols_to_scalar():
+    N = np.random.randint(low=0, high=10)
+    n_cols = np.random.randint(low=1, high=5)
+    confidence = np.random.rand()
+
+    x = np.random.randn(N, n_cols)
+    if N >= 1 and np.random.rand() <= 0.5:
+        x[np.random.randint(N), np.random.randint(n_cols)] = np.inf
+    lower = np.minimum(np.min(x, axis=0, initial=0.0), np.random.randn(n_cols))
+    upper = np.maximum(np.max(x, axis=0, initial=0.0), np.random.randn(n_cols))
+
+    pval = bt.t_test_cols(x)
+    EB = bt.t_EB_cols(x, confidence=confidence)
+    pval_b = bt.bernstein_test_cols(x, lower, upper)
+    EB_b = bt.bernstein_EB_cols(x, lower, upper, confidence=confidence)
+    for jj in range(n_cols):
+        assert pval[jj] == bt.t_test(x[:, jj])
+        assert EB[jj] == bt.t_EB(x[:, jj], confidence=confidence)
+        assert pval_b[jj] == bt.bernstein_test(x[:, jj], lower[jj], upper[jj])
+        assert EB_b[jj] == bt.bernstein_EB(x[:, jj], lower[jj], upper[jj], confidence=confidence)
+
+    # Check Bernstein closed form root against root finding
+    if N >= 2 and 0.0 < pval_b[0] and pval_b[0] < 1.0:
+        range_ = upper[0] - lower[0]
+        coef = [(3.0 * range_) / N, np.std(x[:, 0]) * np.sqrt(2.0 / N), -np.abs(np.mean(x[:, 0]))]
+        B = np.max(np.roots(coef)) ** 2
+        assert np.allclose(pval_b[0], 3.0 * np.exp(-B))
+
+
 def test_boot_EB_and_test():
     seed_iter = np.random.randint(0, 10 ** 6, size=MC_REPEATS_LARGE)
     for seed in seed_iter:
@@ -295,6 +325,54 @@ def test_boot_EB_and_test():
         assert CI[0] <= 0.0 and 0.0 <= CI[1]
 
 
+def test_boot_EB_and_test_adaptive():
+    N = np.random.randint(low=0, high=20)
+    x = np.random.randn(N) + np.random.randn()
+    confidence = np.random.rand()
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    # Fixed n_boot is the same as the other bootstrap routines
+    n_boot = np.random.randint(low=1, high=100)
+    EB, pval, n_boot_used = bt.boot_EB_and_test(x, confidence=confidence, n_boot=n_boot, random_state=seed)
+    EB_, pval_, _ = bt._boot_EB_and_test(x, confidence=confidence, n_boot=n_boot, random_state=seed)
+    assert EB == EB_ and pval == pval_
+    assert n_boot_used == (n_boot if N > 1 else 0)
+
+    n_boot_max = bt.N_BOOT_MAX
+    bt.N_BOOT_MAX = 10 * bt.N_BOOT_BATCH
+    EB, pval, n_boot_used = bt.boot_EB_and_test(x, confidence=confidence, random_state=seed)
+    bt.N_BOOT_MAX = n_boot_max
+    assert 0.0 <= pval and pval <= 1.0
+    if N <= 1:
+        assert EB == np.inf and n_boot_used == 0
+    else:
+        assert 0.0 <= EB
+        assert bt.N_BOOT_BATCH <= n_boot_used and n_boot_used <= 10 * bt.N_BOOT_BATCH
+        assert n_boot_used % bt.N_BOOT_BATCH == 0
+
+
+def test_bca_EB():
+    N = np.random.randint(low=0, high=20)
+    x = np.random.exponential(size=N)
+    confidence = np.random.rand()
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    EB = bt.bca_EB(x, confidence=confidence, n_boot=100, random_state=seed)
+    if N <= 1:
+        assert EB == np.inf
+        return
+    assert 0.0 <= EB and EB < np.inf
+
+    # Error bar is the bigger side of the BCa interval
+    EB_, _, CI = bt._boot_EB_and_test(x, confidence=confidence, n_boot=100, return_CI=True, random_state=seed, bca=True)
+    assert EB == EB_
+    assert np.allclose(EB, np.fmax(CI[1] - np.mean(x), np.mean(x) - CI[0]))
+
+    mu, EB_ = bt.get_mean_and_EB(x, confidence=confidence, lower=0.0, method="bca", random_state=seed)
+    assert mu == np.mean(x)
+    assert 0.0 <= EB_
+
+
 def test_get_mean_EB_test():
     seed_iter = np.random.randint(0, 10 ** 6, size=MC_REPEATS_LARGE)
     for seed in seed_iter:
@@ -429,6 +507,269 @@ def test_loss_summary_table():
                 assert pval == pval_
 
 
+def test_loss_summary_table_stream():
+    N = np.random.randint(low=1, high=20)
+    n_methods = np.random.randint(low=1, high=5)
+    n_metrics = np.random.randint(low=1, high=5)
+    n_chunks = np.random.randint(low=1, high=5)
+    confidence = np.random.rand()
+    pairwise_CI = np.random.rand() <= 0.5
+
+    methods = np.random.choice(list(ascii_letters), n_methods, replace=False)
+    ref_method = np.random.choice(methods)
+    metrics = np.random.choice(list(ascii_letters), n_metrics, replace=False)
+
+    cols = pd.MultiIndex.from_product([metrics, methods], names=[cc.METRIC, cc.METHOD])
+    dat = np.random.randn(N, n_metrics * n_methods)
+    tbl = pd.DataFrame(data=dat, index=range(N), columns=cols, dtype=float)
+    # Make a copy of the reference so we know the deltas are exactly zero
+    copy_method = np.random.choice(methods)
+    tbl.loc[:, (slice(None), copy_method)] = tbl.loc[:, (slice(None), ref_method)].values
+    inf_methods = [mm for mm in methods if mm not in (ref_method, copy_method)]
+    if len(inf_methods) > 0 and np.random.rand() <= 0.5:
+        tbl.loc[np.random.randint(N), (np.random.choice(metrics), np.random.choice(inf_methods))] = np.inf
+
+    limits = {mm: (np.min(tbl[mm].values) - 1.0, np.max(tbl[mm].values) + 1.0) for mm in metrics}
+    del limits[metrics[0]]  # Also test missing
+
+    chunks = np.array_split(np.arange(N), n_chunks)
+    stream = (tbl.iloc[idx, :] for idx in chunks if len(idx) > 0)
+    perf_tbl = bt.loss_summary_table(
+        stream, ref_method, pairwise_CI=pairwise_CI, confidence=confidence, method_EB="boot", limits=limits
+    )
+
+    mean_df = perf_tbl.xs(cc.MEAN_COL, axis=1, level=1)
+    for metric in metrics:
+        assert np.allclose(mean_df[metric].values, np.mean(tbl[metric][mean_df.index].values, axis=0))
+
+    pval_df = perf_tbl.xs(cc.PVAL_COL, axis=1, level=1)
+    assert np.all(np.isnan(pval_df.loc[ref_method, :].values))
+    other_pvals = pval_df.loc[pval_df.index != ref_method, :].values
+    assert np.all(0.0 <= other_pvals) and np.all(other_pvals <= 1.0)
+    if copy_method != ref_method:
+        assert np.all(pval_df.loc[copy_method, :].values == 1.0)
+
+    EB_df = perf_tbl.xs(cc.ERR_COL, axis=1, level=1)
+    if pairwise_CI:
+        assert np.all(np.isnan(EB_df.loc[ref_method, :].values))
+        EB_df = EB_df.loc[pval_df.index != ref_method, :]
+    assert np.all(0.0 <= EB_df.values)
+
+
+def test_boot_mean_distinct():
+    N = np.random.randint(low=1, high=100)
+    n_cols = np.random.randint(low=1, high=4)
+    n_boot = np.random.randint(low=1, high=100)
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    x = np.random.randint(low=0, high=3, size=(N, n_cols)).astype(float)
+    values, counts = bt._distinct_rows(x)
+    assert np.sum(counts) == N
+    assert len(np.unique(values, axis=0)) == len(values)
+    for row, count in zip(values, counts):
+        assert np.sum(np.all(x == row[None, :], axis=1)) == count
+    assert bt._distinct_rows(np.random.randn(N + 300)) is None
+
+    # Table path uses the counts
+    mu_boot = bt._boot_mean_table(x, n_boot=n_boot, random_state=seed)
+    counts_boot = bu.boot_counts(counts, n_boot, random_state=seed)
+    assert np.allclose(mu_boot, np.dot(counts_boot, values) / N)
+
+    mu_boot = bt._boot_mean(x[:, 0], n_boot=n_boot, random_state=seed)
+    assert mu_boot.shape == (n_boot,)
+    assert np.all(np.min(x[:, 0]) <= mu_boot) and np.all(mu_boot <= np.max(x[:, 0]))
+
+
+def test_loss_summary_table_boot():
+    N = np.random.randint(low=2, high=10)
+    n_methods = np.random.randint(low=1, high=4)
+    confidence = np.random.rand()
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    methods = np.random.choice(list(ascii_letters), n_methods, replace=False)
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([["foo", "bar"], methods], names=[cc.METRIC, cc.METHOD])
+    tbl = pd.DataFrame(data=np.random.randn(N, 2 * n_methods), columns=cols, dtype=float)
+    copy_method = np.random.choice(methods)
+    tbl.loc[:, (slice(None), copy_method)] = tbl.loc[:, (slice(None), ref_method)].values
+
+    perf_tbl = bt.loss_summary_table(
+        tbl, ref_method, pairwise_CI=False, confidence=confidence, method_EB="boot", random_state=seed
+    )
+
+    # All columns are resampled together
+    mu_boot = bt._boot_mean_table(tbl.values, random_state=seed)
+    for jj, (metric, method) in enumerate(tbl.columns):
+        mu, EB, pval = perf_tbl.loc[method, metric].values
+        assert np.allclose(mu, np.mean(tbl.values[:, jj]))
+        assert EB == bu.error_bar(mu_boot[:, jj], mu, confidence=confidence)
+
+    # Paired test on common replicates, so no difference for exact copy
+    if copy_method != ref_method:
+        pval_df = perf_tbl.xs(cc.PVAL_COL, axis=1, level=1)
+        assert np.all(pval_df.loc[copy_method, :].values == 1.0)
+
+
+def test_loss_summary_table_bca():
+    N = np.random.randint(low=2, high=10)
+    n_methods = np.random.randint(low=1, high=4)
+    confidence = np.random.rand()
+    pairwise_CI = np.random.rand() <= 0.5
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    methods = np.random.choice(list(ascii_letters), n_methods, replace=False)
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([["foo", "bar"], methods], names=[cc.METRIC, cc.METHOD])
+    tbl = pd.DataFrame(data=np.random.exponential(size=(N, 2 * n_methods)), columns=cols, dtype=float)
+
+    perf_tbl = bt.loss_summary_table(
+        tbl, ref_method, pairwise_CI=pairwise_CI, confidence=confidence, method_EB="bca", random_state=seed
+    )
+    perf_tbl_boot = bt.loss_summary_table(
+        tbl, ref_method, pairwise_CI=pairwise_CI, confidence=confidence, method_EB="boot", random_state=seed
+    )
+
+    # Same replicates and test as boot, but BCa error bars on each column
+    mu_boot = bt._boot_mean_table(tbl.values, random_state=seed)
+    for jj, (metric, method) in enumerate(tbl.columns):
+        mu, EB, pval = perf_tbl.loc[method, metric].values
+        mu_, _, pval_ = perf_tbl_boot.loc[method, metric].values
+        assert mu == mu_ and (pval == pval_ or (np.isnan(pval) and np.isnan(pval_)))
+
+        x, x_boot, est = tbl.values[:, jj], mu_boot[:, jj], mu
+        if pairwise_CI:
+            jj_ref = tbl.columns.get_loc((metric, ref_method))
+            if jj == jj_ref:
+                assert np.isnan(EB)
+                continue
+            # Difference of the table's means, replicates can tie with it for
+            # small N so it must be exactly the same.
+            est = mu - perf_tbl.loc[ref_method, (metric, cc.MEAN_COL)]
+            x, x_boot = x - tbl.values[:, jj_ref], x_boot - mu_boot[:, jj_ref]
+        LB, UB = bu.bca(x_boot, est, bu.jackknife_mean_accel(x), confidence=confidence)
+        assert np.allclose(EB, np.fmax(UB - est, est - LB))
+
+
+def test_loss_summary_table_random_state():
+    N = np.random.randint(low=2, high=10)
+    n_methods = np.random.randint(low=1, high=4)
+    seed = np.random.randint(low=0, high=10 ** 6)
+    pairwise_CI = np.random.rand() <= 0.5
+
+    methods = np.random.choice(list(ascii_letters), n_methods, replace=False)
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([["foo", "bar"], methods], names=[cc.METRIC, cc.METHOD])
+    tbl = pd.DataFrame(data=np.random.randn(N, 2 * n_methods), columns=cols, dtype=float)
+
+    # Same seed gives same bootstrap, and does not touch global state
+    state = np.random.get_state()
+    perf_tbl = bt.loss_summary_table(tbl, ref_method, pairwise_CI=pairwise_CI, method_EB="boot", random_state=seed)
+    assert np.all(np.random.get_state()[1] == state[1])
+    perf_tbl2 = bt.loss_summary_table(
+        tbl, ref_method, pairwise_CI=pairwise_CI, method_EB="boot", random_state=np.random.RandomState(seed)
+    )
+    assert np.all((perf_tbl.values == perf_tbl2.values) | (np.isnan(perf_tbl.values) & np.isnan(perf_tbl2.values)))
+
+    stream = [tbl.iloc[: N // 2, :], tbl.iloc[N // 2 :, :]]
+    perf_tbl = bt.loss_summary_table(stream, ref_method, pairwise_CI=pairwise_CI, method_EB="boot", random_state=seed)
+    perf_tbl2 = bt.loss_summary_table(stream, ref_method, pairwise_CI=pairwise_CI, method_EB="boot", random_state=seed)
+    assert np.all((perf_tbl.values == perf_tbl2.values) | (np.isnan(perf_tbl.values) & np.isnan(perf_tbl2.values)))
+
+
+def test_loss_summary_table_adaptive():
+    N = np.random.randint(low=1, high=20)
+    n_methods = np.random.randint(low=1, high=4)
+    confidence = np.random.rand()
+    pairwise_CI = np.random.rand() <= 0.5
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    methods = np.random.choice(list(ascii_letters), n_methods, replace=False)
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([["foo", "bar"], methods], names=[cc.METRIC, cc.METHOD])
+    if np.random.rand() <= 0.5:  # Few distinct rows, like zero-one loss
+        tbl = pd.DataFrame(data=np.random.randint(low=0, high=2, size=(N, 2 * n_methods)), columns=cols, dtype=float)
+    else:
+        tbl = pd.DataFrame(data=np.random.randn(N, 2 * n_methods), columns=cols, dtype=float)
+
+    # Fixed n_boot reports that many, non-bootstrap methods report zero
+    n_boot = np.random.randint(low=1, high=100)
+    perf_tbl, n_boot_used = bt.loss_summary_table(
+        tbl, ref_method, method_EB="boot", random_state=seed, n_boot=n_boot, return_n_boot=True
+    )
+    perf_tbl2 = bt.loss_summary_table(tbl, ref_method, method_EB="boot", random_state=seed, n_boot=n_boot)
+    assert n_boot_used == n_boot
+    assert np.all((perf_tbl.values == perf_tbl2.values) | (np.isnan(perf_tbl.values) & np.isnan(perf_tbl2.values)))
+    _, n_boot_used = bt.loss_summary_table(tbl, ref_method, method_EB="t", return_n_boot=True)
+    assert n_boot_used == 0
+
+    n_boot_max = bt.N_BOOT_MAX
+    bt.N_BOOT_MAX = 10 * bt.N_BOOT_BATCH
+    try:
+        perf_tbl, n_boot_used = bt.loss_summary_table(
+            tbl,
+            ref_method,
+            pairwise_CI=pairwise_CI,
+            confidence=confidence,
+            method_EB="boot",
+            random_state=seed,
+            n_boot="auto",
+            return_n_boot=True,
+        )
+        assert bt.N_BOOT_BATCH <= n_boot_used and n_boot_used <= bt.N_BOOT_MAX
+        assert n_boot_used % bt.N_BOOT_BATCH == 0
+
+        # Stops at the first batch where the worst column is within tolerance
+        jj_ref = np.array([cols.get_loc((metric, ref_method)) for metric, _ in cols])
+        mu = np.mean(tbl.values, axis=0)
+        mu_boot = bt._boot_mean_table(
+            tbl.values, confidence=confidence, n_boot="auto", jj_ref=jj_ref, pairwise_CI=pairwise_CI, random_state=seed
+        )
+        assert mu_boot.shape == (n_boot_used, len(cols))
+        for n_boot_chk in range(bt.N_BOOT_BATCH, n_boot_used + 1, bt.N_BOOT_BATCH):
+            delta_boot = mu_boot[:n_boot_chk] - mu_boot[:n_boot_chk, jj_ref]
+            if pairwise_CI:
+                done = bt._boot_auto_done(delta_boot, mu - mu[jj_ref], delta_boot, confidence=confidence)
+            else:
+                done = bt._boot_auto_done(mu_boot[:n_boot_chk], mu, delta_boot, confidence=confidence)
+            assert done == (n_boot_chk == n_boot_used) or n_boot_chk == bt.N_BOOT_MAX
+    finally:
+        bt.N_BOOT_MAX = n_boot_max
+
+    # Helpers for a single column take n_boot as well
+    x = tbl.values[:, 0]
+    mu, EB, pval = bt.get_mean_EB_test(x, confidence=confidence, method="boot", random_state=seed, n_boot=n_boot)
+    EB_, pval_, _ = bt._boot_EB_and_test(x, confidence=confidence, n_boot=n_boot, random_state=seed)
+    assert EB == EB_ and pval == pval_
+    _, EB = bt.get_mean_and_EB(x, confidence=confidence, method="boot", random_state=seed, n_boot=n_boot)
+    assert EB == EB_
+
+
+def test_loss_summary_table_float32():
+    N = np.random.randint(low=2, high=10)
+    n_methods = np.random.randint(low=1, high=4)
+    pairwise_CI = np.random.rand() <= 0.5
+    method_EB = np.random.choice(["t", "bernstein", "boot"])
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    methods = np.random.choice(list(ascii_letters), n_methods, replace=False)
+    ref_method = np.random.choice(methods)
+    cols = pd.MultiIndex.from_product([["foo", "bar"], methods], names=[cc.METRIC, cc.METHOD])
+    # Same values in both, so only the accumulation differs
+    loss = np.random.rand(N, 2 * n_methods).astype(np.float32)
+    tbl32 = pd.DataFrame(data=loss, columns=cols)
+    tbl64 = pd.DataFrame(data=loss.astype(np.float64), columns=cols)
+    limits = {"foo": (0.0, 1.0), "bar": (0.0, 1.0)}
+
+    perf_tbl = bt.loss_summary_table(
+        tbl32, ref_method, pairwise_CI=pairwise_CI, method_EB=method_EB, limits=limits, random_state=seed
+    )
+    perf_tbl2 = bt.loss_summary_table(
+        tbl64, ref_method, pairwise_CI=pairwise_CI, method_EB=method_EB, limits=limits, random_state=seed
+    )
+    assert perf_tbl.values.dtype == np.float64
+    assert np.allclose(perf_tbl.values, perf_tbl2.values, rtol=1e-5, atol=1e-6, equal_nan=True)
+
+
 if __name__ == "__main__":
     np.random.seed(85634)
 
@@ -436,6 +777,10 @@ if __name__ == "__main__":
     test_boot_EB_and_test()
     test_get_mean_EB_test()
 
+    for rr in range(MC_REPEATS_LARGE):
+        test_bca_EB()
+        test_boot_EB_and_test_adaptive()
+
     for rr in range(MC_REPEATS_LARGE):
         test_clip_EB()
         test_t_test_to_scipy()
@@ -448,8 +793,16 @@ if __name__ == "__main__":
         test_bernstein_test_inf()
         test_bernstein_EB_inf()
         test_bernstein_test_to_EB()
+        test_cols_to_scalar()
+        test_boot_mean_distinct()
         # This is a big one, we could put in loop with less iters:
         test_loss_summary_table()
+        test_loss_summary_table_float32()
+        test_loss_summary_table_stream()
+        test_loss_summary_table_boot()
+        test_loss_summary_table_bca()
+        test_loss_summary_table_random_state()
+        test_loss_summary_table_adaptive()
         print(rr)
 
     print("Now running MC tests")
@@ -1,12 +1,14 @@
 # Ryan Turner (turnerry@iro.umontreal.ca)
 from __future__ import division, print_function
 
+import tracemalloc
 from builtins import range
 
 import numpy as np
 from sklearn.metrics import auc
 from sklearn.metrics.ranking import _binary_clf_curve, precision_recall_curve, roc_curve
 
+import mlpaper.boot_util as bu
 import mlpaper.perf_curves as pc
 import mlpaper.util as util
 from mlpaper.test_constants import MC_REPEATS_LARGE
@@ -350,10 +352,197 @@ def test_binary_clf_curve():
         assert np.allclose(thresholds_prg2, thresholds_prg[-len(rec_gain2) :])
 
 
+def test_binary_clf_curve_boot_index():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=10)
+
+    y_bool = np.random.rand(N) <= 0.5
+    y_pred = np.random.rand(N)
+    if np.random.rand() <= 0.5:  # make non-unique
+        y_pred = np.random.choice(y_pred, size=N, replace=True)
+
+    boot_idx = bu.boot_index(N, n_boot, epsilon=1e-6)
+    weight = bu.index_to_weights(boot_idx)
+
+    fps, tps, thresholds = pc._binary_clf_curve(y_bool, y_pred, boot_idx)
+    fps2, tps2, thresholds2 = pc._binary_clf_curve(y_bool, y_pred, weight)
+    assert np.allclose(fps, fps2)
+    assert np.allclose(tps, tps2)
+    assert np.all(thresholds == thresholds2)
+
+    # Integer counts are exact, so float32 scores only round the output
+    fps32, tps32, thresholds32 = pc._binary_clf_curve(y_bool, y_pred.astype(np.float32), boot_idx)
+    assert fps32.dtype == np.float32 and tps32.dtype == np.float32
+    assert np.allclose(fps32, fps) and np.allclose(tps32, tps)
+    assert np.all(np.maximum.accumulate(fps32, axis=1) == fps32)
+    assert np.all(np.maximum.accumulate(tps32, axis=1) == tps32)
+
+
+def test_score_index():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=10)
+
+    y_bool = np.random.rand(N) <= 0.5
+    y_pred = np.random.rand(N)
+    if np.random.rand() <= 0.5:  # make non-unique
+        y_pred = np.random.choice(y_pred, size=N, replace=True)
+    sample_weights = [None, bu.boot_index(N, n_boot, epsilon=1e-6), np.random.rand(n_boot, N) + 0.1]
+    sample_weight = sample_weights[np.random.randint(len(sample_weights))]
+
+    score_idx = pc.score_index(y_bool, y_pred)
+    assert np.all(score_idx.thresholds == np.unique(y_pred)[::-1])
+    assert np.all(score_idx.thresholds[score_idx.group] == y_pred)
+
+    # Same curves from the sorted index as the scores
+    for curve_f in (pc.roc_curve, pc.recall_precision_curve, pc.prg_curve):
+        (x_curve, y_curve, kind), thresholds = curve_f(y_bool, y_pred, sample_weight)
+        (x_curve2, y_curve2, kind2), thresholds2 = curve_f(y_bool, score_idx, sample_weight)
+        assert np.all(x_curve == x_curve2) and np.all(y_curve == y_curve2)
+        assert kind == kind2 and np.all(thresholds == thresholds2)
+
+    # Counts are reused for the same weights
+    fps, tps, _ = pc._binary_clf_curve(y_bool, score_idx, sample_weight)
+    fps2, tps2, _ = pc._binary_clf_curve(y_bool, score_idx, sample_weight)
+    assert fps is fps2 and tps is tps2
+
+
+def test_quantize_scores():
+    N = np.random.randint(low=1, high=20)
+    n_buckets = np.random.randint(low=1, high=10)
+
+    y_bool = np.random.rand(N) <= 0.5
+    y_pred = np.random.randn(N)
+    if np.random.rand() <= 0.5:  # make non-unique
+        y_pred = np.random.choice(y_pred[: np.random.randint(low=1, high=2 * n_buckets)], size=N, replace=True)
+
+    bucket, thresholds = pc.quantize_scores(y_pred, n_buckets)
+    assert thresholds.size <= n_buckets and np.all(np.diff(thresholds) > 0)
+    assert np.all(np.isin(thresholds, y_pred))
+    assert np.all(y_pred <= thresholds[bucket])
+    assert np.all(bucket == 0) or np.all(thresholds[bucket - 1][bucket > 0] < y_pred[bucket > 0])
+    # Exact with few distinct scores
+    assert (np.unique(y_pred).size > n_buckets) or np.all(y_pred == thresholds[bucket])
+
+    # Area on unquantized scores within bound of area on quantized scores
+    y_quant = thresholds[bucket]
+    for curve_f in (pc.roc_curve, pc.recall_precision_curve):
+        bound = pc.quantized_area_bound(y_bool, y_quant, curve_f)
+        auc_quant, = util.area(*curve_f(y_bool, y_quant)[0])
+        auc_orig, = util.area(*curve_f(y_bool, y_pred)[0])
+        assert bound >= 0.0
+        assert np.abs(auc_orig - auc_quant) <= bound + 1e-8
+        assert np.all(y_pred == y_quant) <= (np.abs(auc_orig - auc_quant) <= 1e-8)
+
+
+def test_curve_accumulator():
+    N = np.random.randint(low=1, high=20)
+    n_boot = np.random.randint(low=1, high=20)
+    n_chunks = np.random.randint(low=1, high=4)
+    paired = np.random.rand() <= 0.5
+
+    y_bool = np.random.rand(N) <= 0.5
+    y_pred = np.random.randint(low=0, high=5, size=N).astype(float)
+    y_ref = np.random.randint(low=0, high=5, size=N).astype(float)
+    thresholds = np.unique(np.random.choice(np.arange(5.0), size=3))
+
+    # Each shard gets chunks, then merge
+    acc_list = []
+    splits = np.sort(np.random.randint(low=0, high=N + 1, size=n_chunks - 1))
+    for idx in np.split(np.arange(N), splits):
+        acc = pc.curve_accumulator(thresholds, n_boot, paired=paired)
+        acc = pc.accumulate_curve(acc, y_bool[idx], y_pred[idx], y_ref[idx] if paired else None)
+        acc_list.append(acc)
+    acc = pc.merge_curve_accumulators(acc_list)
+    assert np.sum(acc.counts) == N
+    assert acc.boot_counts.shape == (n_boot, acc.counts.size)
+    assert np.all(acc.boot_counts[:, acc.counts == 0] == 0)
+
+    # Same curve as on quantized scores
+    y_cell, score_cell, ref_cell, counts, boot_counts = pc.accumulator_cells(acc)
+    assert np.all(counts >= 1) and np.sum(counts) == N
+    assert boot_counts.shape == (n_boot, counts.size)
+    assert (ref_cell is None) == (not paired)
+    y_quant = np.searchsorted(thresholds, y_pred, side="left")
+    for curve_f in (pc.roc_curve, pc.recall_precision_curve, pc.prg_curve):
+        auc_acc, = util.area(*curve_f(y_cell, score_cell, counts[None, :].astype(float))[0])
+        auc_quant, = util.area(*curve_f(y_bool, y_quant)[0])
+        assert np.allclose(auc_acc, auc_quant)
+
+
+def test_roc_auc():
+    N = np.random.randint(low=1, high=10)
+    n_boot = np.random.randint(low=1, high=10)
+
+    y_bool = np.random.rand(N) <= np.random.rand()  # sometimes a single class
+    y_pred = np.random.rand(N)
+    if np.random.rand() <= 0.5:  # make non-unique
+        y_pred = np.random.choice(y_pred, size=N, replace=True)
+    sample_weights = [None, bu.boot_index(N, n_boot, epsilon=1e-6), np.random.rand(n_boot, N) + 0.1]
+    sample_weight = sample_weights[np.random.randint(len(sample_weights))]
+
+    # Same as area under the full ROC curve
+    auc = pc.roc_auc(y_bool, y_pred, sample_weight)
+    auc2 = util.area(*pc.roc_curve(y_bool, y_pred, sample_weight)[0])
+    assert auc.shape == auc2.shape
+    assert np.allclose(auc, auc2)
+    assert np.all(auc == pc.roc_auc(y_bool, pc.score_index(y_bool, y_pred), sample_weight))
+
+
+def test_one_vs_rest_curves():
+    N = np.random.randint(low=1, high=10)
+    n_cols = np.random.randint(low=1, high=5)
+    n_boot = np.random.randint(low=1, high=10)
+    x_grid = np.sort(np.random.rand(5))
+
+    y_true = util.one_hot(np.random.randint(low=0, high=n_cols, size=N), n_cols)
+    y_pred = np.random.randint(low=0, high=3, size=(N, n_cols)).astype(float)  # lots of ties
+    sample_weights = [None, bu.boot_index(N, n_boot, epsilon=1e-6), np.random.rand(n_boot, N) + 0.1]
+    sample_weight = sample_weights[np.random.randint(len(sample_weights))]
+    n_rows = 1 if sample_weight is None else n_boot
+
+    # All columns at once same as one column at a time
+    score_idx = pc.score_index(y_true, y_pred)
+    for curve_f in (pc.roc_curve, pc.recall_precision_curve, pc.prg_curve):
+        (x_curve, y_curve, kind), thresholds = curve_f(y_true, score_idx, sample_weight)
+        assert x_curve.shape == (n_rows * n_cols, N + 1) and thresholds.shape == (n_cols, N + 1)
+        auc = util.area(x_curve, y_curve, kind).reshape((n_rows, n_cols))
+        if curve_f != pc.prg_curve:  # PRG can be -inf
+            y_grid = util.interp1d(x_grid, x_curve, y_curve, kind).reshape((n_rows, n_cols, x_grid.size))
+        for jj in range(n_cols):
+            (x_curve2, y_curve2, _), _ = curve_f(y_true[:, jj], y_pred[:, jj], sample_weight)
+            assert np.allclose(auc[:, jj], util.area(x_curve2, y_curve2, kind))
+            if curve_f != pc.prg_curve:
+                assert np.allclose(y_grid[:, jj, :], util.interp1d(x_grid, x_curve2, y_curve2, kind))
+
+
+def test_one_vs_rest_memory():
+    # Many labels, so anything (N, K, K) would dominate the O(N * K) work
+    N, n_cols = 2000, 300
+    y_true = util.one_hot(np.random.randint(low=0, high=n_cols, size=N), n_cols)
+    y_pred = np.random.rand(N, n_cols)
+    score_idx = pc.score_index(y_true, y_pred)
+
+    tracemalloc.start()
+    try:
+        fps, tps, thresholds = pc._binary_clf_curve(y_true, score_idx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert fps.shape == (n_cols, N + 1) and thresholds.shape == (n_cols, N + 1)
+    assert peak < 10 * N * n_cols * 8
+
+
 if __name__ == "__main__":
     np.random.seed(89254)
 
     for rr in range(MC_REPEATS_LARGE):
         test_nv_binary_clf_curve()
         test_binary_clf_curve()
+        test_binary_clf_curve_boot_index()
+        test_score_index()
+        test_quantize_scores()
+        test_curve_accumulator()
+        test_roc_auc()
+        test_one_vs_rest_curves()
+    test_one_vs_rest_memory()
     print("passed")
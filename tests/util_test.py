@@ -47,6 +47,24 @@ def test_epsilon_noise():
     assert np.all(idx0 == idx1)
 
 
+def test_spawn_random_states():
+    n_streams = np.random.randint(low=0, high=5)
+    seed = np.random.randint(low=0, high=10 ** 6)
+
+    children = util.spawn_random_states(seed, n_streams)
+    assert len(children) == n_streams
+    x = [rs.randint(0, 10 ** 6, size=10) for rs in children]
+
+    # Same parent gives same children, regardless of order used
+    children = util.spawn_random_states(np.random.RandomState(seed), n_streams)
+    x2 = [rs.randint(0, 10 ** 6, size=10) for rs in children[::-1]][::-1]
+    assert all(np.all(xx == xx2) for xx, xx2 in zip(x, x2))
+
+    rs = np.random.RandomState(seed)
+    assert util.check_random_state(rs) is rs
+    assert util.check_random_state(None) is np.random.mtrand._rand
+
+
 def test_unique_take_last():
     N = np.random.randint(low=0, high=10)
 
@@ -97,6 +115,27 @@ def test_cummax_strict():
     assert x is x3
     assert np.all(x == y)  # modified
 
+    # Row-wise on a batch, same as one row at a time
+    n_boot = np.random.randint(low=0, high=5)
+    xx = np.sort(np.random.choice(x, size=(n_boot, N), replace=True), axis=1) if N > 0 else np.zeros((n_boot, 0))
+    yy = util.cummax_strict(xx)
+    assert yy.shape == xx.shape
+    assert all(np.all(yy[ii, :] == util.cummax_strict(xx[ii, :])) for ii in range(n_boot))
+
+    # float32 steps to the next float32
+    y32 = util.cummax_strict(x.astype(np.float32))
+    assert y32.dtype == np.float32
+    assert np.all(np.diff(y32) > 0.0)
+    assert np.all(y32 >= x.astype(np.float32))
+
+    # Ints are cast to float, and never modified in place
+    x_int = np.sort(np.random.randint(low=-5, high=5, size=N))
+    x_int2 = np.copy(x_int)
+    y_int = util.cummax_strict(x_int, copy=False)
+    assert np.all(x_int == x_int2)
+    assert y_int.dtype == np.float64
+    assert np.all(y_int == util.cummax_strict(x_int.astype(np.float64)))
+
 
 def test_eval_step_func():
     N = np.random.randint(low=0, high=10)
@@ -134,7 +173,7 @@ def interp1d_vec(x_grid, x_boot, y_boot, kind):
 
 
 def test_interp1d_vec():
-    kind_list = ["linear", "previous"]
+    kind_list = ["linear", "previous", "nearest", "zero"]
     kind = np.random.choice(kind_list)
 
     N = np.random.randint(low=2, high=10)
@@ -155,14 +194,50 @@ def test_interp1d_vec():
     xp[:, -1] = UB
 
     yp = np.random.randn(n_boot, N)
+    if np.random.rand() < 0.5:  # PRG curves can have -inf
+        yp[np.random.rand(n_boot, N) < 0.2] = -np.inf
     x_grid = np.random.uniform(low=LB, high=UB, size=n_grid)
 
-    yy = interp1d_vec(x_grid, xp, yp, kind)
+    with np.errstate(invalid="ignore"):
+        yy = interp1d_vec(x_grid, xp, yp, kind)
     if np.random.rand() < 0.5:
         yy2 = util.interp1d(x_grid, xp, yp, kind)
     else:
         yy2 = util.interp1d(x_grid, xp, yp, kind=kind)
-    assert np.all(yy == yy2)
+    assert yy.shape == yy2.shape
+    assert np.all((yy == yy2) | (np.isnan(yy) & np.isnan(yy2)))
+
+    # Single curve in 1D
+    for ii in range(n_boot):
+        yy3 = util.interp1d(x_grid, xp[ii, :], yp[ii, :], kind)
+        assert np.all((yy3 == yy2[ii, :]) | (np.isnan(yy3) & np.isnan(yy2[ii, :])))
+
+
+def test_interp1d_inf():
+    xp = np.array([0.0, 1.0, 2.0])
+    x_grid = np.array([0.0, 0.5, 1.0, 1.5, 2.0])
+    yp = np.array([[0.0, -np.inf, -np.inf], [-np.inf, 0.0, 1.0], [0.0, np.inf, -np.inf]])
+    expected = np.array(
+        [
+            [0.0, -np.inf, -np.inf, -np.inf, -np.inf],
+            [-np.inf, -np.inf, 0.0, 0.5, 1.0],
+            [0.0, np.inf, np.inf, np.nan, -np.inf],
+        ]
+    )
+
+    y_grid = util.interp1d(x_grid, np.tile(xp, (3, 1)), yp, kind="linear")
+    assert np.array_equal(np.isnan(y_grid), np.isnan(expected))
+    assert np.all((y_grid == expected) | np.isnan(expected))
+    for ii in range(yp.shape[0]):
+        y_grid = util._interp1d(x_grid, xp, yp[ii, :], kind="linear")
+        assert np.array_equal(np.isnan(y_grid), np.isnan(expected[ii, :]))
+        assert np.all((y_grid == expected[ii, :]) | np.isnan(expected[ii, :]))
+
+    # Segment with -inf at both ends in the middle of a random curve
+    xp = np.array([-1.0, 1.1196, 2.6461, 3.0])
+    yp = np.array([0.5, -np.inf, -np.inf, 0.2])
+    y_grid = util.interp1d(np.array([2.1508]), xp, yp, kind="linear")
+    assert y_grid.tolist() == [-np.inf]
 
 
 def test_interp1d_linear():
@@ -257,10 +332,12 @@ if __name__ == "__main__":
         test_one_hot()
         test_normalize()
         test_epsilon_noise()
+        test_spawn_random_states()
         test_unique_take_last()
         test_cummax_strict()
         test_eval_step_func()
         test_interp1d_vec()
+        test_interp1d_inf()
         test_interp1d_linear()
         test_interp1d_prev()
         test_area()